@@ -1,16 +1,23 @@
 """Admin panel for user management"""
+import time
 import streamlit as st
-from auth.user_manager import UserManager, UserStatus
+from auth.user_manager import UserManager, UserSnapshot, UserStatus, get_user_manager
+from utils.artifact_store import get_artifact_store
+from utils.ffmpeg_scheduler import get_ffmpeg_scheduler
+from utils.jobs import get_job_manager
+from utils.model_router import list_model_routers
+from utils.session_artifacts import get_session_registry
 
 
 def render_admin_panel():
     """Render the admin panel UI"""
     st.markdown("## 管理者パネル")
 
-    user_manager = UserManager()
+    user_manager = get_user_manager()
 
-    # Get stats
-    stats = user_manager.get_user_stats()
+    # One snapshot per view: stats, tabs and search all read from it
+    snapshot = user_manager.get_user_snapshot()
+    stats = snapshot.stats
 
     # Display stats
     col1, col2, col3, col4 = st.columns(4)
@@ -25,68 +32,140 @@ def render_admin_panel():
 
     st.divider()
 
+    query = st.text_input("🔍 ユーザー検索", key="admin_user_search", placeholder="名前・ニックネーム・メールで絞り込み")
+
     # Tabs for different views
     tab1, tab2, tab3 = st.tabs(["承認待ち", "承認済みユーザー", "BAN/却下済み"])
 
     with tab1:
-        _render_pending_users(user_manager)
+        _render_pending_users(user_manager, UserSnapshot.search(snapshot.by_status(UserStatus.PENDING), query))
 
     with tab2:
-        _render_approved_users(user_manager)
+        _render_approved_users(user_manager, UserSnapshot.search(snapshot.by_status(UserStatus.APPROVED), query))
 
     with tab3:
-        _render_banned_users(user_manager)
+        _render_banned_users(
+            user_manager,
+            UserSnapshot.search(snapshot.by_status(UserStatus.BANNED, UserStatus.REJECTED), query)
+        )
 
     st.divider()
 
+    _render_gemini_status()
+    _render_processing_status()
+    _render_session_memory()
+
     # Link to Lark Base
     st.markdown(
         "📊 [Lark Baseで直接編集](https://pjp6vm1896tv.jp.larksuite.com/base/IM0NbgSIxanEJMslH7Dji0o1pjh)"
     )
 
 
-def _render_pending_users(user_manager: UserManager):
+PAGE_SIZE = 25
+
+
+def _paginate(users: list, key: str) -> list:
+    """Return only the rows of the selected page (rows of other pages are not rendered)"""
+    page_count = max(1, (len(users) + PAGE_SIZE - 1) // PAGE_SIZE)
+    if page_count == 1:
+        return users
+    if st.session_state.get(key, 1) > page_count:
+        st.session_state[key] = page_count
+    page = st.number_input(
+        f"ページ（全{page_count}ページ / {len(users)}人）",
+        min_value=1,
+        max_value=page_count,
+        step=1,
+        key=key
+    )
+    start = (page - 1) * PAGE_SIZE
+    return users[start:start + PAGE_SIZE]
+
+
+def _render_pending_users(user_manager: UserManager, pending_users: list):
     """Render pending users list"""
     st.markdown("### 承認待ちユーザー")
 
-    pending_users = user_manager.get_users_by_status(UserStatus.PENDING)
-
     if not pending_users:
         st.info("承認待ちのユーザーはいません")
         return
 
+    page_users = _paginate(pending_users, "pending_page")
+
+    # 一括操作
+    select_keys = {user['google_id']: f"select_pending_{user['google_id']}" for user in page_users}
+    if st.session_state.pop("clear_pending_selection", False):
+        for key in select_keys.values():
+            st.session_state.pop(key, None)
+        st.session_state.pop("select_all_pending", None)
+
+    def _set_all_selected():
+        for key in select_keys.values():
+            st.session_state[key] = st.session_state.select_all_pending
+
+    st.checkbox("このページをすべて選択", key="select_all_pending", on_change=_set_all_selected)
+    selected_ids = [google_id for google_id, key in select_keys.items() if st.session_state.get(key)]
+
+    bulk_cols = st.columns([1, 1, 2, 1])
+    if bulk_cols[0].button(f"✅ 一括承認 ({len(selected_ids)})", key="bulk_approve", disabled=not selected_ids):
+        count = user_manager.bulk_approve(selected_ids)
+        st.session_state.clear_pending_selection = True
+        st.toast(f"{count}人を承認しました")
+        st.rerun()
+    if bulk_cols[1].button(f"❌ 一括却下 ({len(selected_ids)})", key="bulk_reject", disabled=not selected_ids):
+        count = user_manager.bulk_reject(selected_ids)
+        st.session_state.clear_pending_selection = True
+        st.toast(f"{count}人を却下しました")
+        st.rerun()
+    bulk_ban_reason = bulk_cols[2].text_input(
+        "BAN理由",
+        key="bulk_ban_reason",
+        placeholder="一括BANの理由...",
+        label_visibility="collapsed"
+    )
+    if bulk_cols[3].button(f"🚫 一括BAN ({len(selected_ids)})", key="bulk_ban", disabled=not selected_ids):
+        if bulk_ban_reason:
+            count = user_manager.bulk_ban(selected_ids, bulk_ban_reason)
+            st.session_state.clear_pending_selection = True
+            st.toast(f"{count}人をBANしました")
+            st.rerun()
+        else:
+            st.error("理由を入力")
+
     # ヘッダー
-    cols = st.columns([1.5, 2, 2, 1, 1])
-    cols[0].markdown("**名前**")
-    cols[1].markdown("**メール**")
-    cols[2].markdown("**申請日**")
-    cols[3].markdown("")
+    cols = st.columns([0.4, 1.5, 2, 2, 1, 1])
+    cols[0].markdown("")
+    cols[1].markdown("**名前**")
+    cols[2].markdown("**メール**")
+    cols[3].markdown("**申請日**")
     cols[4].markdown("")
+    cols[5].markdown("")
 
     # データ行
-    for user in pending_users:
-        cols = st.columns([1.5, 2, 2, 1, 1])
-        cols[0].write(f"{user['real_name']} ({user['nickname']})")
-        cols[1].write(user['email'])
-        cols[2].write(user['created_at'])
-        if cols[3].button("✅ 承認", key=f"approve_{user['google_id']}"):
+    for user in page_users:
+        cols = st.columns([0.4, 1.5, 2, 2, 1, 1])
+        cols[0].checkbox("選択", key=select_keys[user['google_id']], label_visibility="collapsed")
+        cols[1].write(f"{user['real_name']} ({user['nickname']})")
+        cols[2].write(user['email'])
+        cols[3].write(user['created_at'])
+        if cols[4].button("✅ 承認", key=f"approve_{user['google_id']}"):
             if user_manager.approve_user(user['google_id']):
                 st.rerun()
-        if cols[4].button("❌ 却下", key=f"reject_{user['google_id']}"):
+        if cols[5].button("❌ 却下", key=f"reject_{user['google_id']}"):
             if user_manager.reject_user(user['google_id']):
                 st.rerun()
 
 
-def _render_approved_users(user_manager: UserManager):
+def _render_approved_users(user_manager: UserManager, approved_users: list):
     """Render approved users list"""
     st.markdown("### 承認済みユーザー")
 
-    approved_users = user_manager.get_users_by_status(UserStatus.APPROVED)
-
     if not approved_users:
         st.info("承認済みのユーザーはいません")
         return
 
+    page_users = _paginate(approved_users, "approved_page")
+
     # ヘッダー
     cols = st.columns([1.5, 2, 1.5, 1.5, 0.8, 1, 1])
     cols[0].markdown("**名前**")
@@ -98,7 +177,7 @@ def _render_approved_users(user_manager: UserManager):
     cols[6].markdown("")
 
     # データ行
-    for user in approved_users:
+    for user in page_users:
         cols = st.columns([1.5, 2, 1.5, 1.5, 0.8, 1, 1])
 
         # 名前（管理者バッジ付き）
@@ -135,19 +214,16 @@ def _render_approved_users(user_manager: UserManager):
                     st.rerun()
 
 
-def _render_banned_users(user_manager: UserManager):
+def _render_banned_users(user_manager: UserManager, all_users: list):
     """Render banned and rejected users"""
     st.markdown("### BAN/却下済みユーザー")
 
-    banned_users = user_manager.get_users_by_status(UserStatus.BANNED)
-    rejected_users = user_manager.get_users_by_status(UserStatus.REJECTED)
-
-    all_users = banned_users + rejected_users
-
     if not all_users:
         st.info("BAN/却下済みのユーザーはいません")
         return
 
+    page_users = _paginate(all_users, "banned_page")
+
     # ヘッダー
     cols = st.columns([1, 1.5, 2, 2, 1])
     cols[0].markdown("**状態**")
@@ -157,7 +233,7 @@ def _render_banned_users(user_manager: UserManager):
     cols[4].markdown("")
 
     # データ行
-    for user in all_users:
+    for user in page_users:
         cols = st.columns([1, 1.5, 2, 2, 1])
 
         status_label = "🚫 BAN" if user['status'] == UserStatus.BANNED else "❌ 却下"
@@ -174,3 +250,105 @@ def _render_banned_users(user_manager: UserManager):
             if cols[4].button("✅ 承認", key=f"approve_rejected_{user['google_id']}"):
                 if user_manager.approve_user(user['google_id']):
                     st.rerun()
+
+
+def _render_gemini_status():
+    """Render Gemini model router state for monitoring"""
+    with st.expander("🤖 Geminiモデル状態", expanded=False):
+        rows = []
+        for key_id, router in list_model_routers().items():
+            for model_name, state in router.snapshot().items():
+                latency = ", ".join(f"{method}: {ms}ms" for method, ms in state["latency_ms"].items())
+                rows.append({
+                    "APIキー": key_id,
+                    "モデル": model_name,
+                    "状態": "🔴 遮断中" if state["state"] == "open" else "🟢 正常",
+                    "再開まで(秒)": state["open_remaining_seconds"],
+                    "リクエスト": state["requests"],
+                    "失敗": state["failures"],
+                    "429": state["rate_limited"],
+                    "エラー率": f"{state['error_rate']:.0%}",
+                    "レイテンシ": latency or "-",
+                    "最終エラー": state["last_error"],
+                })
+        if not rows:
+            st.info("まだGemini APIの呼び出しはありません")
+            return
+        st.caption("APIキーごとに集計（APIキーの列はキーのハッシュ）")
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+
+
+def _render_processing_status():
+    """Render background job and FFmpeg scheduler load"""
+    with st.expander("⚙️ 処理キュー", expanded=False):
+        jobs = get_job_manager().stats()
+        ffmpeg = get_ffmpeg_scheduler().stats()
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("実行中のジョブ", f"{jobs['running']} / {jobs['max_workers']}")
+        with col2:
+            st.metric("待機中のジョブ", jobs["queued"])
+        with col3:
+            st.metric("FFmpeg実行中", f"{ffmpeg['running']} / {ffmpeg['max_processes']}")
+        with col4:
+            st.metric("FFmpeg待ち", ffmpeg["queued"])
+
+        st.caption(
+            f"FFmpeg: 1プロセス {ffmpeg['threads_per_process']}スレッド / "
+            f"平均待ち {ffmpeg['avg_wait_seconds']}秒・最大 {ffmpeg['max_wait_seconds']}秒 / "
+            f"完了 {ffmpeg['completed']}件・失敗 {ffmpeg['failed']}件・キャンセル {ffmpeg['cancelled']}件"
+        )
+        if ffmpeg["recent_encodes"]:
+            st.caption(
+                f"エンコード速度: 実時間の {ffmpeg['encode_speed']}倍 "
+                f"（直近{ffmpeg['recent_encodes']}件、計 {ffmpeg['encoded_media_seconds']}秒分）"
+            )
+        artifacts = get_artifact_store().stats()
+        st.caption(
+            f"生成物: {artifacts['count']}件・{artifacts['bytes'] / 1024 / 1024:.0f} MB "
+            f"（保存期間 {artifacts['ttl_seconds'] / 3600:g}時間、"
+            f"配信: {artifacts['base_url'] or 'アプリ経由'}）"
+        )
+        if ffmpeg["queued_by_owner"]:
+            st.dataframe(
+                [{"ユーザー": owner or "-", "待ち件数": count} for owner, count in ffmpeg["queued_by_owner"].items()],
+                use_container_width=True,
+                hide_index=True
+            )
+
+
+def _render_session_memory():
+    """Render per-session memory usage of large session data"""
+    with st.expander("🧠 セッションメモリ", expanded=False):
+        stats = get_session_registry().stats()
+
+        def mb(value):
+            return f"{value / 1024 / 1024:.1f} MB"
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            rss = stats["process_rss_bytes"]
+            st.metric("プロセス全体", mb(rss) if rss is not None else "-")
+        with col2:
+            st.metric("セッション数", stats["session_count"])
+        with col3:
+            st.metric("メモリ上のデータ", mb(stats["memory_bytes"] + stats["state_bytes"]))
+        with col4:
+            st.metric("ディスクへ退避", mb(stats["spilled_bytes"]))
+
+        st.caption(f"1セッションあたりの上限: {mb(stats['budget_bytes'])}（超えた分は大きいものからディスクへ退避）")
+        if stats["sessions"]:
+            now = time.time()
+            st.dataframe(
+                [{
+                    "ユーザー": usage["label"] or "-",
+                    "セッション": usage["session_id"][:8],
+                    "session_state": mb(usage["state_bytes"]),
+                    "大きなデータ(メモリ)": mb(usage["memory_bytes"]),
+                    "大きなデータ(ディスク)": mb(usage["spilled_bytes"]),
+                    "最終アクセス(分前)": int((now - usage["last_access"]) / 60),
+                } for usage in stats["sessions"]],
+                use_container_width=True,
+                hide_index=True
+            )
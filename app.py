@@ -1,12 +1,23 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import os
-import tempfile
-import base64
 from dotenv import load_dotenv
 from utils.transcription import GladiaAPI
-from utils.text_formatter import GeminiFormatter
+from utils.text_formatter import GeminiFormatter, MAX_LINE_CHARS, break_lines
 from utils.voicevox import VoiceVoxAPI
 from utils.video_generator_ffmpeg import VideoGeneratorFFmpeg
+from utils.alignment import AlignmentState
+from utils.project import create_project, list_projects, load_project, verify_audio
+from utils.artifact_store import get_artifact_store
+from utils.session_artifacts import estimate_size, get_session_registry
+from utils.uploads import SavedUpload, save_upload
+from utils.ffmpeg_scheduler import get_ffmpeg_scheduler
+from utils.janitor import get_temp_janitor
+from utils.jobs import (
+    CANCELLED, FINISHED_STATES, SUCCEEDED, get_job_manager,
+    run_project_render_job, run_render_job, run_transcribe_render_job, run_transcription_job,
+    run_video_transcription_job
+)
 
 # 環境変数を読み込み
 load_dotenv()
@@ -392,10 +403,11 @@ if 'sample_audio' not in st.session_state:
     st.session_state.sample_audio = None
 if 'generated_sns_content' not in st.session_state:
     st.session_state.generated_sns_content = None
-if 'generated_video' not in st.session_state:
-    st.session_state.generated_video = None
-if 'preview_video' not in st.session_state:
-    st.session_state.preview_video = None
+# 生成した動画はディスク上の生成物ストアに置き、セッションにはハンドルだけを持つ
+if 'generated_video_id' not in st.session_state:
+    st.session_state.generated_video_id = None
+if 'preview_video_id' not in st.session_state:
+    st.session_state.preview_video_id = None
 if 'speaker_id' not in st.session_state:
     st.session_state.speaker_id = None
 if 'speed' not in st.session_state:
@@ -414,16 +426,10 @@ if 'audio_upload_mode' not in st.session_state:
     st.session_state.audio_upload_mode = False
 if 'audio_file_path' not in st.session_state:
     st.session_state.audio_file_path = None
-if 'audio_file_data' not in st.session_state:
-    st.session_state.audio_file_data = None
 if 'audio_words' not in st.session_state:
     st.session_state.audio_words = []
 if 'edited_segments' not in st.session_state:
     st.session_state.edited_segments = None
-if 'timestamped_segments' not in st.session_state:
-    st.session_state.timestamped_segments = None
-if 'gladia_words' not in st.session_state:
-    st.session_state.gladia_words = []
 if 'audio_upload_sns_content' not in st.session_state:
     st.session_state.audio_upload_sns_content = None
 
@@ -483,10 +489,108 @@ st.markdown("---")
 # VOICEVOX URLはデフォルト値を使用（UIから削除）
 voicevox_url = "http://localhost:50021"
 
-# APIクライアントの初期化
-gladia = GladiaAPI(gladia_api_key) if gladia_api_key else None
-gemini = GeminiFormatter(gemini_api_key) if gemini_api_key else None
-voicevox = VoiceVoxAPI(voicevox_url)
+# APIクライアントの初期化（APIキー・設定ごとにキャッシュし、再実行のたびに作り直さない）
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_gladia_client(api_key: str) -> GladiaAPI:
+    return GladiaAPI(api_key)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_gemini_formatter(api_key: str) -> GeminiFormatter:
+    return GeminiFormatter(api_key)
+
+
+@st.cache_resource(show_spinner=False)
+def get_voicevox_client(url: str) -> VoiceVoxAPI:
+    return VoiceVoxAPI(url)
+
+
+@st.cache_resource(show_spinner=False)
+def get_video_generator(background_color: tuple, url: str) -> VideoGeneratorFFmpeg:
+    return VideoGeneratorFFmpeg(background_color=background_color, voicevox_url=url)
+
+
+gladia = get_gladia_client(gladia_api_key) if gladia_api_key else None
+gemini = get_gemini_formatter(gemini_api_key) if gemini_api_key else None
+voicevox = get_voicevox_client(voicevox_url)
+
+# バックグラウンドジョブ（文字起こし・動画生成はワーカーで実行し、
+# ジョブIDをセッションとURLに保存して再読み込み・再接続後も進捗と結果を取得する）
+job_manager = get_job_manager()
+artifact_store = get_artifact_store()
+get_temp_janitor()  # 放置された一時ファイルの回収（起動時と定期的に実行）
+
+# 音声データ・単語リストなどの大きな値は session_state に直接入れず、セッションごとの
+# 管理領域に置く（メモリ上限を超えたらディスクへ退避。audio_file_data / gladia_words / timestamped_segments）
+session_registry = get_session_registry()
+_script_ctx = get_script_run_ctx()
+session_blobs = session_registry.get(
+    _script_ctx.session_id if _script_ctx else "local",
+    label=user["email"] if user else "local"
+)
+session_registry.cleanup(is_active=st.runtime.get_instance().is_active_session if st.runtime.exists() else None)
+job_owner = user["google_id"] if user else "local"
+JOB_SLOTS = ("video_transcribe_job", "transcribe_job", "render_job", "sec3_render_job")
+
+for _slot in JOB_SLOTS:
+    if not st.session_state.get(_slot) and st.query_params.get(_slot):
+        # 共有・流出したURLで他のユーザーのジョブに接続しない
+        if job_manager.get(st.query_params[_slot], owner=job_owner) is not None:
+            st.session_state[_slot] = st.query_params[_slot]
+        else:
+            del st.query_params[_slot]
+
+
+def start_job(slot: str, job_context, func, *args, **kwargs) -> None:
+    job_id = job_manager.start(job_context, func, *args, **kwargs)
+    st.session_state[slot] = job_id
+    st.query_params[slot] = job_id
+
+
+def clear_job(slot: str) -> None:
+    st.session_state.pop(slot, None)
+    if slot in st.query_params:
+        del st.query_params[slot]
+
+
+@st.fragment(run_every=2)
+def job_status_fragment(slot: str):
+    """実行中のジョブの進捗を定期更新（終了したらページ全体を再実行して結果を反映）"""
+    job = job_manager.get(st.session_state.get(slot), owner=job_owner)
+    if job is None or job["status"] in FINISHED_STATES:
+        st.rerun()
+    job_manager.touch(job["job_id"])
+    st.progress(job["progress"], text=job["message"])
+    if st.button("キャンセル", key=f"cancel_{slot}"):
+        job_manager.cancel(job["job_id"], owner=job_owner)
+    ffmpeg_stats = get_ffmpeg_scheduler().stats()
+    if ffmpeg_stats["queued"]:
+        st.caption(
+            f"混雑中: 動画エンコードの順番待ち {ffmpeg_stats['queued']}件"
+            f"（平均待ち時間 {ffmpeg_stats['avg_wait_seconds']}秒）"
+        )
+
+
+def take_finished_job(slot: str):
+    """ジョブが成功していれば返してスロットを空ける（実行中なら進捗を表示してNone）"""
+    job_id = st.session_state.get(slot)
+    if not job_id:
+        return None
+    job = job_manager.get(job_id, owner=job_owner)
+    if job is None:
+        clear_job(slot)
+        return None
+    if job["status"] not in FINISHED_STATES:
+        job_status_fragment(slot)
+        return None
+    clear_job(slot)
+    if job["status"] == CANCELLED:
+        st.info("処理をキャンセルしました")
+        return None
+    if job["status"] != SUCCEEDED:
+        st.error(f"処理に失敗しました: {job['error']}")
+        return None
+    return job
 
 # ===========================================
 # セクション1: 入力ソース選択
@@ -495,6 +599,125 @@ st.header("1. 入力ソース選択")
 
 tab1, tab2, tab3, tab4 = st.tabs(["動画から生成", "ファイルから生成", "テキスト入力", "🎵 音声アップロード"])
 
+def get_saved_upload(uploader_key: str, uploaded_file) -> SavedUpload:
+    """アップロードを一時ファイルに保存（同じアップロードなら再実行時も保存済みのファイルを使う）"""
+    state_key = f"{uploader_key}_saved"
+    saved = save_upload(uploaded_file, previous=st.session_state.get(state_key))
+    st.session_state[state_key] = saved
+    return saved
+
+
+def restore_project_session(project, audio_data: bytes) -> None:
+    """保存済みプロジェクトの内容を音声アップロードタブのセッションに復元"""
+    st.session_state.project_id = project.project_id
+    session_blobs.put("audio_file_data", audio_data)
+    session_blobs.put("gladia_words", project.words)
+    session_blobs.put("timestamped_segments", project.transcript_segments)
+    st.session_state.audio_text_editor = project.text
+    st.session_state.pop('audio_text_area', None)
+    st.session_state.filename = project.metadata.get("filename") or project.name
+    if project.metadata.get("sns_content"):
+        st.session_state.audio_upload_sns_content = project.metadata["sns_content"]
+    st.session_state.audio_upload_mode = True
+
+    # 同じ入力で生成済みの動画があれば復元
+    signature = project.render_signature()
+    video_main = project.artifact_path("video_main", signature)
+    video_preview = project.artifact_path("video_preview", signature)
+    if project.is_stage_done("render") and video_main and video_preview:
+        st.session_state.generated_video_id = artifact_store.put_file(video_main)
+        st.session_state.preview_video_id = artifact_store.put_file(video_preview)
+    else:
+        st.session_state.generated_video_id = None
+        st.session_state.preview_video_id = None
+
+
+def store_job_videos(job: dict) -> None:
+    """ジョブの出力動画を生成物ストアに登録し、ハンドルをセッションに保存"""
+    files = job["result"]["files"]
+    video_main = job_manager.file_path(job["job_id"], files["video_main"], owner=job_owner)
+    video_preview = job_manager.file_path(job["job_id"], files.get("video_preview", ""), owner=job_owner)
+    st.session_state.generated_video_id = artifact_store.put_file(video_main) if video_main else None
+    st.session_state.preview_video_id = artifact_store.put_file(video_preview) if video_preview else None
+
+
+def show_generated_video(file_name: str, download_key: str) -> None:
+    """生成した動画のプレビューとダウンロードボタンを表示
+
+    静的配信のURLがあればブラウザがそこから（Range指定で）直接取得する。
+    なければプレビューはファイルから表示し、ダウンロードはボタンが押されたときだけ読み込む。
+    """
+    main_id = st.session_state.generated_video_id
+    preview_id = st.session_state.preview_video_id
+    if not artifact_store.exists(main_id) or not artifact_store.exists(preview_id):
+        st.session_state.generated_video_id = None
+        st.session_state.preview_video_id = None
+        st.info("生成した動画の保存期間が過ぎました。もう一度動画を生成してください。")
+        return
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col2:
+        preview_url = artifact_store.url(preview_id)
+        if preview_url:
+            st.markdown(f'''
+            <div class="iphone-frame">
+                <div class="iphone-device">
+                    <div class="iphone-dynamic-island"></div>
+                    <div class="iphone-screen">
+                        <video controls playsinline preload="metadata">
+                            <source src="{preview_url}" type="video/mp4">
+                        </video>
+                    </div>
+                    <div class="iphone-home-indicator"></div>
+                </div>
+            </div>
+            ''', unsafe_allow_html=True)
+        else:
+            st.video(artifact_store.path(preview_id))
+
+    st.info("プレビューはチェッカー背景で表示。ダウンロードは透過動画（MOV）です。")
+    st.caption(f"🔤 使用フォント: **{_font_info['name']}**（{_font_info['size']}px）")
+
+    size_mb = artifact_store.size(main_id) / 1024 / 1024
+    download_url = artifact_store.url(main_id, download_name=f"{file_name}.mov")
+    if download_url:
+        st.link_button(f"DOWNLOAD VIDEO (.mov, {size_mb:.0f} MB)", download_url)
+    else:
+        st.download_button(
+            label=f"DOWNLOAD VIDEO (.mov, {size_mb:.0f} MB)",
+            data=artifact_store.reader(main_id),
+            file_name=f"{file_name}.mov",
+            mime=artifact_store.mime_type(main_id),
+            on_click="ignore",
+            key=download_key
+        )
+
+
+def apply_render_job(job: dict) -> None:
+    """音声アップロードタブの動画生成ジョブの結果をセッションに反映"""
+    # 再接続後の新しいセッションではプロジェクトから編集内容を復元する
+    project_id = job["result"].get("project_id")
+    if project_id and not st.session_state.get('audio_upload_mode'):
+        project = load_project(project_id, owner=job_owner)
+        audio_data = project.read_audio() if project and verify_audio(project) else None
+        if audio_data is not None:
+            restore_project_session(project, audio_data)
+    store_job_videos(job)
+    st.rerun()
+
+
+def apply_sec3_render_job(job: dict) -> None:
+    """セクション3の文字起こし〜動画生成ジョブの結果をセッションに反映"""
+    # 再接続後の新しいセッションではジョブに保存したテキストを復元する
+    if not st.session_state.formatted_text:
+        st.session_state.formatted_text = job["params"].get("text", "")
+        st.session_state.filename = job["params"].get("filename") or st.session_state.filename
+    store_job_videos(job)
+    low_confidence = job["result"].get("low_confidence")
+    if low_confidence:
+        st.warning(f"文字起こしと一致しない行があります（タイミングは前後から推定）: {low_confidence[:10]}行目")
+
+
 with tab1:
     st.subheader("動画アップロード")
 
@@ -505,17 +728,7 @@ with tab1:
     )
 
     if uploaded_file is not None:
-        # ファイルポインタを先頭にリセットしてから読み込む
-        uploaded_file.seek(0)
-        file_data = uploaded_file.read()
-
-        # 元のファイル拡張子を維持
-        import os
-        file_ext = os.path.splitext(uploaded_file.name)[1] or ".mp4"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-            tmp_file.write(file_data)
-            tmp_file_path = tmp_file.name
-
+        saved_video = get_saved_upload("video_uploader", uploaded_file)
         st.info(f"アップロードされたファイル: {uploaded_file.name}")
 
         if st.button("START", key="transcribe_btn"):
@@ -524,53 +737,55 @@ with tab1:
                 st.stop()
 
             try:
-                progress_bar = st.progress(0)
-
-                progress_bar.progress(10)
-                audio_url = gladia.upload_file(tmp_file_path)
-
-                if audio_url:
-                    progress_bar.progress(30)
-                    transcribed = gladia.transcribe(audio_url, language="ja")
-
-                    if transcribed:
-                        st.session_state.transcribed_text = transcribed
-                        st.info(f"文字起こし完了: {len(transcribed)}文字")
-                        progress_bar.progress(60)
-
-                        try:
-                            formatted = gemini.format_text(transcribed)
-                        except Exception as e:
-                            error_str = str(e)
-                            if "429" in error_str or "quota" in error_str.lower():
-                                st.error("⚠️ Gemini APIのクォータ（利用制限）を超過しました")
-                                st.warning("30秒後に再試行するか、新しいAPIキーを取得してください: https://aistudio.google.com/apikey")
-                            else:
-                                st.error(f"テキスト整形エラー: {type(e).__name__}: {e}")
-                            formatted = None
-
-                        if formatted:
-                            st.session_state.formatted_text = formatted
-                            progress_bar.progress(80)
-                            filename = gemini.generate_filename(formatted)
-                            st.session_state.filename = filename or "output"
-                            progress_bar.progress(100)
-                            st.success("Complete!")
-                        else:
-                            st.error("テキスト整形に失敗しました")
-                            # 文字起こしテキストをそのまま使用するオプション
-                            st.warning("文字起こしテキストをそのまま使用します（手動で整形してください）")
-                            st.session_state.formatted_text = transcribed
-                            st.session_state.filename = "output"
-                    else:
-                        st.error("文字起こしに失敗しました")
-                else:
-                    st.error("ファイルアップロードに失敗しました")
-                    st.warning("考えられる原因: APIキーの有効期限切れ、ファイルサイズ制限、ネットワークエラー")
-            finally:
-                # 処理完了後に一時ファイルを削除
-                if os.path.exists(tmp_file_path):
-                    os.unlink(tmp_file_path)
+                # 元のファイル拡張子を維持してジョブディレクトリに保存
+                file_ext = saved_video.ext or ".mp4"
+                job_context = job_manager.create_job(
+                    "video_transcribe", job_owner,
+                    params={"video_name": saved_video.name, "sha256": saved_video.sha256}
+                )
+                saved_video.copy_to(job_context.path(f"video{file_ext}"))
+                start_job(
+                    "video_transcribe_job", job_context, run_video_transcription_job,
+                    gladia, gemini, job_context.path(f"video{file_ext}")
+                )
+            except RuntimeError as e:
+                st.error(str(e))
+
+    # 文字起こしジョブの進捗表示・完了時の反映
+    video_transcribe_job = take_finished_job("video_transcribe_job")
+    if video_transcribe_job:
+        transcribed = video_transcribe_job["result"]["transcribed"]
+        st.session_state.transcribed_text = transcribed
+        st.info(f"文字起こし完了: {len(transcribed)}文字")
+
+        gemini_error = video_transcribe_job["result"].get("gemini_error")
+        if gemini_error:
+            if "429" in gemini_error or "quota" in gemini_error.lower():
+                st.error("⚠️ Gemini APIのクォータ（利用制限）を超過しました")
+                st.warning("30秒後に再試行するか、新しいAPIキーを取得してください: https://aistudio.google.com/apikey")
+            else:
+                st.error(f"テキスト整形エラー: {gemini_error}")
+        gemini_results = video_transcribe_job["result"].get("gemini") or {}
+        formatted = gemini_results.get("formatted")
+
+        if formatted:
+            st.session_state.formatted_text = formatted
+            st.session_state.filename = gemini_results.get("filename") or "output"
+            if gemini_results.get("hiragana"):
+                st.session_state.hiragana_text = gemini_results["hiragana"]
+                if "hiragana_editor" in st.session_state:
+                    del st.session_state.hiragana_editor
+            if gemini_results.get("metadata"):
+                st.session_state.generated_sns_content = gemini_results["metadata"]
+                if "sns_content_editor" in st.session_state:
+                    del st.session_state.sns_content_editor
+            st.success("Complete!")
+        else:
+            st.error("テキスト整形に失敗しました")
+            # 文字起こしテキストをそのまま使用するオプション
+            st.warning("文字起こしテキストをそのまま使用します（手動で整形してください）")
+            st.session_state.formatted_text = transcribed
+            st.session_state.filename = "output"
 
 with tab2:
     st.subheader("テキストファイルアップロード")
@@ -684,6 +899,49 @@ with tab4:
     st.subheader("音声アップロード")
     st.info("外部TTSで生成した音声をアップロード → 自動で文字起こし＆整形 → 動画生成（動画から生成と同じフロー）")
 
+    # 保存済みプロジェクト（文字起こし・整形・タイミング・生成済み動画を再利用）
+    with st.expander("📁 プロジェクト", expanded=False):
+        saved_projects = list_projects(owner=job_owner)
+        if saved_projects:
+            project_labels = {
+                p["project_id"]: f"{p['name']}（{p['lines']}行 / 完了: {', '.join(p['stages']) or 'なし'}）"
+                for p in saved_projects
+            }
+            selected_project_id = st.selectbox(
+                "保存済みプロジェクト",
+                options=list(project_labels.keys()),
+                format_func=lambda project_id: project_labels[project_id],
+                key="project_selector"
+            )
+            if st.button("読み込み", key="load_project_btn"):
+                project = load_project(selected_project_id, owner=job_owner)
+                audio_data = project.read_audio() if project else None
+                if not project or audio_data is None or not project.is_stage_done("format"):
+                    st.error("プロジェクトを読み込めませんでした（音声または整形済みテキストがありません）")
+                elif not verify_audio(project):
+                    # 保存後に音声ファイルが差し替え・破損されたものは復元しない
+                    st.error("プロジェクトの音声ファイルが保存時と一致しません（差し替えまたは破損しています）")
+                else:
+                    restore_project_session(project, audio_data)
+                    st.rerun()
+        else:
+            st.caption("保存済みのプロジェクトはありません（文字起こし完了時に自動保存されます）")
+
+        current_project_id = st.session_state.get('project_id')
+        if current_project_id and st.session_state.get('audio_upload_mode'):
+            st.caption(f"現在のプロジェクト: {current_project_id}")
+            if st.button("編集内容を保存", key="save_project_btn"):
+                project = load_project(current_project_id, owner=job_owner)
+                if project:
+                    project.set_text(st.session_state.audio_text_editor)
+                    project.metadata["filename"] = st.session_state.filename
+                    if st.session_state.get('audio_upload_sns_content'):
+                        project.metadata["sns_content"] = st.session_state.audio_upload_sns_content
+                    project.save()
+                    st.success("保存しました")
+                else:
+                    st.error("プロジェクトが見つかりません")
+
     # 1. 音声アップロード → 自動で文字起こし＆整形
     st.markdown("### 1. 音声ファイルをアップロード")
     uploaded_audio = st.file_uploader(
@@ -695,81 +953,92 @@ with tab4:
 
     if uploaded_audio and not st.session_state.get('audio_upload_mode'):
         # 新しい音声がアップロードされたら自動で処理開始
+        saved_audio = get_saved_upload("audio_uploader", uploaded_audio)
         st.success(f"アップロード: {uploaded_audio.name}")
-        st.audio(uploaded_audio, format=f"audio/{uploaded_audio.name.split('.')[-1]}")
-
-        audio_filename = os.path.splitext(uploaded_audio.name)[0]
+        st.audio(saved_audio.path, format=f"audio/{saved_audio.ext.lstrip('.')}")
 
         if not gladia_api_key:
             st.error("API設定でGladia APIキーを入力してください")
         elif not gemini_api_key:
             st.error("API設定でGemini APIキーを入力してください（テキスト整形に必要）")
-        else:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_audio.name.split('.')[-1]}") as tmp_file:
-                tmp_file.write(uploaded_audio.read())
-                tmp_audio_path = tmp_file.name
-            uploaded_audio.seek(0)
-
+        elif (
+            not st.session_state.get('transcribe_job')
+            and st.session_state.get('transcribed_upload_id') != uploaded_audio.file_id
+        ):
+            # 同じアップロードを二重に処理しない（失敗時は再アップロードでやり直す）
+            st.session_state.transcribed_upload_id = uploaded_audio.file_id
             try:
-                # Step 1: Gladia文字起こし
-                status_text.text("音声を文字起こし中（Gladia API）...")
-                progress_bar.progress(10)
-
-                result = gladia.transcribe_from_file_with_timestamps(tmp_audio_path, language="ja")
-
-                if result and result.get("segments"):
-                    gladia_segments = result["segments"]
-                    gladia_words = result.get("words", [])  # 単語レベルのタイムスタンプ
-                    raw_text = ' '.join([seg['text'] for seg in gladia_segments])
-                    progress_bar.progress(40)
-                    status_text.text(f"文字起こし完了: {len(gladia_segments)} セグメント, {len(gladia_words)} 単語")
-
-                    # Step 2: Geminiで整形（動画から生成と同じ）
-                    status_text.text("テキストを整形中（Gemini API）...")
-                    progress_bar.progress(50)
-
-                    formatted_text = gemini.format_text(raw_text)
-
-                    if formatted_text:
-                        progress_bar.progress(70)
-
-                        # ファイル名生成
-                        status_text.text("ファイル名を生成中...")
-                        generated_filename = gemini.generate_filename(formatted_text)
-                        if generated_filename:
-                            audio_filename = generated_filename
-
-                        progress_bar.progress(100)
-                        status_text.text("Complete!")
-
-                        # セッションに保存（単語リストも保存）
-                        st.session_state.timestamped_segments = gladia_segments
-                        st.session_state.gladia_words = gladia_words  # 単語レベルのタイムスタンプ
-                        st.session_state.audio_file_data = uploaded_audio.read()
-                        uploaded_audio.seek(0)
-                        st.session_state.filename = audio_filename
-                        st.session_state.audio_upload_mode = True
-                        st.session_state.audio_text_editor = formatted_text
-
-                        st.success(f"Complete! 整形済みテキスト生成完了（{len(gladia_words)}単語のタイムスタンプ取得）")
-                        st.rerun()
-                    else:
-                        st.error("テキスト整形に失敗しました")
-                else:
-                    st.error("文字起こしに失敗しました")
-
-                if os.path.exists(tmp_audio_path):
-                    os.unlink(tmp_audio_path)
+                audio_ext = saved_audio.ext or ".wav"
+                job_context = job_manager.create_job(
+                    "transcribe", job_owner,
+                    params={"audio_name": uploaded_audio.name, "audio_ext": audio_ext, "sha256": saved_audio.sha256}
+                )
+                saved_audio.copy_to(job_context.path(f"audio{audio_ext}"))
+                start_job(
+                    "transcribe_job", job_context, run_transcription_job,
+                    gladia, job_context.path(f"audio{audio_ext}"), gemini
+                )
+            except RuntimeError as e:
+                st.error(str(e))
+
+    # 文字起こしジョブの進捗表示・完了時の反映
+    transcribe_job = take_finished_job("transcribe_job")
+    if transcribe_job:
+        gladia_segments = transcribe_job["result"]["segments"]
+        gladia_words = transcribe_job["result"]["words"]
+        gemini_results = transcribe_job["result"].get("gemini") or {}
+        formatted_text = gemini_results.get("formatted")
+        audio_name = transcribe_job["params"]["audio_name"]
+        audio_filename = os.path.splitext(audio_name)[0]
+
+        if formatted_text:
+            generated_filename = gemini_results.get("filename")
+            if generated_filename:
+                audio_filename = generated_filename
+            if gemini_results.get("metadata"):
+                st.session_state.audio_upload_sns_content = gemini_results["metadata"]
+
+            # セッションに保存（単語リストも保存）
+            session_blobs.put("timestamped_segments", gladia_segments)
+            session_blobs.put("gladia_words", gladia_words)  # 単語レベルのタイムスタンプ
+            job_audio_name = "audio" + transcribe_job["params"].get("audio_ext", ".wav")
+            session_blobs.put("audio_file_data", job_manager.read_file(
+                transcribe_job["job_id"], job_audio_name, owner=job_owner
+            ))
+
+            # プロジェクトとして保存（再読み込み後に文字起こし・整形をやり直さない）
+            # 音声はジョブのファイルをそのままリンク・コピーする（メモリ上のデータは使わない）
+            try:
+                job_audio_path = job_manager.file_path(transcribe_job["job_id"], job_audio_name, owner=job_owner)
+                if job_audio_path is None:
+                    raise OSError(f"ジョブの音声ファイルがありません: {job_audio_name}")
+                project = create_project(audio_filename, owner=job_owner)
+                project.set_audio(job_audio_path, audio_name)
+                project.words = gladia_words
+                project.transcript_segments = gladia_segments
+                project.mark_stage("transcribe")
+                project.set_text(formatted_text)
+                project.mark_stage("format")
+                project.metadata["filename"] = audio_filename
+                if gemini_results.get("metadata"):
+                    project.metadata["sns_content"] = gemini_results["metadata"]
+                project.save()
+                st.session_state.project_id = project.project_id
+            except OSError as e:
+                print(f"プロジェクト保存エラー: {e}")
+                st.session_state.project_id = None
+            st.session_state.filename = audio_filename
+            st.session_state.audio_upload_mode = True
+            st.session_state.audio_text_editor = formatted_text
+            st.rerun()
+        else:
+            st.error("テキスト整形に失敗しました")
 
-            except Exception as e:
-                st.error(f"エラー: {str(e)}")
-                import traceback
-                st.code(traceback.format_exc())
-                if os.path.exists(tmp_audio_path):
-                    os.unlink(tmp_audio_path)
+    # 放置されたセッションのデータが破棄されていたら（音声がない）、編集を続けられないので案内する
+    if st.session_state.get('audio_upload_mode') and not session_blobs.has("audio_file_data"):
+        st.session_state.audio_upload_mode = False
+        st.session_state.pop('transcribed_upload_id', None)
+        st.warning("しばらく操作がなかったため音声データが破棄されました。音声ファイルを再アップロードするか、保存済みのプロジェクトを読み込んでください")
 
     # 2. テキスト編集（動画から生成と同じUI）
     if st.session_state.get('audio_text_editor') and st.session_state.get('audio_upload_mode'):
@@ -786,91 +1055,54 @@ with tab4:
 
         # 行数カウント
         lines = [line.strip() for line in edited_text.strip().split('\n') if line.strip()]
-        word_count = len(st.session_state.gladia_words) if st.session_state.get('gladia_words') else 0
+        # 単語列との対応はセッション管理領域のキャッシュに置き、編集のたびに単語リストを読み直さない
+        alignment_state = session_blobs.derived("gladia_words", AlignmentState)
+        word_count = len(alignment_state.stream) if alignment_state else 0
 
         st.success(f"**{len(lines)}行** / {word_count}単語のタイムスタンプで同期")
 
+        # 編集のたびに変更された行だけ再アライメントしてタイミングを更新
+        if word_count:
+            preview_segments = alignment_state.update(lines)
+
+            with st.expander("タイミングプレビュー", expanded=False):
+                st.caption(f"再計算した行: {alignment_state.last_realigned_lines} / {len(lines)}")
+                st.dataframe(
+                    [{
+                        "行": i + 1,
+                        "開始": f"{seg['start']:.2f}",
+                        "終了": f"{seg['end']:.2f}",
+                        "一致率": f"{seg['confidence']:.0%}",
+                        "テキスト": seg["text"]
+                    } for i, seg in enumerate(preview_segments)],
+                    hide_index=True,
+                    use_container_width=True
+                )
+
         # 3. 動画生成
         st.markdown("---")
         st.markdown("### 3. 動画を生成")
 
         if st.button("GENERATE VIDEO", key="generate_audio_upload_video_btn"):
             try:
-                progress_bar = st.progress(0)
                 status_text = st.empty()
-
                 status_text.text("タイムスタンプを計算中...")
-                progress_bar.progress(5)
 
                 # テキストを行に分割
                 lines = [line.strip() for line in edited_text.strip().split('\n') if line.strip()]
-                gladia_words = st.session_state.get('gladia_words', [])
-
-                # 単語レベルのタイムスタンプを使って各行のタイミングを計算
-                def calculate_line_timestamps(lines, words):
-                    """各行に含まれる単語を特定し、タイムスタンプを計算"""
-                    import re
-
-                    # 句読点を除去する関数
-                    def normalize(text):
-                        return re.sub(r'[、。,.\s　]', '', text)
-
-                    # 全単語を結合した文字列
-                    all_words_text = ''.join([w['word'] for w in words])
-                    all_words_text_normalized = normalize(all_words_text)
 
-                    # 各行のテキスト（句読点除去）
-                    lines_normalized = [normalize(line) for line in lines]
-
-                    segments = []
-                    word_index = 0
-                    current_pos = 0  # 単語リスト内での文字位置
-
-                    for line_idx, line in enumerate(lines):
-                        line_norm = lines_normalized[line_idx]
-                        if not line_norm:
-                            # 空行の場合はスキップ
-                            continue
-
-                        # この行の最初の単語を見つける
-                        start_word_idx = word_index
-                        chars_matched = 0
-
-                        # 行の文字数分の単語を消費
-                        while word_index < len(words) and chars_matched < len(line_norm):
-                            word = words[word_index]['word']
-                            word_norm = normalize(word)
-                            chars_matched += len(word_norm)
-                            word_index += 1
-
-                        end_word_idx = word_index - 1 if word_index > start_word_idx else start_word_idx
-
-                        # この行のタイムスタンプを設定
-                        if start_word_idx < len(words) and end_word_idx < len(words):
-                            start_time = words[start_word_idx]['start']
-                            end_time = words[end_word_idx]['end']
-                        else:
-                            # フォールバック: 均等分割
-                            total_duration = words[-1]['end'] if words else 1
-                            segment_duration = total_duration / len(lines)
-                            start_time = line_idx * segment_duration
-                            end_time = (line_idx + 1) * segment_duration
-
-                        segments.append({
-                            "start": start_time,
-                            "end": end_time,
-                            "text": line
-                        })
-
-                    return segments
-
-                if gladia_words:
+                if word_count:
                     # 単語レベルのタイムスタンプを使用
-                    segments = calculate_line_timestamps(lines, gladia_words)
+                    segments = [dict(seg) for seg in alignment_state.update(lines)]
                     status_text.text(f"単語レベルのタイムスタンプで同期: {len(segments)}行")
+                    low_confidence = [i + 1 for i, seg in enumerate(segments) if seg["confidence"] < 0.5]
+                    if low_confidence:
+                        st.warning(f"文字起こしと一致しない行があります（タイミングは前後から推定）: {low_confidence[:10]}行目")
                 else:
                     # フォールバック: 均等分割
-                    gladia_segments = st.session_state.timestamped_segments
+                    gladia_segments = session_blobs.get("timestamped_segments")
+                    if not gladia_segments:
+                        raise ValueError("文字起こしのタイムスタンプがありません。音声ファイルを再アップロードしてください")
                     total_start = gladia_segments[0]['start']
                     total_end = gladia_segments[-1]['end']
                     total_duration = total_end - total_start
@@ -886,77 +1118,51 @@ with tab4:
                             "text": text
                         })
 
-                progress_bar.progress(10)
-
-                # 一時ファイルに音声を保存
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                    tmp_file.write(st.session_state.audio_file_data)
-                    tmp_audio_path = tmp_file.name
-
-                def update_progress(current, total, message):
-                    progress = int(10 + (current / total) * 85)
-                    progress_bar.progress(progress)
-
-                video_gen = VideoGeneratorFFmpeg(
-                    background_color=(0, 255, 0),
-                    voicevox_url=voicevox_url
-                )
-
-                video_transparent, video_preview = video_gen.create_video_from_timestamped_segments(
-                    audio_path=tmp_audio_path,
-                    segments=segments,
-                    width=1080,
-                    height=1920,
-                    transparent=True,
-                    progress_callback=update_progress
-                )
-
-                os.unlink(tmp_audio_path)
-
-                if video_transparent:
-                    st.session_state.generated_video = video_transparent
-                    st.session_state.preview_video = video_preview
-                    progress_bar.progress(100)
-                    status_text.text("動画生成完了！")
-                    st.rerun()
+                video_gen = get_video_generator((0, 255, 0), voicevox_url)
+                project = load_project(st.session_state.project_id, owner=job_owner) if st.session_state.get('project_id') else None
+                audio_data = None
+                if not (project and project.audio_path):
+                    audio_data = session_blobs.get("audio_file_data")
+                    if audio_data is None:
+                        raise ValueError("音声データがありません。音声ファイルを再アップロードしてください")
+                job_context = job_manager.create_job("render", job_owner, params={"lines": len(segments)})
+
+                if audio_data is None:
+                    # プロジェクト経由で生成（同じタイミングなら生成済みの動画を再利用）
+                    project.set_text(edited_text)
+                    project.set_segments(segments)
+                    project.save()
+                    start_job("render_job", job_context, run_project_render_job, video_gen, project.project_id)
+                else:
+                    # ジョブディレクトリに音声を保存
+                    with open(job_context.path("audio.wav"), "wb") as f:
+                        f.write(audio_data)
+                    start_job(
+                        "render_job", job_context, run_render_job,
+                        video_gen, job_context.path("audio.wav"), segments
+                    )
+                status_text.text("動画生成を開始しました（ページを再読み込みしても続行されます）")
 
             except Exception as e:
                 st.error(f"動画生成エラー: {str(e)}")
                 import traceback
                 st.code(traceback.format_exc())
 
+        # 動画生成ジョブの進捗表示・完了時の反映
+        render_job = take_finished_job("render_job")
+        if render_job:
+            apply_render_job(render_job)
+    elif st.session_state.get('render_job'):
+        # 再接続直後（編集内容がまだセッションにない）
+        render_job = take_finished_job("render_job")
+        if render_job:
+            apply_render_job(render_job)
+
     # プレビューとダウンロード
-    if st.session_state.get('generated_video') and st.session_state.get('preview_video') and st.session_state.get('audio_upload_mode'):
+    if st.session_state.get('generated_video_id') and st.session_state.get('preview_video_id') and st.session_state.get('audio_upload_mode'):
         st.markdown("---")
         st.subheader("プレビュー")
-
-        col1, col2, col3 = st.columns([1, 1, 1])
-        with col2:
-            video_base64 = base64.b64encode(st.session_state.preview_video).decode()
-            st.markdown(f'''
-            <div class="iphone-frame">
-                <div class="iphone-device">
-                    <div class="iphone-dynamic-island"></div>
-                    <div class="iphone-screen">
-                        <video controls playsinline>
-                            <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
-                        </video>
-                    </div>
-                    <div class="iphone-home-indicator"></div>
-                </div>
-            </div>
-            ''', unsafe_allow_html=True)
-
-        st.info("プレビューはチェッカー背景で表示。ダウンロードは透過動画（MOV）です。")
-        st.caption(f"🔤 使用フォント: **{_font_info['name']}**（{_font_info['size']}px）")
-
-        st.download_button(
-            label="DOWNLOAD VIDEO (.mov)",
-            data=st.session_state.generated_video,
-            file_name=f"{st.session_state.filename}.mov",
-            mime="video/quicktime",
-            key="download_audio_upload_video"
-        )
+        show_generated_video(st.session_state.filename, "download_audio_upload_video")
 
         # SNSコンテンツ生成
         st.markdown("---")
@@ -998,6 +1204,12 @@ with tab4:
                 key="download_audio_upload_full_text"
             )
 
+# 再接続直後（整形テキストがまだセッションにない）はセクション3のジョブをここで待つ
+if not st.session_state.formatted_text and st.session_state.get('sec3_render_job'):
+    sec3_render_job = take_finished_job("sec3_render_job")
+    if sec3_render_job:
+        apply_sec3_render_job(sec3_render_job)
+
 # セクション2: 整形済みテキスト表示
 if st.session_state.formatted_text:
     st.header("2. テキスト編集")
@@ -1009,45 +1221,11 @@ if st.session_state.formatted_text:
         st.session_state.filename = "output"
 
     # テキストダウンロード用のフォーマット関数
-    def format_text_for_download(text: str, target_length: int = 14) -> str:
-        lines = text.split('\n')
-        new_lines = []
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            chunks = []
-            current_chunk = ""
-            for char in line:
-                if char in ['。', '、']:
-                    if current_chunk:
-                        chunks.append(current_chunk)
-                        current_chunk = ""
-                else:
-                    current_chunk += char
-            if current_chunk:
-                chunks.append(current_chunk)
-
-            current_line = ""
-            for chunk in chunks:
-                chunk = chunk.strip()
-                if not chunk:
-                    continue
-                if not current_line:
-                    current_line = chunk
-                    continue
-                combined_len = len(current_line + chunk)
-                if combined_len > target_length + 4:
-                    new_lines.append(current_line)
-                    current_line = chunk
-                elif abs(target_length - combined_len) <= abs(target_length - len(current_line)):
-                    current_line += chunk
-                else:
-                    new_lines.append(current_line)
-                    current_line = chunk
-            if current_line:
-                new_lines.append(current_line)
-        return '\n'.join(new_lines)
+    def format_text_for_download(text: str, target_length: int = MAX_LINE_CHARS) -> str:
+        """動画と同じ改行エンジンで改行し、句読点を除いた行にする"""
+        lines = break_lines(text, max_chars=target_length).split('\n')
+        lines = [line.replace('。', '').replace('、', '') for line in lines]
+        return '\n'.join(line for line in lines if line)
 
     # 2カラムレイアウト：整形テキスト（左）とひらがな（右）
     col_text, col_hiragana = st.columns(2)
@@ -1128,173 +1306,42 @@ if st.session_state.formatted_text:
     )
 
     if uploaded_audio_sec3:
-        st.audio(uploaded_audio_sec3, format=f"audio/{uploaded_audio_sec3.name.split('.')[-1]}")
+        saved_audio_sec3 = get_saved_upload("audio_uploader_sec3", uploaded_audio_sec3)
+        st.audio(saved_audio_sec3.path, format=f"audio/{saved_audio_sec3.ext.lstrip('.')}")
 
         if st.button("GENERATE VIDEO", key="generate_video_sec3_btn"):
-            try:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                status_text.text("音声ファイルを処理中...")
-                progress_bar.progress(10)
-
-                # 音声ファイルを一時保存
-                uploaded_audio_sec3.seek(0)
-                audio_data = uploaded_audio_sec3.read()
-
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_audio_sec3.name.split('.')[-1]}") as tmp_file:
-                    tmp_file.write(audio_data)
-                    tmp_audio_path = tmp_file.name
-
-                # テキストを行に分割
-                display_text = st.session_state.text_editor
-                lines = [line.strip() for line in display_text.strip().split('\n') if line.strip()]
-
-                status_text.text("文字起こし中（タイムスタンプ取得）...")
-                progress_bar.progress(20)
-
-                # Gladiaで音声のタイムスタンプを取得
-                if gladia_api_key:
-                    try:
-                        result = gladia.transcribe_from_file_with_timestamps(tmp_audio_path, language="ja")
-                    except Exception as e:
-                        st.error(f"Gladia API エラー: {e}")
-                        os.unlink(tmp_audio_path)
-                        st.stop()
-
-                    if result and result.get("words"):
-                        gladia_words = result["words"]
-
-                        # 単語レベルのタイムスタンプを使って各行のタイミングを計算
-                        import re
-                        def normalize(text):
-                            return re.sub(r'[、。,.\s　]', '', text)
-
-                        segments = []
-                        word_index = 0
-
-                        for line_idx, line in enumerate(lines):
-                            line_norm = normalize(line)
-                            if not line_norm:
-                                continue
-
-                            start_word_idx = word_index
-                            chars_matched = 0
-
-                            while word_index < len(gladia_words) and chars_matched < len(line_norm):
-                                word = gladia_words[word_index]['word']
-                                word_norm = normalize(word)
-                                chars_matched += len(word_norm)
-                                word_index += 1
-
-                            end_word_idx = word_index - 1 if word_index > start_word_idx else start_word_idx
-
-                            if start_word_idx < len(gladia_words) and end_word_idx < len(gladia_words):
-                                start_time = gladia_words[start_word_idx]['start']
-                                end_time = gladia_words[end_word_idx]['end']
-                                # end_timeがstart_time以下の場合は修正
-                                if end_time <= start_time:
-                                    end_time = start_time + 0.5
-                            else:
-                                total_duration = gladia_words[-1]['end'] if gladia_words else 1
-                                segment_duration = total_duration / len(lines)
-                                start_time = line_idx * segment_duration
-                                end_time = (line_idx + 1) * segment_duration
-
-                            # 最小持続時間を保証（0.1秒以上）
-                            if end_time - start_time < 0.1:
-                                end_time = start_time + 0.5
-
-                            segments.append({
-                                "start": start_time,
-                                "end": end_time,
-                                "text": line
-                            })
-
-                        status_text.text(f"タイムスタンプ取得完了: {len(segments)}行")
-                    else:
-                        if result is None:
-                            st.error("タイムスタンプの取得に失敗しました（音声アップロードまたは文字起こしエラー）")
-                        elif not result.get("words"):
-                            st.error("タイムスタンプの取得に失敗しました（単語データが空です）")
-                            if result.get("segments"):
-                                st.warning(f"セグメントは取得できました: {len(result['segments'])}個")
-                        else:
-                            st.error("タイムスタンプの取得に失敗しました")
-                        st.warning("考えられる原因: APIキーの有効期限切れ、音声ファイル形式、ネットワークエラー")
-                        os.unlink(tmp_audio_path)
-                        st.stop()
-                else:
-                    st.error("Gladia APIキーを設定してください")
-                    os.unlink(tmp_audio_path)
-                    st.stop()
-
-                progress_bar.progress(40)
-                status_text.text("動画を生成中...")
-
-                def update_progress(current, total, message):
-                    progress = int(40 + (current / total) * 50)
-                    progress_bar.progress(progress)
-
-                video_gen = VideoGeneratorFFmpeg(
-                    background_color=(0, 255, 0),
-                    voicevox_url=voicevox_url
-                )
-
-                video_transparent, video_preview = video_gen.create_video_from_timestamped_segments(
-                    audio_path=tmp_audio_path,
-                    segments=segments,
-                    width=1080,
-                    height=1920,
-                    transparent=True,
-                    progress_callback=update_progress
-                )
-
-                os.unlink(tmp_audio_path)
-
-                if video_transparent:
-                    st.session_state.generated_video = video_transparent
-                    st.session_state.preview_video = video_preview
-                    progress_bar.progress(100)
-                    status_text.text("動画生成完了！")
-                    st.rerun()
+            # テキストを行に分割
+            display_text = st.session_state.text_editor
+            lines = [line.strip() for line in display_text.strip().split('\n') if line.strip()]
 
-            except Exception as e:
-                st.error(f"動画生成エラー: {str(e)}")
-                import traceback
-                st.code(traceback.format_exc())
+            if not gladia_api_key:
+                st.error("Gladia APIキーを設定してください")
+            else:
+                try:
+                    # 音声ファイルをジョブディレクトリに保存し、文字起こし〜動画生成をジョブで実行
+                    audio_ext = saved_audio_sec3.ext or ".wav"
+                    job_context = job_manager.create_job(
+                        "transcribe_render", job_owner,
+                        params={"text": display_text, "filename": final_filename, "sha256": saved_audio_sec3.sha256}
+                    )
+                    saved_audio_sec3.copy_to(job_context.path(f"audio{audio_ext}"))
+                    start_job(
+                        "sec3_render_job", job_context, run_transcribe_render_job,
+                        gladia, get_video_generator((0, 255, 0), voicevox_url),
+                        job_context.path(f"audio{audio_ext}"), lines
+                    )
+                except RuntimeError as e:
+                    st.error(str(e))
+
+    # 文字起こし〜動画生成ジョブの進捗表示・完了時の反映
+    sec3_render_job = take_finished_job("sec3_render_job")
+    if sec3_render_job:
+        apply_sec3_render_job(sec3_render_job)
 
     # 動画プレビューとダウンロード
-    if st.session_state.get('generated_video') and st.session_state.get('preview_video'):
+    if st.session_state.get('generated_video_id') and st.session_state.get('preview_video_id'):
         st.subheader("プレビュー")
-
-        col1, col2, col3 = st.columns([1, 1, 1])
-        with col2:
-            video_base64 = base64.b64encode(st.session_state.preview_video).decode()
-            st.markdown(f'''
-            <div class="iphone-frame">
-                <div class="iphone-device">
-                    <div class="iphone-dynamic-island"></div>
-                    <div class="iphone-screen">
-                        <video controls playsinline>
-                            <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
-                        </video>
-                    </div>
-                    <div class="iphone-home-indicator"></div>
-                </div>
-            </div>
-            ''', unsafe_allow_html=True)
-
-        st.info("プレビューはチェッカー背景で表示。ダウンロードは透過動画（MOV）です。")
-        st.caption(f"🔤 使用フォント: **{_font_info['name']}**（{_font_info['size']}px）")
-
-        st.download_button(
-            label="DOWNLOAD VIDEO (.mov)",
-            data=st.session_state.generated_video,
-            file_name=f"{final_filename}.mov",
-            mime="video/quicktime",
-            key="download_video_sec3"
-        )
+        show_generated_video(final_filename, "download_video_sec3")
 
     # セクション4: SNSコンテンツ生成
     st.header("4. タイトル・紹介文・ハッシュタグ生成")
@@ -1336,6 +1383,9 @@ if st.session_state.formatted_text:
             key="download_full_text"
         )
 
+# このセッションの session_state のサイズを記録（管理画面のメモリ表示用）
+session_blobs.record_state(sum(estimate_size(value) for value in st.session_state.to_dict().values()))
+
 # フッター
 st.markdown("---")
 st.markdown("Made with Streamlit, Gladia API, Gemini API, and FFmpeg | **v3**")
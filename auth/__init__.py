@@ -1,6 +1,7 @@
 """Authentication module for TikTok Re-Editor v3"""
 from .lark_base import LarkBaseClient
-from .user_manager import UserManager, UserStatus
+from .user_cache import UserCache, invalidate_user
+from .user_manager import UserManager, UserStatus, get_user_manager
 from .auth_ui import (
     check_auth,
     get_current_user,
@@ -17,6 +18,9 @@ __all__ = [
     "LarkBaseClient",
     "UserManager",
     "UserStatus",
+    "get_user_manager",
+    "UserCache",
+    "invalidate_user",
     "check_auth",
     "get_current_user",
     "is_current_user_admin",
@@ -1,6 +1,7 @@
 """Authentication UI components for TikTok Re-Editor v3"""
 import streamlit as st
-from .user_manager import UserManager, UserStatus
+from .user_cache import UserCache
+from .user_manager import UserStatus, get_user_manager
 
 
 def render_login_page():
@@ -73,7 +74,7 @@ def render_registration_form(email: str, google_id: str):
                 st.error("利用規約に同意してください")
             else:
                 try:
-                    user_manager = UserManager()
+                    user_manager = get_user_manager()
                     user = user_manager.create_user(
                         google_id=google_id,
                         email=email,
@@ -119,6 +120,7 @@ def render_pending_page(nickname: str):
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🔄 ステータスを確認", use_container_width=True):
+            UserCache(st.session_state).invalidate()
             st.rerun()
     with col2:
         if st.button("🚪 ログアウト", use_container_width=True):
@@ -192,6 +194,23 @@ def _is_cloud_environment():
         return False
 
 
+def load_session_user(google_id: str, store=None, user_manager=None):
+    """Get the signed-in user from the session cache and record the login once per session
+
+    store defaults to st.session_state and user_manager to the shared
+    UserManager; both can be passed explicitly to run outside Streamlit.
+    """
+    user_manager = user_manager or get_user_manager()
+    user_cache = UserCache(st.session_state if store is None else store)
+    user = user_cache.get_user(google_id, user_manager.get_user_by_google_id)
+
+    # Update last login once per session
+    if user and not user_cache.login_tracked(google_id):
+        user_manager.update_last_login(google_id, user.get("record_id"))
+        user_cache.mark_login_tracked(google_id)
+    return user
+
+
 def check_auth():
     """
     Check authentication status and render appropriate UI.
@@ -211,9 +230,8 @@ def check_auth():
     email = st.user.email
     google_id = st.user.sub  # Google's unique user ID
 
-    # Check if user exists in database
-    user_manager = UserManager()
-    user = user_manager.get_user_by_google_id(google_id)
+    # Check if user exists in database (cached per session with a short TTL)
+    user = load_session_user(google_id)
 
     if not user:
         # New user - show registration form
@@ -221,9 +239,6 @@ def check_auth():
         st.stop()
         return False
 
-    # Update last login
-    user_manager.update_last_login(google_id)
-
     # Check user status
     status = user.get("status", UserStatus.PENDING)
     nickname = user.get("nickname", "ユーザー")
@@ -256,8 +271,8 @@ def get_current_user():
 
     google_id = st.user.sub
 
-    user_manager = UserManager()
-    return user_manager.get_user_by_google_id(google_id)
+    user_manager = get_user_manager()
+    return UserCache(st.session_state).get_user(google_id, user_manager.get_user_by_google_id)
 
 
 def is_current_user_admin():
@@ -266,9 +281,9 @@ def is_current_user_admin():
     if not user:
         return False
 
-    # Also check the secrets admin list
-    user_manager = UserManager()
-    return user.get("is_admin", False) or user_manager.is_admin(user.get("email", ""))
+    # Also check the secrets admin list (the record itself is already loaded)
+    user_manager = get_user_manager()
+    return user.get("is_admin", False) or user.get("email", "") in user_manager.admin_emails
 
 
 def render_user_menu():
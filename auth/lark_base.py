@@ -1,47 +1,168 @@
 """Lark Base API client for user management"""
+import os
+import random
+import threading
+import time
 import requests
-from datetime import datetime
-from typing import Optional, Dict, List, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, List, Any, Tuple
 import streamlit as st
 
-
-class LarkBaseClient:
-    """Lark Base API client"""
-
-    BASE_URL = "https://open.larksuite.com/open-apis"
-
-    def __init__(self):
-        """Initialize with credentials from Streamlit secrets"""
-        self.app_id = st.secrets["lark"]["app_id"]
-        self.app_secret = st.secrets["lark"]["app_secret"]
-        self.base_app_token = st.secrets["lark"]["base_app_token"]
-        self.table_id = st.secrets["lark"]["table_id"]
-        self._tenant_access_token: Optional[str] = None
-        self._token_expires_at: Optional[datetime] = None
-
-    def _get_tenant_access_token(self) -> str:
-        """Get or refresh tenant access token"""
-        now = datetime.now()
-        if self._tenant_access_token and self._token_expires_at and now < self._token_expires_at:
-            return self._tenant_access_token
-
-        url = f"{self.BASE_URL}/auth/v3/tenant_access_token/internal"
-        response = requests.post(url, json={
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        })
+DEFAULT_BASE_URL = "https://open.larksuite.com/open-apis"
+
+# Lark error codes signalling an expired/invalid tenant token or rate limiting
+_INVALID_TOKEN_CODES = {99991661, 99991663, 99991668}
+_RATE_LIMIT_CODES = {99991400}
+
+
+def retry_delay(response: Optional[requests.Response], attempt: int, max_delay: float = 30.0) -> float:
+    """Seconds to wait before retrying (honours Lark's rate-limit headers)"""
+    if response is not None:
+        for header in ("x-ogw-ratelimit-reset", "Retry-After"):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return min(max(float(value), 0.0), max_delay)
+                except ValueError:
+                    pass
+    # Exponential backoff with jitter
+    return min(0.5 * (2 ** attempt) + random.uniform(0, 0.25), max_delay)
+
+
+class TenantTokenManager:
+    """Process-wide tenant access token cache with single-flight refresh
+
+    Concurrent callers share one token. When it needs refreshing, only one
+    thread calls the token endpoint; the others wait for its result.
+    """
+
+    def __init__(self, base_url: str, app_id: str, app_secret: str, session: requests.Session,
+                 refresh_margin: float = 300.0, timeout: float = 10.0):
+        self.base_url = base_url
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.session = session
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.refresh_count = 0
+
+    def get_token(self) -> str:
+        """Get a valid token, refreshing it if needed"""
+        token, expires_at = self._token, self._expires_at
+        if token and time.monotonic() < expires_at:
+            return token
+
+        with self._refresh_lock:
+            # Another thread may have refreshed while we were waiting
+            if self._token and time.monotonic() < self._expires_at:
+                return self._token
+            return self._refresh()
+
+    def invalidate(self, token: str) -> None:
+        """Drop the token if it is still the current one (e.g. rejected by the API)"""
+        with self._refresh_lock:
+            if self._token == token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def _refresh(self, max_retries: int = 3) -> str:
+        url = f"{self.base_url}/auth/v3/tenant_access_token/internal"
+        for attempt in range(max_retries + 1):
+            response = self.session.post(url, json={
+                "app_id": self.app_id,
+                "app_secret": self.app_secret
+            }, timeout=self.timeout)
+            if (response.status_code == 429 or response.status_code >= 500) and attempt < max_retries:
+                time.sleep(retry_delay(response, attempt))
+                continue
+            break
         response.raise_for_status()
         data = response.json()
 
         if data.get("code") != 0:
             raise Exception(f"Failed to get tenant access token: {data.get('msg')}")
 
-        self._tenant_access_token = data["tenant_access_token"]
         # Token expires in 2 hours, refresh 5 minutes before
-        from datetime import timedelta
-        self._token_expires_at = now + timedelta(seconds=data["expire"] - 300)
+        self._expires_at = time.monotonic() + max(0.0, data["expire"] - self.refresh_margin)
+        self._token = data["tenant_access_token"]
+        self.refresh_count += 1
+        return self._token
+
+
+_token_managers: Dict[Tuple[str, str], TenantTokenManager] = {}
+_token_managers_lock = threading.Lock()
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Get the pooled HTTP session shared by all Lark clients in this process"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _shared_session = session
+        return _shared_session
+
+
+def get_token_manager(base_url: str, app_id: str, app_secret: str) -> TenantTokenManager:
+    """Get the process-wide token manager for an app"""
+    key = (base_url, app_id)
+    with _token_managers_lock:
+        manager = _token_managers.get(key)
+        if manager is None or manager.app_secret != app_secret:
+            manager = TenantTokenManager(base_url, app_id, app_secret, get_http_session())
+            _token_managers[key] = manager
+        return manager
+
+
+class LarkBaseClient:
+    """Lark Base API client"""
 
-        return self._tenant_access_token
+    BASE_URL = DEFAULT_BASE_URL
+    TIMEOUT = (5, 30)  # (connect, read) seconds
+    MAX_RETRIES = 3
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(
+        self,
+        app_id: Optional[str] = None,
+        app_secret: Optional[str] = None,
+        base_app_token: Optional[str] = None,
+        table_id: Optional[str] = None,
+        base_url: Optional[str] = None,
+        session: Optional[requests.Session] = None
+    ):
+        """Initialize with explicit credentials or credentials from Streamlit secrets"""
+        if app_id and app_secret and base_app_token and table_id:
+            lark = {}
+        else:
+            lark = st.secrets["lark"]
+        self.app_id = app_id or lark["app_id"]
+        self.app_secret = app_secret or lark["app_secret"]
+        self.base_app_token = base_app_token or lark["base_app_token"]
+        self.table_id = table_id or lark["table_id"]
+        self.base_url = (
+            base_url
+            or lark.get("base_url")
+            or os.environ.get("LARK_BASE_URL")
+            or self.BASE_URL
+        ).rstrip("/")
+        self.session = session or get_http_session()
+        if session is None:
+            self.token_manager = get_token_manager(self.base_url, self.app_id, self.app_secret)
+        else:
+            self.token_manager = TenantTokenManager(self.base_url, self.app_id, self.app_secret, session)
+
+    def _get_tenant_access_token(self) -> str:
+        """Get or refresh tenant access token"""
+        return self.token_manager.get_token()
 
     def _headers(self) -> Dict[str, str]:
         """Get headers with authorization"""
@@ -50,34 +171,105 @@ class LarkBaseClient:
             "Content-Type": "application/json"
         }
 
+    def _retry_delay(self, response: Optional[requests.Response], attempt: int) -> float:
+        """Seconds to wait before retrying (honours Lark's rate-limit headers)"""
+        return retry_delay(response, attempt, self.MAX_RETRY_DELAY)
+
+    def _request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """Send an authorized request with timeout and retry on 429/5xx
+
+        Idempotent requests (GET/PUT/DELETE by default, or POSTs marked
+        idempotent=True such as searches) are retried on timeouts, connection
+        errors and 5xx. Other requests (record creation) may already have been
+        applied when the response is lost, so they are only retried when the
+        connection could not be established or Lark rate-limited them.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD", "PUT", "DELETE")
+        retry_errors = (
+            (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+            if idempotent else (requests.exceptions.ConnectTimeout,)
+        )
+        token_refreshed = False
+        attempt = 0
+        while True:
+            token = self._get_tenant_access_token()
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=self.TIMEOUT, **kwargs)
+            except retry_errors:
+                if attempt >= self.MAX_RETRIES:
+                    raise
+                time.sleep(self._retry_delay(None, attempt))
+                attempt += 1
+                continue
+
+            code = None
+            if response.status_code in (400, 401, 403, 429):
+                try:
+                    code = response.json().get("code")
+                except ValueError:
+                    pass
+
+            if code in _INVALID_TOKEN_CODES and not token_refreshed:
+                self.token_manager.invalidate(token)
+                token_refreshed = True
+                continue
+
+            retryable = response.status_code == 429 or code in _RATE_LIMIT_CODES
+            if idempotent and response.status_code >= 500:
+                retryable = True
+            if retryable and attempt < self.MAX_RETRIES:
+                delay = self._retry_delay(response, attempt)
+                print(f"Lark API {response.status_code} (code={code}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            return response
+
     def search_records(self, filter_condition: Optional[Dict] = None) -> List[Dict[str, Any]]:
-        """Search records in the table"""
-        url = f"{self.BASE_URL}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/search"
+        """Search records in the table (follows page tokens until all matches are fetched)"""
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/search"
 
-        payload = {
-            "page_size": 500
-        }
+        payload = {}
         if filter_condition:
             payload["filter"] = filter_condition
 
-        response = requests.post(url, headers=self._headers(), json=payload)
-        response.raise_for_status()
-        data = response.json()
+        all_records = []
+        page_token = None
+        while True:
+            params = {"page_size": 500}
+            if page_token:
+                params["page_token"] = page_token
 
-        if data.get("code") != 0:
-            error_code = data.get("code")
-            error_msg = data.get("msg", "Unknown error")
-            # 権限エラーや空テーブルの場合は空リストを返す
-            if error_code in [1254040, 1254041, 1254043]:  # Common permission/not found errors
-                return []
-            raise Exception(f"Failed to search records (code={error_code}): {error_msg}")
+            response = self._request("POST", url, idempotent=True, params=params, json=payload)
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get("code") != 0:
+                error_code = data.get("code")
+                error_msg = data.get("msg", "Unknown error")
+                # 権限エラーや空テーブルの場合は空リストを返す
+                if error_code in [1254040, 1254041, 1254043]:  # Common permission/not found errors
+                    return []
+                raise Exception(f"Failed to search records (code={error_code}): {error_msg}")
+
+            all_records.extend(data.get("data", {}).get("items") or [])
+
+            page_token = data.get("data", {}).get("page_token")
+            if not page_token or not data.get("data", {}).get("has_more"):
+                break
 
-        return data.get("data", {}).get("items", [])
+        return all_records
 
     def get_record_by_field(self, field_name: str, field_value: str) -> Optional[Dict[str, Any]]:
         """Get a single record by field value using list API with filter"""
         # Use list API instead of search API (lower permission requirements)
-        url = f"{self.BASE_URL}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records"
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records"
 
         params = {
             "page_size": 500,
@@ -85,7 +277,7 @@ class LarkBaseClient:
         }
 
         try:
-            response = requests.get(url, headers=self._headers(), params=params)
+            response = self._request("GET", url, params=params)
             response.raise_for_status()
             data = response.json()
 
@@ -112,9 +304,9 @@ class LarkBaseClient:
 
     def create_record(self, fields: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new record"""
-        url = f"{self.BASE_URL}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records"
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records"
 
-        response = requests.post(url, headers=self._headers(), json={"fields": fields})
+        response = self._request("POST", url, json={"fields": fields})
         response.raise_for_status()
         data = response.json()
 
@@ -125,9 +317,9 @@ class LarkBaseClient:
 
     def update_record(self, record_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing record"""
-        url = f"{self.BASE_URL}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/{record_id}"
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/{record_id}"
 
-        response = requests.put(url, headers=self._headers(), json={"fields": fields})
+        response = self._request("PUT", url, json={"fields": fields})
         response.raise_for_status()
         data = response.json()
 
@@ -136,11 +328,52 @@ class LarkBaseClient:
 
         return data.get("data", {}).get("record", {})
 
+    BATCH_LIMIT = 500  # Max records per batch request
+
+    def batch_get_records(self, record_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get records by record_id (chunked by BATCH_LIMIT)"""
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/batch_get"
+
+        records = []
+        for i in range(0, len(record_ids), self.BATCH_LIMIT):
+            chunk = record_ids[i:i + self.BATCH_LIMIT]
+            response = self._request("POST", url, idempotent=True, json={"record_ids": chunk})
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get("code") != 0:
+                raise Exception(f"Failed to batch get records (code={data.get('code')}): {data.get('msg')}")
+
+            records.extend(data.get("data", {}).get("records", []))
+        return records
+
+    def batch_update_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Update multiple records (chunked by BATCH_LIMIT)
+
+        Args:
+            records: [{"record_id": "rec...", "fields": {...}}, ...]
+        """
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/batch_update"
+
+        updated = []
+        for i in range(0, len(records), self.BATCH_LIMIT):
+            chunk = records[i:i + self.BATCH_LIMIT]
+            # Same payload sets the same field values, so a retry is safe
+            response = self._request("POST", url, idempotent=True, json={"records": chunk})
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get("code") != 0:
+                raise Exception(f"Failed to batch update records (code={data.get('code')}): {data.get('msg')}")
+
+            updated.extend(data.get("data", {}).get("records", []))
+        return updated
+
     def delete_record(self, record_id: str) -> bool:
         """Delete a record"""
-        url = f"{self.BASE_URL}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/{record_id}"
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records/{record_id}"
 
-        response = requests.delete(url, headers=self._headers())
+        response = self._request("DELETE", url)
         response.raise_for_status()
         data = response.json()
 
@@ -148,7 +381,7 @@ class LarkBaseClient:
 
     def get_all_records(self) -> List[Dict[str, Any]]:
         """Get all records from the table"""
-        url = f"{self.BASE_URL}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records"
+        url = f"{self.base_url}/bitable/v1/apps/{self.base_app_token}/tables/{self.table_id}/records"
 
         all_records = []
         page_token = None
@@ -159,7 +392,7 @@ class LarkBaseClient:
                 if page_token:
                     params["page_token"] = page_token
 
-                response = requests.get(url, headers=self._headers(), params=params)
+                response = self._request("GET", url, params=params)
                 response.raise_for_status()
                 data = response.json()
 
@@ -0,0 +1,202 @@
+"""Write-behind queue for login statistics"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+
+def parse_login_count(value: Any) -> int:
+    """Parse the ログイン回数 field (handles None, empty string, or non-numeric values)"""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class _PendingLogin:
+    """Aggregated login events of one user waiting to be flushed"""
+
+    def __init__(self, record_id: Optional[str]):
+        self.record_id = record_id
+        self.count = 0
+        self.last_login = ""
+        self.attempts = 0  # failed flushes that included these events
+
+
+def _is_permanent_error(error: Exception) -> bool:
+    """True for client errors (4xx except 429) that will fail again on retry"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return 400 <= status < 500 and status != 429
+    return False
+
+
+class LoginTracker:
+    """Aggregates login events per user and writes them to Lark Base in batches
+
+    record_login() only updates an in-memory table and returns immediately.
+    A background thread flushes every flush_interval seconds: it reads the
+    current counts with one batch_get, adds the pending increments and writes
+    them back with batch_update, one chunk of BATCH_LIMIT records at a time.
+    Flushes are serialized, so concurrent logins in this process never
+    overwrite each other. Only the chunks that were not written are put back
+    for the next flush; entries rejected with a 4xx or failing
+    MAX_FLUSH_ATTEMPTS times are dropped so they are not retried forever.
+    """
+
+    MAX_FLUSH_ATTEMPTS = 5
+
+    def __init__(self, client, flush_interval: float = 5.0):
+        self.client = client
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, _PendingLogin] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed_events = 0
+        self.failed_flushes = 0
+        self.dropped_events = 0
+
+    def record_login(self, google_id: str, record_id: Optional[str] = None) -> None:
+        """Queue a login event (never blocks on the network)"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            pending = self._pending.get(google_id)
+            if pending is None:
+                pending = _PendingLogin(record_id)
+                self._pending[google_id] = pending
+            pending.record_id = pending.record_id or record_id
+            pending.count += 1
+            pending.last_login = now
+        self._ensure_thread()
+
+    def pending_count(self) -> int:
+        """Number of login events waiting to be flushed"""
+        with self._lock:
+            return sum(p.count for p in self._pending.values())
+
+    def flush(self) -> int:
+        """Write all pending events now. Returns the number of events written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+            if not batch:
+                return 0
+
+            written = 0
+            chunk: List[Tuple[str, Dict[str, Any]]] = []
+            try:
+                for chunk in self._prepare_updates(batch):
+                    self.client.batch_update_records([update for _, update in chunk])
+                    for google_id, _ in chunk:
+                        written += batch.pop(google_id).count
+                chunk = []
+            except Exception as e:
+                print(f"Login tracking flush failed: {e}")
+                self.failed_flushes += 1
+                # Chunks already written are gone from batch; blame only the failed chunk
+                # (or every entry when the failure happened before any update was sent)
+                failed_ids = [google_id for google_id, _ in chunk] or list(batch)
+                permanent = _is_permanent_error(e)
+                for google_id in failed_ids:
+                    pending = batch[google_id]
+                    pending.attempts += 1
+                    if permanent or pending.attempts >= self.MAX_FLUSH_ATTEMPTS:
+                        del batch[google_id]
+                        self.dropped_events += pending.count
+                        print(f"Login tracking dropped {pending.count} event(s) for record {pending.record_id}")
+                self._requeue(batch)
+
+            self.flushed_events += written
+            return written
+
+    def stop(self, flush: bool = True) -> None:
+        """Stop the background thread (optionally flushing what is left)"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+        if flush:
+            self.flush()
+
+    def _prepare_updates(self, batch: Dict[str, _PendingLogin]) -> List[List[Tuple[str, Dict[str, Any]]]]:
+        """Build the batch_update payload in chunks of (google_id, update) pairs
+
+        Entries whose user record no longer exists are removed from batch.
+        """
+        # Resolve record IDs that were not known when the login was queued
+        for google_id, pending in batch.items():
+            if not pending.record_id:
+                record = self.client.get_record_by_field("GoogleID", google_id)
+                pending.record_id = record["record_id"] if record else None
+
+        record_ids = list(dict.fromkeys(p.record_id for p in batch.values() if p.record_id))
+        current = {}
+        if record_ids:
+            current = {
+                record["record_id"]: parse_login_count(record.get("fields", {}).get("ログイン回数"))
+                for record in self.client.batch_get_records(record_ids)
+            }
+
+        updates = []
+        for google_id, pending in list(batch.items()):
+            if pending.record_id not in current:
+                del batch[google_id]
+                continue
+            updates.append((google_id, {
+                "record_id": pending.record_id,
+                "fields": {
+                    "最終ログイン": pending.last_login,
+                    "ログイン回数": current[pending.record_id] + pending.count
+                }
+            }))
+
+        limit = getattr(self.client, "BATCH_LIMIT", 500)
+        return [updates[i:i + limit] for i in range(0, len(updates), limit)]
+
+    def _requeue(self, batch: Dict[str, _PendingLogin]) -> None:
+        with self._lock:
+            for google_id, failed in batch.items():
+                pending = self._pending.get(google_id)
+                if pending is None:
+                    self._pending[google_id] = failed
+                    continue
+                pending.count += failed.count
+                pending.record_id = pending.record_id or failed.record_id
+                pending.last_login = max(pending.last_login, failed.last_login)
+                pending.attempts = max(pending.attempts, failed.attempts)
+
+    def _ensure_thread(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="login-tracker", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            started = time.monotonic()
+            self.flush()
+            # Back off a little when the flush itself was slow (e.g. rate limited)
+            elapsed = time.monotonic() - started
+            if elapsed > self.flush_interval:
+                self._stopped.wait(min(elapsed, 60.0))
@@ -0,0 +1,106 @@
+"""Per-session cache of the signed-in user's record"""
+import threading
+import time
+from typing import Any, Callable, Dict, MutableMapping, Optional
+
+DEFAULT_TTL_SECONDS = 60.0
+
+_USER_KEY = "_auth_cached_user"
+_LOGIN_TRACKED_KEY = "_auth_login_tracked"
+
+
+class _InvalidationRegistry:
+    """Process-wide version counters used to expire cached users from any session"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global_version = 0
+        self._user_versions: Dict[str, int] = {}
+
+    def bump(self, google_id: Optional[str] = None) -> None:
+        with self._lock:
+            if google_id is None:
+                self._global_version += 1
+            else:
+                self._user_versions[google_id] = self._user_versions.get(google_id, 0) + 1
+
+    def version(self, google_id: str) -> tuple:
+        with self._lock:
+            return (self._global_version, self._user_versions.get(google_id, 0))
+
+
+_registry = _InvalidationRegistry()
+
+
+def invalidate_user(google_id: Optional[str] = None) -> None:
+    """Expire the cached record of a user (or of every user) in all sessions"""
+    _registry.bump(google_id)
+
+
+class UserCache:
+    """Caches the current user's record in a session store with a short TTL
+
+    The store is any dict-like object (st.session_state in the app). Entries
+    are dropped when the TTL passes or when invalidate_user() is called for
+    the user, e.g. after an admin changes their status.
+    """
+
+    def __init__(
+        self,
+        store: MutableMapping[str, Any],
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+    def get_user(
+        self,
+        google_id: str,
+        loader: Callable[[str], Optional[Dict[str, Any]]],
+        force_refresh: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached user, calling loader(google_id) when missing or stale"""
+        version = _registry.version(google_id)
+        entry = self.store.get(_USER_KEY)
+        if (
+            not force_refresh
+            and entry
+            and entry["google_id"] == google_id
+            and entry["version"] == version
+            and self.clock() < entry["expires_at"]
+        ):
+            return entry["user"]
+
+        user = loader(google_id)
+        self.store[_USER_KEY] = {
+            "google_id": google_id,
+            "user": user,
+            "version": version,
+            "expires_at": self.clock() + self.ttl_seconds,
+        }
+        return user
+
+    def peek(self, google_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached user without loading (None if missing or stale)"""
+        entry = self.store.get(_USER_KEY)
+        if (
+            entry
+            and entry["google_id"] == google_id
+            and entry["version"] == _registry.version(google_id)
+            and self.clock() < entry["expires_at"]
+        ):
+            return entry["user"]
+        return None
+
+    def invalidate(self) -> None:
+        """Drop this session's cached user"""
+        self.store.pop(_USER_KEY, None)
+
+    def login_tracked(self, google_id: str) -> bool:
+        """Whether the login of this user has already been recorded in this session"""
+        return self.store.get(_LOGIN_TRACKED_KEY) == google_id
+
+    def mark_login_tracked(self, google_id: str) -> None:
+        self.store[_LOGIN_TRACKED_KEY] = google_id
@@ -0,0 +1,278 @@
+"""In-process mirror of the Lark Base user table with hash indexes"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+INDEXED_FIELDS = ("GoogleID", "メールアドレス")
+
+
+def extract_field_value(field_value: Any) -> Any:
+    """Extract value from Lark Base field (handles rich text format)"""
+    if field_value is None:
+        return ""
+    # If it's a list of dicts with 'text' key (rich text format)
+    if isinstance(field_value, list):
+        texts = []
+        for item in field_value:
+            if isinstance(item, dict) and "text" in item:
+                texts.append(item["text"])
+            else:
+                texts.append(str(item))
+        return "".join(texts)
+    # If it's a dict with 'text' key
+    if isinstance(field_value, dict) and "text" in field_value:
+        return field_value["text"]
+    return field_value
+
+
+class UserDirectory:
+    """Local mirror of the user table, indexed by record_id, GoogleID and email
+
+    Lookups are dict hits. The mirror is filled on first use, refreshed in a
+    background thread (only records whose fields changed are re-indexed) and
+    updated write-through by UserManager, so writes can go straight to the
+    known record_id. An optional SQLite snapshot lets a restarted process
+    serve lookups before the first refresh finishes.
+    """
+
+    def __init__(self, client, refresh_interval: float = 60.0, snapshot_path: Optional[str] = None):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.snapshot_path = snapshot_path
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, Dict[Any, str]] = {field: {} for field in INDEXED_FIELDS}
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_refresh_at: Optional[float] = None
+        self.last_refresh_changes = 0
+        # Incremented on every change so callers can cache data derived from the mirror
+        self.version = 0
+        # record_id -> time of the last local write (protects write-through from stale refreshes)
+        self._local_writes: Dict[str, float] = {}
+
+    # --- Lookups ---
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Get a record by record_id"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._records.get(record_id)
+
+    def find(self, field_name: str, value: Any, fallback: bool = True) -> Optional[Dict[str, Any]]:
+        """Get a record by an indexed field value
+
+        When the value is not in the mirror and fallback is True, the record
+        is looked up remotely (e.g. a user registered from another process)
+        and added to the mirror.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if field_name in self._index:
+                record_id = self._index[field_name].get(value)
+                if record_id is not None:
+                    return self._records.get(record_id)
+            else:
+                for record in self._records.values():
+                    if extract_field_value(record.get("fields", {}).get(field_name)) == value:
+                        return record
+
+        if not fallback:
+            return None
+        record = self.client.get_record_by_field(field_name, value)
+        if record:
+            self.upsert(record)
+        return record
+
+    def all_records(self) -> List[Dict[str, Any]]:
+        """All mirrored records"""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._records.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    # --- Write-through ---
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """Add or replace a record"""
+        record_id = record.get("record_id")
+        if not record_id:
+            return
+        with self._lock:
+            self._unindex(record_id)
+            self._records[record_id] = record
+            self._index_record(record)
+            self._local_writes[record_id] = time.monotonic()
+            self.version += 1
+
+    def apply_update(self, record_id: str, fields: Dict[str, Any]) -> None:
+        """Merge updated fields into a mirrored record"""
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is None:
+                return
+            updated = {**record, "fields": {**record.get("fields", {}), **fields}}
+            self._unindex(record_id)
+            self._records[record_id] = updated
+            self._index_record(updated)
+            self._local_writes[record_id] = time.monotonic()
+            self.version += 1
+
+    def remove(self, record_id: str) -> None:
+        with self._lock:
+            self._unindex(record_id)
+            if self._records.pop(record_id, None) is not None:
+                self.version += 1
+
+    # --- Refresh ---
+
+    def refresh(self) -> int:
+        """Fetch the table and apply only changed records. Returns the number of changes."""
+        started = time.monotonic()
+        records = self.client.get_all_records()
+        changes = 0
+        with self._lock:
+            # get_all_records returns [] on network errors; never wipe a populated mirror for that
+            if not records and self._records:
+                return 0
+
+            seen = set()
+            for record in records:
+                record_id = record.get("record_id")
+                if not record_id:
+                    continue
+                seen.add(record_id)
+                if self._local_writes.get(record_id, 0.0) > started:
+                    continue  # Written locally while this refresh was in flight
+                existing = self._records.get(record_id)
+                if existing is None or existing.get("fields") != record.get("fields"):
+                    self._unindex(record_id)
+                    self._records[record_id] = record
+                    self._index_record(record)
+                    changes += 1
+            for record_id in [
+                rid for rid in self._records
+                if rid not in seen and self._local_writes.get(rid, 0.0) <= started
+            ]:
+                self._unindex(record_id)
+                del self._records[record_id]
+                changes += 1
+
+            self._local_writes = {rid: t for rid, t in self._local_writes.items() if t > started}
+            if changes:
+                self.version += 1
+            self._loaded = True
+            self.last_refresh_at = time.time()
+            self.last_refresh_changes = changes
+
+        if changes:
+            self._save_snapshot()
+        return changes
+
+    def start(self, refresh_now: bool = False) -> None:
+        """Start background refresh"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(refresh_now,), name="user-directory", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self, refresh_now: bool) -> None:
+        if not refresh_now and self._stopped.wait(self.refresh_interval):
+            return
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"User directory refresh failed: {e}")
+            if self._stopped.wait(self.refresh_interval):
+                break
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if self._load_snapshot():
+                # Serve from the snapshot and bring it up to date in the background
+                self._loaded = True
+                self.start(refresh_now=True)
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"User directory initial load failed: {e}")
+            # Lookups fall back to the remote API until a refresh succeeds
+            self._loaded = True
+            self.start()
+
+    # --- Indexes ---
+
+    def _index_record(self, record: Dict[str, Any]) -> None:
+        fields = record.get("fields", {})
+        for field_name in INDEXED_FIELDS:
+            value = extract_field_value(fields.get(field_name))
+            if value:
+                self._index[field_name][value] = record["record_id"]
+
+    def _unindex(self, record_id: str) -> None:
+        record = self._records.get(record_id)
+        if record is None:
+            return
+        fields = record.get("fields", {})
+        for field_name in INDEXED_FIELDS:
+            value = extract_field_value(fields.get(field_name))
+            if value and self._index[field_name].get(value) == record_id:
+                del self._index[field_name][value]
+
+    # --- Snapshot ---
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        conn = sqlite3.connect(self.snapshot_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS users (record_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        return conn
+
+    def _save_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            rows = [(rid, json.dumps(record, ensure_ascii=False)) for rid, record in self._records.items()]
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM users")
+                conn.executemany("INSERT INTO users (record_id, record) VALUES (?, ?)", rows)
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"User directory snapshot save failed: {e}")
+
+    def _load_snapshot(self) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            conn = self._connect()
+            rows = conn.execute("SELECT record FROM users").fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"User directory snapshot load failed: {e}")
+            return False
+        if not rows:
+            return False
+        for (raw,) in rows:
+            self.upsert(json.loads(raw))
+        return True
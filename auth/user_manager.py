@@ -1,8 +1,12 @@
 """User management for TikTok Re-Editor v3"""
+import os
 from datetime import datetime
 from typing import Optional, Dict, List, Any
 import streamlit as st
 from .lark_base import LarkBaseClient
+from .login_tracker import LoginTracker
+from .user_directory import UserDirectory, extract_field_value
+from .user_cache import invalidate_user
 
 
 class UserStatus:
@@ -16,21 +20,29 @@ class UserStatus:
 class UserManager:
     """User management with Lark Base backend"""
 
-    def __init__(self):
-        """Initialize with Lark Base client"""
-        self.client = LarkBaseClient()
-        self.admin_emails = st.secrets.get("admin", {}).get("emails", [])
+    def __init__(self, client: Optional[LarkBaseClient] = None, admin_emails: Optional[List[str]] = None):
+        """Initialize with Lark Base client (defaults read from Streamlit secrets)"""
+        self.client = client or LarkBaseClient()
+        if admin_emails is None:
+            admin_emails = st.secrets.get("admin", {}).get("emails", [])
+        self.admin_emails = admin_emails
+        self.directory = UserDirectory(
+            self.client,
+            snapshot_path=os.environ.get("USER_DIRECTORY_SNAPSHOT_PATH")
+        )
+        self.login_tracker = LoginTracker(self.client)
+        self._snapshot: Optional["UserSnapshot"] = None
 
     def get_user_by_google_id(self, google_id: str) -> Optional[Dict[str, Any]]:
         """Get user by Google ID"""
-        record = self.client.get_record_by_field("GoogleID", google_id)
+        record = self.directory.find("GoogleID", google_id)
         if record:
             return self._record_to_user(record)
         return None
 
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
-        record = self.client.get_record_by_field("メールアドレス", email)
+        record = self.directory.find("メールアドレス", email)
         if record:
             return self._record_to_user(record)
         return None
@@ -56,33 +68,13 @@ class UserManager:
         }
 
         record = self.client.create_record(fields)
+        self.directory.upsert(record)
+        invalidate_user(google_id)
         return self._record_to_user(record)
 
-    def update_last_login(self, google_id: str) -> None:
-        """Update user's last login time and increment login count"""
-        try:
-            record = self.client.get_record_by_field("GoogleID", google_id)
-            if record:
-                record_id = record["record_id"]
-                current_count = record.get("fields", {}).get("ログイン回数")
-                # Handle None, empty string, or non-numeric values
-                if current_count is None or current_count == "":
-                    current_count = 0
-                elif isinstance(current_count, str):
-                    try:
-                        current_count = int(current_count)
-                    except ValueError:
-                        current_count = 0
-                else:
-                    current_count = int(current_count)
-
-                self.client.update_record(record_id, {
-                    "最終ログイン": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "ログイン回数": current_count + 1
-                })
-        except Exception:
-            # Silently fail - login tracking is not critical
-            pass
+    def update_last_login(self, google_id: str, record_id: Optional[str] = None) -> None:
+        """Record a login (queued and written to Lark Base in the background)"""
+        self.login_tracker.record_login(google_id, record_id)
 
     def is_admin(self, email: str) -> bool:
         """Check if user is admin"""
@@ -103,102 +95,95 @@ class UserManager:
 
     def ban_user(self, google_id: str, reason: str) -> bool:
         """Ban a user with reason"""
-        record = self.client.get_record_by_field("GoogleID", google_id)
-        if record:
-            record_id = record["record_id"]
-            self.client.update_record(record_id, {
-                "ステータス": UserStatus.BANNED,
-                "BAN理由": reason
-            })
-            return True
-        return False
+        return self._update_fields(google_id, {
+            "ステータス": UserStatus.BANNED,
+            "BAN理由": reason
+        })
 
     def unban_user(self, google_id: str) -> bool:
         """Unban a user"""
-        record = self.client.get_record_by_field("GoogleID", google_id)
-        if record:
-            record_id = record["record_id"]
-            self.client.update_record(record_id, {
-                "ステータス": UserStatus.APPROVED,
-                "BAN理由": ""
-            })
-            return True
-        return False
+        return self._update_fields(google_id, {
+            "ステータス": UserStatus.APPROVED,
+            "BAN理由": ""
+        })
 
     def set_admin(self, google_id: str, is_admin: bool) -> bool:
         """Set or remove admin status"""
-        record = self.client.get_record_by_field("GoogleID", google_id)
-        if record:
-            record_id = record["record_id"]
-            self.client.update_record(record_id, {"管理者": is_admin})
-            return True
-        return False
+        return self._update_fields(google_id, {"管理者": is_admin})
+
+    def bulk_approve(self, google_ids: List[str]) -> int:
+        """Approve multiple users. Returns the number of users updated."""
+        return self._bulk_update_fields(google_ids, {"ステータス": UserStatus.APPROVED})
+
+    def bulk_reject(self, google_ids: List[str]) -> int:
+        """Reject multiple users. Returns the number of users updated."""
+        return self._bulk_update_fields(google_ids, {"ステータス": UserStatus.REJECTED})
+
+    def bulk_ban(self, google_ids: List[str], reason: str) -> int:
+        """Ban multiple users with a reason. Returns the number of users updated."""
+        return self._bulk_update_fields(google_ids, {
+            "ステータス": UserStatus.BANNED,
+            "BAN理由": reason
+        })
 
     def get_users_by_status(self, status: str) -> List[Dict[str, Any]]:
         """Get all users with a specific status"""
-        filter_condition = {
-            "conjunction": "and",
-            "conditions": [
-                {
-                    "field_name": "ステータス",
-                    "operator": "is",
-                    "value": [status]
-                }
-            ]
-        }
-        records = self.client.search_records(filter_condition)
-        return [self._record_to_user(r) for r in records]
+        return self.get_user_snapshot().by_status(status)
 
     def get_all_users(self) -> List[Dict[str, Any]]:
         """Get all users"""
-        records = self.client.get_all_records()
+        records = self.directory.all_records()
         return [self._record_to_user(r) for r in records]
 
     def get_user_stats(self) -> Dict[str, int]:
         """Get user statistics"""
-        users = self.get_all_users()
-        stats = {
-            "total": len(users),
-            UserStatus.PENDING: 0,
-            UserStatus.APPROVED: 0,
-            UserStatus.REJECTED: 0,
-            UserStatus.BANNED: 0,
-            "admins": 0
-        }
-        for user in users:
-            status = user.get("status", "")
-            if status in stats:
-                stats[status] += 1
-            if user.get("is_admin"):
-                stats["admins"] += 1
-        return stats
+        return self.get_user_snapshot().stats
+
+    def get_user_snapshot(self) -> "UserSnapshot":
+        """Get a snapshot of all users (rebuilt only when the directory changed)"""
+        version = self.directory.version
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version or not snapshot.users:
+            snapshot = UserSnapshot(self.get_all_users(), version)
+            self._snapshot = snapshot
+        return snapshot
 
     def _update_status(self, google_id: str, status: str) -> bool:
         """Update user status"""
-        record = self.client.get_record_by_field("GoogleID", google_id)
+        return self._update_fields(google_id, {"ステータス": status})
+
+    def _update_fields(self, google_id: str, fields: Dict[str, Any]) -> bool:
+        """Update fields of a user, writing straight to the mirrored record_id"""
+        record = self.directory.find("GoogleID", google_id)
         if record:
             record_id = record["record_id"]
-            self.client.update_record(record_id, {"ステータス": status})
+            self.client.update_record(record_id, fields)
+            self.directory.apply_update(record_id, fields)
+            invalidate_user(google_id)
             return True
         return False
 
+    def _bulk_update_fields(self, google_ids: List[str], fields: Dict[str, Any]) -> int:
+        """Apply the same field update to many users with batch_update (chunked by the client)"""
+        targets = {}
+        for google_id in dict.fromkeys(google_ids):
+            record = self.directory.find("GoogleID", google_id)
+            if record:
+                targets[record["record_id"]] = google_id
+        if not targets:
+            return 0
+
+        self.client.batch_update_records([
+            {"record_id": record_id, "fields": fields} for record_id in targets
+        ])
+        for record_id, google_id in targets.items():
+            self.directory.apply_update(record_id, fields)
+            invalidate_user(google_id)
+        return len(targets)
+
     def _extract_value(self, field_value: Any) -> Any:
         """Extract value from Lark Base field (handles rich text format)"""
-        if field_value is None:
-            return ""
-        # If it's a list of dicts with 'text' key (rich text format)
-        if isinstance(field_value, list):
-            texts = []
-            for item in field_value:
-                if isinstance(item, dict) and "text" in item:
-                    texts.append(item["text"])
-                else:
-                    texts.append(str(item))
-            return "".join(texts)
-        # If it's a dict with 'text' key
-        if isinstance(field_value, dict) and "text" in field_value:
-            return field_value["text"]
-        return field_value
+        return extract_field_value(field_value)
 
     def _record_to_user(self, record: Dict[str, Any]) -> Dict[str, Any]:
         """Convert Lark Base record to user dict"""
@@ -216,3 +201,54 @@ class UserManager:
             "last_login": self._extract_value(fields.get("最終ログイン", "")),
             "login_count": fields.get("ログイン回数", 0)
         }
+
+
+class UserSnapshot:
+    """Users at one point in time with stats, status partitions and search computed locally"""
+
+    SEARCH_FIELDS = ("real_name", "nickname", "email")
+
+    def __init__(self, users: List[Dict[str, Any]], version: int = 0):
+        self.users = users
+        self.version = version
+        self._by_status: Dict[str, List[Dict[str, Any]]] = {}
+        stats = {
+            "total": len(users),
+            UserStatus.PENDING: 0,
+            UserStatus.APPROVED: 0,
+            UserStatus.REJECTED: 0,
+            UserStatus.BANNED: 0,
+            "admins": 0
+        }
+        for user in users:
+            status = user.get("status", "")
+            self._by_status.setdefault(status, []).append(user)
+            if status in stats:
+                stats[status] += 1
+            if user.get("is_admin"):
+                stats["admins"] += 1
+        self.stats = stats
+
+    def by_status(self, *statuses: str) -> List[Dict[str, Any]]:
+        """Users with any of the given statuses"""
+        users = []
+        for status in statuses:
+            users.extend(self._by_status.get(status, []))
+        return users
+
+    @classmethod
+    def search(cls, users: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        """Filter users by a case-insensitive substring of name, nickname or email"""
+        query = query.strip().lower()
+        if not query:
+            return users
+        return [
+            user for user in users
+            if any(query in str(user.get(field) or "").lower() for field in cls.SEARCH_FIELDS)
+        ]
+
+
+@st.cache_resource(show_spinner=False)
+def get_user_manager() -> UserManager:
+    """Get the process-wide UserManager (keeps the Lark client and its token across reruns)"""
+    return UserManager()
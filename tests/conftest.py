@@ -0,0 +1,5 @@
+import os
+import sys
+
+# リポジトリ直下（app.py と同じ階層）から utils / auth を import できるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+import pytest
+
+from utils.alignment import AlignmentState, align_lines_dp
+
+SCRIPT = [
+    "今日はとても良い天気です。",
+    "朝から公園を散歩しました。",
+    "桜の花がたくさん咲いていて、",
+    "写真を何枚も撮りました。",
+    "帰りにパン屋さんに寄って、",
+    "焼きたてのクロワッサンを買いました。",
+    "明日は雨が降るそうなので、",
+    "家で映画を見る予定です。",
+]
+
+
+def make_words(lines, chars_per_word=3, word_seconds=0.4, gap=0.1):
+    """行テキストから Gladia 形式の単語リストを作る（句読点は含めない）"""
+    words = []
+    t = 0.0
+    for line in lines:
+        body = line.rstrip("、。")
+        for i in range(0, len(body), chars_per_word):
+            words.append({"word": body[i:i + chars_per_word], "start": round(t, 3), "end": round(t + word_seconds, 3)})
+            t += word_seconds + gap
+    return words
+
+
+@pytest.fixture
+def words():
+    return make_words(SCRIPT)
+
+
+def line_times(words, lines):
+    """台本どおりの各行の (開始, 終了)"""
+    times = []
+    index = 0
+    for line in lines:
+        count = -(-len(line.rstrip("、。")) // 3)
+        times.append((words[index]["start"], words[index + count - 1]["end"]))
+        index += count
+    return times
+
+
+def test_align_lines_dp_matches_unedited_script(words):
+    segments = align_lines_dp(SCRIPT, words)
+
+    assert [seg["text"] for seg in segments] == SCRIPT
+    assert [(seg["start"], seg["end"]) for seg in segments] == line_times(words, SCRIPT)
+    assert all(seg["confidence"] == 1.0 for seg in segments)
+
+
+def test_align_lines_dp_does_not_drift_after_edits(words):
+    expected = line_times(words, SCRIPT)
+    edited = list(SCRIPT)
+    edited[1] = "朝から近所の公園を散歩しました。"  # 文字を追加
+    edited[2] = "桜が咲いていて、"  # 文字を削除
+    edited.insert(4, "ここは音声にない行です。")  # 音声にない行を挿入
+
+    segments = align_lines_dp(edited, words)
+
+    assert len(segments) == len(edited)
+    # 編集した行より後ろの行は、元の単語のタイミングのまま（ずれが累積しない）
+    for seg, (start, end) in zip(segments[5:], expected[4:]):
+        assert (seg["start"], seg["end"]) == (start, end)
+        assert seg["confidence"] == 1.0
+    assert segments[0]["start"] == expected[0][0]
+    # 音声にない行は前後の行の間に収まる
+    inserted = segments[4]
+    assert segments[3]["end"] <= inserted["start"] <= segments[5]["start"]
+    assert inserted["confidence"] < 0.5
+
+
+def test_alignment_state_update_matches_full_realign(words):
+    state = AlignmentState(words)
+    edits = [
+        list(SCRIPT),
+        SCRIPT[:3] + ["写真をたくさん撮りました。"] + SCRIPT[4:],
+        SCRIPT[:5] + ["新しく追加した行です。"] + SCRIPT[5:],
+        SCRIPT[:2] + SCRIPT[3:],
+        [line.replace("。", "、") for line in SCRIPT],
+        list(SCRIPT),
+    ]
+    for lines in edits:
+        assert state.update(lines) == align_lines_dp(lines, words)
+
+
+def test_alignment_state_realigns_only_changed_lines(words):
+    state = AlignmentState(words)
+    state.update(SCRIPT)
+    assert state.last_realigned_lines == len(SCRIPT)
+
+    edited = list(SCRIPT)
+    edited[5] = "焼きたてのパンを買いました。"
+    state.update(edited)
+    assert state.last_realigned_lines == 1
+
+    state.update(edited)
+    assert state.last_realigned_lines == 0
+
+
+def test_alignment_without_words_splits_evenly():
+    segments = align_lines_dp(["一行目。", "、", "二行目。"], [])
+
+    assert [seg["text"] for seg in segments] == ["一行目。", "二行目。"]
+    assert segments[0]["end"] == segments[1]["start"]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from utils.cancellation import CancellationToken, CancelledError
+from utils.ffmpeg_scheduler import FFmpegScheduler
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def start_waiter(scheduler, owner, order, cancel_token=None, errors=None):
+    """枠が空くのを待ち、取れた順に owner を記録してすぐ返すスレッド"""
+    def run():
+        try:
+            scheduler.acquire(owner, cancel_token)
+        except CancelledError:
+            if errors is not None:
+                errors.append(owner)
+            return
+        order.append(owner)
+        scheduler.release()
+
+    queued = scheduler.stats()["queued"]
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    # 待ち行列に入った順番を確定させてから次を投入する
+    wait_until(lambda: scheduler.stats()["queued"] == queued + 1)
+    return thread
+
+
+def test_free_slot_is_taken_without_waiting():
+    scheduler = FFmpegScheduler(max_processes=2, threads_per_process=1)
+
+    assert scheduler.acquire("a") == 0.0
+    assert scheduler.acquire("b") == 0.0
+    assert scheduler.stats()["running"] == 2
+
+    scheduler.release()
+    scheduler.release()
+    assert scheduler.stats()["running"] == 0
+
+
+def test_waiting_owners_are_served_round_robin():
+    scheduler = FFmpegScheduler(max_processes=1, threads_per_process=1)
+    scheduler.acquire("holder")
+
+    order = []
+    threads = [start_waiter(scheduler, owner, order) for owner in ["a", "a", "a", "b", "c"]]
+    assert scheduler.stats()["queued_by_owner"] == {"a": 3, "b": 1, "c": 1}
+
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+
+    # a が3件まとめて投入していても、b と c は a の2件目より先に実行される
+    assert order == ["a", "b", "c", "a", "a"]
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    scheduler = FFmpegScheduler(max_processes=1, threads_per_process=1)
+    scheduler.acquire("holder")
+
+    order, errors = [], []
+    token = CancellationToken()
+    cancelled = start_waiter(scheduler, "a", order, cancel_token=token, errors=errors)
+    waiting = start_waiter(scheduler, "b", order)
+
+    token.cancel()
+    cancelled.join(5)
+    assert errors == ["a"]
+    assert scheduler.stats()["queued_by_owner"] == {"b": 1}
+
+    # キャンセルした人の分の枠は消えず、次の人に渡る
+    scheduler.release()
+    waiting.join(5)
+    assert order == ["b"]
+    assert scheduler.stats()["running"] == 0
+
+
+def test_run_counts_cancellation_separately():
+    scheduler = FFmpegScheduler(max_processes=1, threads_per_process=1)
+    scheduler.acquire("holder")
+    token = CancellationToken()
+    token.cancel()
+
+    with pytest.raises(CancelledError):
+        scheduler.run(["ffmpeg", "out.mp4"], cancel_token=token)
+
+    stats = scheduler.stats()
+    assert stats["cancelled"] == 1
+    assert stats["failed"] == 0
+
+
+def test_with_threads_inserts_before_output():
+    scheduler = FFmpegScheduler(max_processes=1, threads_per_process=3)
+
+    assert scheduler.with_threads(["ffmpeg", "-i", "in.wav", "out.mp4"]) == [
+        "ffmpeg", "-i", "in.wav", "-threads", "3", "out.mp4"
+    ]
+    assert scheduler.with_threads(["ffmpeg", "-threads", "1", "out.mp4"]) == ["ffmpeg", "-threads", "1", "out.mp4"]
+
+
+def test_run_rejects_kwargs_unsupported_with_progress():
+    scheduler = FFmpegScheduler(max_processes=1, threads_per_process=1)
+
+    with pytest.raises(TypeError, match="stdin"):
+        scheduler.run(["ffmpeg", "out.mp4"], cancel_token=CancellationToken(), stdin=None)
+    assert scheduler.stats()["running"] == 0
@@ -0,0 +1,21 @@
+import pytest
+
+from utils.model_router import classify_error
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("404 NOT_FOUND. {'error': {'code': 404, 'message': 'models/gemini-x is not found for API version v1beta, "
+     "or is not supported for generateContent. Call ListModels to see the list of available models and their "
+     "supported methods.', 'status': 'NOT_FOUND'}}", "not_found"),
+    ("429 RESOURCE_EXHAUSTED. {'error': {'code': 429, 'message': 'You exceeded your current quota.', "
+     "'status': 'RESOURCE_EXHAUSTED'}}", "rate_limit"),
+    ("Rate limit exceeded", "rate_limit"),
+    ("500 INTERNAL. An internal error has occurred while calling generateContent", "error"),
+    ("Failed to generate a response", "error"),
+])
+def test_classify_error(message, expected):
+    assert classify_error(Exception(message)) == expected
+
+
+def test_classify_missing_response():
+    assert classify_error(None) == "empty"
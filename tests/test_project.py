@@ -0,0 +1,46 @@
+import os
+
+from utils.project import create_project, list_projects, load_project, verify_audio
+
+
+def make_audio(tmp_path, data=b"RIFF....WAVEfmt "):
+    path = tmp_path / "upload.wav"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_set_audio_places_file_and_records_hash(tmp_path):
+    projects_dir = str(tmp_path / "projects")
+    project = create_project("テスト", projects_dir=projects_dir, owner="user-a")
+    project.set_audio(make_audio(tmp_path), "voice.WAV")
+    project.save()
+
+    loaded = load_project(project.project_id, projects_dir=projects_dir, owner="user-a")
+    assert loaded.audio_path == os.path.join(project.project_dir, "audio.wav")
+    assert loaded.audio["size"] == len(b"RIFF....WAVEfmt ")
+    assert verify_audio(loaded)
+
+
+def test_verify_audio_rejects_replaced_file(tmp_path):
+    projects_dir = str(tmp_path / "projects")
+    project = create_project("テスト", projects_dir=projects_dir, owner="user-a")
+    project.set_audio(make_audio(tmp_path), "voice.wav")
+    project.save()
+
+    # ハードリンクで置いた場合も元のファイルとは別に差し替える
+    os.unlink(project.audio_path)
+    with open(os.path.join(project.project_dir, "audio.wav"), "wb") as f:
+        f.write(b"other audio")
+
+    assert not verify_audio(load_project(project.project_id, projects_dir=projects_dir, owner="user-a"))
+
+
+def test_projects_are_scoped_to_owner(tmp_path):
+    projects_dir = str(tmp_path / "projects")
+    project = create_project("テスト", projects_dir=projects_dir, owner="user-a")
+    project.save()
+
+    assert [p["project_id"] for p in list_projects("user-a", projects_dir=projects_dir)] == [project.project_id]
+    assert list_projects("user-b", projects_dir=projects_dir) == []
+    assert load_project(project.project_id, projects_dir=projects_dir, owner="user-b") is None
+    assert load_project(project.project_dir, owner="user-b") is None
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from utils import response_cache
+from utils.response_cache import ResponseCache
+
+
+class FakeClock:
+    """time.time() の代わり（テスト内で時刻を進める）"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_get_returns_saved_response(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("format_text", "model-a", "prompt", "response")
+
+    assert cache.get("format_text", "model-a", "prompt") == "response"
+    assert cache.get("format_text", "model-b", "prompt") is None
+    assert cache.get("generate_filename", "model-a", "prompt") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.set("format_text", "model-a", "prompt", "response")
+
+    clock.now += 59
+    assert cache.get("format_text", "model-a", "prompt") == "response"
+
+    # 参照しても期限は延びない（作成時刻から数える）
+    clock.now += 2
+    assert cache.get("format_text", "model-a", "prompt") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_set_evicts_least_recently_used(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.set("m", "model", "first", "1")
+    clock.now += 1
+    cache.set("m", "model", "second", "2")
+    clock.now += 1
+    assert cache.get("m", "model", "first") == "1"  # first を最近使ったことにする
+
+    clock.now += 1
+    cache.set("m", "model", "third", "3")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.get("m", "model", "second") is None
+    assert cache.get("m", "model", "first") == "1"
+    assert cache.get("m", "model", "third") == "3"
+
+
+def test_get_any_returns_first_cached_model(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("m", "model-b", "prompt", "from b")
+
+    assert cache.get_any("m", ["model-a", "model-b"], "prompt") == ("model-b", "from b")
+    assert cache.get_any("m", ["model-a"], "prompt") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_get_any_counts_misses_across_threads(tmp_path, clock):
+    cache = make_cache(tmp_path)
+
+    def miss_many():
+        for _ in range(200):
+            cache.get_any("m", ["model-a", "model-b"], "prompt")
+
+    threads = [threading.Thread(target=miss_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats()["misses"] == 800
+
+
+def test_entries_survive_reopen(tmp_path, clock):
+    make_cache(tmp_path).set("m", "model", "prompt", "response")
+
+    assert make_cache(tmp_path).get("m", "model", "prompt") == "response"
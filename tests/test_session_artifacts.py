@@ -0,0 +1,56 @@
+import io
+
+from utils.session_artifacts import SessionArtifacts, estimate_size
+
+
+def test_estimate_size_does_not_copy_bytesio():
+    data = b"x" * (1024 * 1024)
+    buffer = io.BytesIO(data)
+    shared = buffer.getvalue()
+
+    assert estimate_size(buffer) == len(data)
+    # 元の bytes を共有したまま（getbuffer() で複製されていない）
+    assert buffer.getvalue() is shared
+
+
+def test_estimate_size_uses_uploaded_file_size():
+    class Upload(io.BytesIO):
+        size = 123
+
+    assert estimate_size(Upload(b"abc")) == 123
+
+
+def test_large_values_spill_to_disk_and_read_back():
+    artifacts = SessionArtifacts("test", budget_bytes=1024)
+    try:
+        artifacts.put("audio", b"a" * 4096)
+        artifacts.put("words", [{"word": "テスト", "start": 0.0, "end": 0.5}])
+
+        usage = artifacts.usage()
+        assert usage["spilled_bytes"] >= 4096
+        assert artifacts.get("audio") == b"a" * 4096
+        assert artifacts.get("words") == [{"word": "テスト", "start": 0.0, "end": 0.5}]
+    finally:
+        artifacts.clear()
+
+
+def test_derived_is_cached_and_rebuilt_after_put():
+    artifacts = SessionArtifacts("test-derived", budget_bytes=1024 * 1024)
+    built = []
+
+    def build(value):
+        built.append(value)
+        return len(value)
+
+    try:
+        assert artifacts.derived("words", build) is None
+        artifacts.put("words", [1, 2, 3])
+        assert artifacts.derived("words", build) == 3
+        assert artifacts.derived("words", build) == 3
+        assert len(built) == 1
+
+        artifacts.put("words", [1])
+        assert artifacts.derived("words", build) == 1
+        assert len(built) == 2
+    finally:
+        artifacts.clear()
@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from utils.text_formatter import break_lines, validate_formatted_text
+
+
+def strip_punctuation(text):
+    return re.sub(r"[、。，,\s]", "", text)
+
+
+def test_valid_lines_are_kept():
+    text = "今日はいい天気です。\n散歩に行きましょう、"
+
+    assert break_lines(text) == text
+
+
+@pytest.mark.parametrize("text", [
+    "今日はとても良い天気だったので朝から近所の公園まで散歩に出かけました",
+    "みなさんこんにちは今日は新しい商品の紹介をしていきたいと思いますよろしくお願いします",
+    "TikTokの動画編集は難しいと思われがちですが実はとても簡単なんです",
+    "これは、短い。\nそしてこの行はとても長いので途中で改行が必要になるはずです",
+])
+def test_lines_follow_format_rules(text):
+    result = break_lines(text)
+
+    assert validate_formatted_text(result) == []
+    # 句読点と改行以外の文字は変えない
+    assert strip_punctuation(result) == strip_punctuation(text)
+
+
+def test_respects_max_chars():
+    result = break_lines("今日はとても良い天気だったので朝から公園を散歩しました", max_chars=8)
+
+    assert all(len(line) <= 8 for line in result.split("\n"))
+    assert validate_formatted_text(result, max_chars=8) == []
+
+
+def test_sentence_end_gets_full_stop():
+    result = break_lines("今日は晴れです\n明日は雨かもしれません")
+
+    assert result.split("\n") == ["今日は晴れです。", "明日は雨かもしれません。"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("本日は皆様に大切なお知らせがあります", ["本日は皆様に、", "大切なお知らせがあります。"]),
+    ("ご案内いたしますのでお待ちください", ["ご案内いたしますので、", "お待ちください。"]),
+    ("これから皆さんに大切なお知らせをしますのでよく聞いてください",
+     ["これから皆さんに、大切な、", "お知らせをしますのでよく、", "聞いてください。"]),
+])
+def test_does_not_break_inside_words(text, expected):
+    assert break_lines(text).split("\n") == expected
+
+
+@pytest.mark.parametrize("max_chars", [8, 10, 12, 14])
+def test_no_break_between_prefix_or_okurigana(max_chars):
+    text = "これから皆さんに大切なお知らせをしますのでよく聞いてください"
+    lines = break_lines(text, max_chars=max_chars).split("\n")
+
+    for line, next_line in zip(lines, lines[1:]):
+        body = line.rstrip("、。")
+        assert not body.endswith(("お", "知", "大")), lines
+        assert not next_line.startswith(("知", "らせ", "切")), lines
+
+
+def test_word_longer_than_line_is_still_split():
+    result = break_lines("インターネットショッピングで新しいカメラを購入しました", max_chars=10)
+
+    assert validate_formatted_text(result, max_chars=10) == []
+    assert strip_punctuation(result) == strip_punctuation("インターネットショッピングで新しいカメラを購入しました")
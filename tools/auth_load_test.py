@@ -0,0 +1,173 @@
+"""認証まわりの負荷テスト（モックLark Baseサーバーを使用）
+
+使い方:
+    python tools/auth_load_test.py [--users 50] [--reruns 20] [--latency-ms 80] [--mode both]
+
+N人のユーザーが同時にログインし、それぞれ --reruns 回ボタン操作（＝Streamlitの再実行）
+する状況を再現します。1回の再実行ごとに実行される認証処理は次のとおりです。
+    check_auth → load_session_user
+    ヘッダーの get_current_user
+    is_current_user_admin
+
+--mode naive は以前の実装（再実行ごとにクライアント生成・トークン取得、
+GoogleIDでの検索×3、ログイン回数の読み書き）を再現し、cached と比較します。
+結果として、再実行あたりのリモート呼び出し回数と認証処理の p50/p95 レイテンシを表示します。
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from auth.auth_ui import load_session_user  # noqa: E402
+from auth.lark_base import LarkBaseClient  # noqa: E402
+from auth.user_cache import UserCache  # noqa: E402
+from auth.user_manager import UserManager  # noqa: E402
+from tools.mock_lark_server import MockLarkServer  # noqa: E402
+
+CREDENTIALS = {"app_id": "cli_mock", "app_secret": "secret", "base_app_token": "app_mock", "table_id": "tbl_mock"}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run_cached(base_url, google_ids, reruns, think_time):
+    """現在の実装: 共有UserManager + セッションキャッシュ + ログイン回数の書き込み遅延"""
+    client = LarkBaseClient(base_url=base_url, **CREDENTIALS)
+    user_manager = UserManager(client=client, admin_emails=[])
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def session(google_id):
+        store = {}
+        for _ in range(reruns):
+            started = time.perf_counter()
+            user = load_session_user(google_id, store, user_manager)
+            cache = UserCache(store)
+            current = cache.get_user(google_id, user_manager.get_user_by_google_id)  # get_current_user
+            admin = cache.get_user(google_id, user_manager.get_user_by_google_id)  # is_current_user_admin
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not (user and current and admin):
+                    failures.append(google_id)
+            time.sleep(think_time)
+
+    _run_sessions(session, google_ids)
+    flush_started = time.perf_counter()
+    user_manager.login_tracker.flush()
+    flush_seconds = time.perf_counter() - flush_started
+    user_manager.login_tracker.stop(flush=False)
+    user_manager.directory.stop()
+    return latencies, failures, flush_seconds
+
+
+def run_naive(base_url, google_ids, reruns, think_time):
+    """以前の実装: 再実行ごとに新しいクライアントで検索と読み書きを行う"""
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def session(google_id):
+        for _ in range(reruns):
+            started = time.perf_counter()
+            client = LarkBaseClient(base_url=base_url, session=requests.Session(), **CREDENTIALS)
+            record = client.get_record_by_field("GoogleID", google_id)  # check_auth
+            refreshed = client.get_record_by_field("GoogleID", google_id)  # update_last_login
+            if refreshed:
+                count = int(refreshed["fields"].get("ログイン回数") or 0)
+                try:
+                    client.update_record(refreshed["record_id"], {
+                        "最終ログイン": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "ログイン回数": count + 1
+                    })
+                except Exception:
+                    pass  # Login tracking failures were silently ignored
+            current = LarkBaseClient(base_url=base_url, session=requests.Session(), **CREDENTIALS) \
+                .get_record_by_field("GoogleID", google_id)  # get_current_user
+            admin = LarkBaseClient(base_url=base_url, session=requests.Session(), **CREDENTIALS) \
+                .get_record_by_field("GoogleID", google_id)  # is_current_user_admin
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not (record and current and admin):
+                    failures.append(google_id)
+            time.sleep(think_time)
+
+    _run_sessions(session, google_ids)
+    return latencies, failures, 0.0
+
+
+def _run_sessions(session, google_ids):
+    errors = []
+
+    def target(google_id):
+        try:
+            session(google_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(gid,)) for gid in google_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def report(mode, server, latencies, failures, flush_seconds, sessions, reruns):
+    stats = server.stats()
+    total_reruns = sessions * reruns
+    remote_calls = sum(count for name, count in stats.items() if name != "rate_limited")
+    print(f"\n=== {mode} ===")
+    print(f"  再実行: {total_reruns}回（{sessions}ユーザー × {reruns}回）")
+    print(f"  リモート呼び出し: {remote_calls}回 → 再実行あたり {remote_calls / total_reruns:.2f}回")
+    print("  内訳: " + ", ".join(f"{name}={count}" for name, count in sorted(stats.items())))
+    print(f"  認証失敗（ユーザーを取得できなかった再実行）: {len(failures)}回")
+    print(f"  認証レイテンシ: p50 {percentile(latencies, 50) * 1000:.1f} ms / "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} ms / 平均 {statistics.mean(latencies) * 1000:.1f} ms")
+    if flush_seconds:
+        print(f"  ログイン回数の一括書き込み: {flush_seconds * 1000:.1f} ms（バックグラウンド）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="認証処理の負荷テスト")
+    parser.add_argument("--users", type=int, default=50, help="同時ユーザー数")
+    parser.add_argument("--reruns", type=int, default=20, help="ユーザーあたりの再実行回数")
+    parser.add_argument("--table-size", type=int, default=500, help="ユーザーテーブルの件数")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="モックサーバーの遅延")
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="モックの1秒あたり上限（0で無制限）")
+    parser.add_argument("--think-time", type=float, default=0.05, help="再実行間の待ち時間（秒）")
+    parser.add_argument("--mode", choices=("cached", "naive", "both"), default="both")
+    args = parser.parse_args()
+
+    google_ids = [f"google-{i}" for i in range(min(args.users, args.table_size))]
+    modes = ("naive", "cached") if args.mode == "both" else (args.mode,)
+
+    for mode in modes:
+        server = MockLarkServer(users=args.table_size, latency_ms=args.latency_ms,
+                                jitter_ms=args.jitter_ms, rate_limit=args.rate_limit).start()
+        try:
+            runner = run_cached if mode == "cached" else run_naive
+            latencies, failures, flush_seconds = runner(server.base_url, google_ids, args.reruns, args.think_time)
+            report(mode, server, latencies, failures, flush_seconds, len(google_ids), args.reruns)
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""行タイムスタンプ計算（utils.alignment）のベンチマーク
+
+使い方:
+    python tools/bench_alignment.py [--words 10000] [--repeat 5]
+
+1万単語の合成トランスクリプトで align_lines と旧実装（app.py内のインライン版）の
+処理時間を比較し、結果が一致することを確認します。
+続けて、約5000文字の台本を編集（読み仮名の挿入・削除・行の追加）した状態で
+align_lines_dp の処理時間と、編集箇所より後ろの行のタイミング誤差を測定します。
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.alignment import WordStream, align_lines, align_lines_dp, normalize  # noqa: E402
+
+
+SAMPLE_WORDS = ["職場", "の", "嫌な", "奴", "は", "こう", "扱えば", "大丈夫", "。", "今回", "は",
+                "2026", "年", "に", "給料", "が", "上がらない", "職種", "を", "紹介", "します", "、"]
+
+
+def make_transcript(word_count, seed=0):
+    """合成の単語リストと、それを14文字前後で区切った行リストを作成"""
+    rng = random.Random(seed)
+    words = []
+    t = 0.0
+    for _ in range(word_count):
+        word = rng.choice(SAMPLE_WORDS)
+        duration = 0.05 + rng.random() * 0.4
+        words.append({"word": word, "start": round(t, 3), "end": round(t + duration, 3)})
+        t += duration + rng.random() * 0.1
+
+    text = "".join(w["word"] for w in words)
+    lines = []
+    current = ""
+    for char in text:
+        current += char
+        if len(current) >= 14 or char in "。、":
+            lines.append(current)
+            current = ""
+    if current:
+        lines.append(current)
+    return words, lines
+
+
+def reference_align(lines, words):
+    """旧実装（単語ごとにre.subで正規化する版）"""
+    def normalize(text):
+        return re.sub(r'[、。,.\s　]', '', text)
+
+    segments = []
+    word_index = 0
+    for line_idx, line in enumerate(lines):
+        line_norm = normalize(line)
+        if not line_norm:
+            continue
+        start_word_idx = word_index
+        chars_matched = 0
+        while word_index < len(words) and chars_matched < len(line_norm):
+            chars_matched += len(normalize(words[word_index]['word']))
+            word_index += 1
+        end_word_idx = word_index - 1 if word_index > start_word_idx else start_word_idx
+        if start_word_idx < len(words) and end_word_idx < len(words):
+            start_time = words[start_word_idx]['start']
+            end_time = words[end_word_idx]['end']
+            if end_time <= start_time:
+                end_time = start_time + 0.5
+        else:
+            segment_duration = (words[-1]['end'] if words else 1) / len(lines)
+            start_time = line_idx * segment_duration
+            end_time = (line_idx + 1) * segment_duration
+        if end_time - start_time < 0.1:
+            end_time = start_time + 0.5
+        segments.append({"start": start_time, "end": end_time, "text": line})
+    return segments
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    words, lines = make_transcript(args.words)
+    print(f"単語数: {len(words)}, 行数: {len(lines)}")
+
+    ref_time, ref_segments = best_of(lambda: reference_align(lines, words), args.repeat)
+    new_time, new_segments = best_of(lambda: align_lines(lines, words), args.repeat)
+    stream = WordStream(words)
+    cached_time, _ = best_of(lambda: align_lines(lines, stream), args.repeat)
+
+    if ref_segments != new_segments:
+        print("NG: 旧実装と結果が一致しません")
+        sys.exit(1)
+
+    print(f"旧実装:                 {ref_time * 1000:8.2f} ms")
+    print(f"align_lines:            {new_time * 1000:8.2f} ms ({ref_time / new_time:.1f}x)")
+    print(f"align_lines(WordStream):{cached_time * 1000:8.2f} ms ({ref_time / cached_time:.1f}x)")
+
+    # 約5000文字分の行を編集してDPアライメントを測定
+    dp_lines = []
+    char_count = 0
+    for line in lines:
+        if char_count >= 5000:
+            break
+        dp_lines.append(line)
+        char_count += len(normalize(line))
+    truth = align_lines_dp(dp_lines, stream)
+
+    edited = list(dp_lines)
+    edited[5] = edited[5] + "（よみがな）"
+    edited[10] = edited[10][3:]
+    edited.insert(20, "全く関係のない行を追加。")
+    dp_time, dp_segments = best_of(lambda: align_lines_dp(edited, stream), args.repeat)
+    greedy_segments = align_lines(edited, stream)
+    del dp_segments[20], greedy_segments[20]
+
+    def drift(segments):
+        return max(abs(a["start"] - b["start"]) for a, b in zip(truth[25:], segments[25:]))
+
+    print(f"align_lines_dp ({char_count}文字, 編集あり): {dp_time * 1000:8.2f} ms")
+    print(f"  編集箇所以降の最大ずれ: DP {drift(dp_segments):.3f}s / 貪欲法 {drift(greedy_segments):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
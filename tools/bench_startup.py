@@ -0,0 +1,134 @@
+"""起動時間（app.py の import と初回描画）のベンチマーク
+
+使い方:
+    python tools/bench_startup.py [--repeat 5] [--max-import-ms 1500] [--max-render-ms 5000]
+
+毎回新しい Python プロセスを起動して次の2つを測定します。
+  1. import: app.py の先頭で import しているモジュールをすべて読み込む時間
+  2. 初回描画: streamlit.testing の AppTest で app.py を1回実行する時間
+     （サービス再起動直後の最初のページ表示に相当）
+あわせて、起動時には読み込まないはずの重い依存（google.genai、PIL、imageio_ffmpeg）が
+import と初回描画で読み込まれていないかを確認します。
+しきい値を超えた場合・重い依存が読み込まれていた場合は終了コード1で終了します。
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+
+# 初回使用時まで読み込みを遅らせている依存
+LAZY_MODULES = ("google.genai", "PIL", "imageio_ffmpeg")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+modules = {modules!r}
+started = time.perf_counter()
+for name in modules:
+    __import__(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "loaded_lazy": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+RENDER_SCRIPT = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=120)
+app.run()
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "render_ms": elapsed * 1000,
+    "exceptions": [str(e.value) for e in app.exception],
+    "loaded_lazy": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def app_imports():
+    """app.py のモジュールレベルの import 文から読み込むモジュール名を集める"""
+    with open(APP_PATH, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def run_in_fresh_process(script):
+    """新しい Python プロセスでスクリプトを実行し、最後の行の JSON を返す"""
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True, text=True, cwd=ROOT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="測定回数（中央値を表示）")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="import 時間の上限（ミリ秒）")
+    parser.add_argument("--max-render-ms", type=float, default=None, help="初回描画時間の上限（ミリ秒）")
+    parser.add_argument("--skip-render", action="store_true", help="初回描画の測定を省略")
+    args = parser.parse_args()
+
+    modules = app_imports()
+    print(f"app.py の import: {len(modules)} モジュール")
+
+    failed = False
+    import_script = IMPORT_SCRIPT.format(root=ROOT, modules=modules, lazy=LAZY_MODULES)
+    import_runs = [run_in_fresh_process(import_script) for _ in range(args.repeat)]
+    import_ms = statistics.median(run["import_ms"] for run in import_runs)
+    print(f"import: 中央値 {import_ms:.0f} ms "
+          f"（最小 {min(run['import_ms'] for run in import_runs):.0f} ms / "
+          f"最大 {max(run['import_ms'] for run in import_runs):.0f} ms）")
+
+    loaded = sorted({name for run in import_runs for name in run["loaded_lazy"]})
+    if loaded:
+        print(f"NG: import だけで読み込まれた重い依存: {', '.join(loaded)}")
+        failed = True
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"NG: import が上限 {args.max_import_ms:.0f} ms を超えています")
+        failed = True
+
+    if not args.skip_render:
+        render_script = RENDER_SCRIPT.format(root=ROOT, app=APP_PATH, lazy=LAZY_MODULES)
+        render_runs = [run_in_fresh_process(render_script) for _ in range(args.repeat)]
+        render_ms = statistics.median(run["render_ms"] for run in render_runs)
+        print(f"初回描画: 中央値 {render_ms:.0f} ms "
+              f"（最小 {min(run['render_ms'] for run in render_runs):.0f} ms / "
+              f"最大 {max(run['render_ms'] for run in render_runs):.0f} ms）")
+        rendered_lazy = sorted({name for run in render_runs for name in run["loaded_lazy"]})
+        if rendered_lazy:
+            print(f"NG: 初回描画で読み込まれた重い依存: {', '.join(rendered_lazy)}")
+            failed = True
+        exceptions = [e for run in render_runs for e in run["exceptions"]]
+        if exceptions:
+            print(f"NG: 描画中の例外: {exceptions[0]}")
+            failed = True
+        if args.max_render_ms is not None and render_ms > args.max_render_ms:
+            print(f"NG: 初回描画が上限 {args.max_render_ms:.0f} ms を超えています")
+            failed = True
+
+    print("NG" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""Lark Base（bitable）APIのローカルモックサーバー
+
+使い方:
+    python tools/mock_lark_server.py [--port 8787] [--users 200] [--latency-ms 80] [--rate-limit 50]
+
+起動後、LARK_BASE_URL=http://127.0.0.1:8787/open-apis を設定するとアプリの認証を
+実際のLark認証情報なしで動かせます（secrets.toml の [lark] は任意の値でOK）。
+
+対応エンドポイント:
+    POST   /open-apis/auth/v3/tenant_access_token/internal
+    GET    /open-apis/bitable/v1/apps/{app}/tables/{table}/records          （filter, page_token対応）
+    POST   /open-apis/bitable/v1/apps/{app}/tables/{table}/records          作成
+    POST   /open-apis/bitable/v1/apps/{app}/tables/{table}/records/search   （filter, page_token対応）
+    PUT    /open-apis/bitable/v1/apps/{app}/tables/{table}/records/{id}
+    DELETE /open-apis/bitable/v1/apps/{app}/tables/{table}/records/{id}
+    POST   /open-apis/bitable/v1/apps/{app}/tables/{table}/records/batch_get
+    POST   /open-apis/bitable/v1/apps/{app}/tables/{table}/records/batch_update
+    POST   /open-apis/bitable/v1/apps/{app}/tables/{table}/records/batch_create
+    GET    /__stats     エンドポイント別の呼び出し回数（JSON）
+    POST   /__reset     呼び出し回数をリセット
+
+--rate-limit を指定すると1秒あたりのリクエスト数を超えた分に 429 と
+x-ogw-ratelimit-reset ヘッダーを返します（Larkの頻度制限と同じ形式）。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE_LIMIT = 500
+BATCH_LIMIT = 500
+
+_RECORDS_PATH = re.compile(r"^/open-apis/bitable/v1/apps/[^/]+/tables/[^/]+/records(?:/(?P<rest>[^/]+))?$")
+_LIST_FILTER = re.compile(r'^CurrentValue\.\[(?P<field>[^\]]+)\]="(?P<value>.*)"$')
+
+
+def make_users(count, seed=0):
+    """合成ユーザーレコードを作成（約1割が承認待ち、先頭のユーザーは管理者）"""
+    rng = random.Random(seed)
+    records = {}
+    for i in range(count):
+        record_id = f"rec{i:06d}"
+        status = "承認待ち" if rng.random() < 0.1 else "承認済み"
+        records[record_id] = {
+            "record_id": record_id,
+            "fields": {
+                "GoogleID": f"google-{i}",
+                "メールアドレス": f"user{i}@example.com",
+                "本名": f"ユーザー{i}",
+                "ニックネーム": f"user{i}",
+                "ステータス": status,
+                "管理者": i == 0,
+                "登録日時": "2026-01-01 00:00:00",
+                "最終ログイン": "",
+                "ログイン回数": 0,
+            },
+        }
+    return records
+
+
+class _RateLimiter:
+    """1秒ウィンドウの単純なレート制限"""
+
+    def __init__(self, per_second):
+        self.per_second = per_second
+        self._window = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """許可ならNone、制限中ならリセットまでの秒数"""
+        if not self.per_second:
+            return None
+        now = time.time()
+        with self._lock:
+            window = int(now)
+            if window != self._window:
+                self._window = window
+                self._count = 0
+            self._count += 1
+            if self._count > self.per_second:
+                return max(0.01, window + 1 - now)
+        return None
+
+
+class MockLarkServer:
+    """モックサーバー本体（スレッドで起動して負荷テストから使う）"""
+
+    def __init__(self, host="127.0.0.1", port=0, users=200, latency_ms=0.0, jitter_ms=0.0,
+                 rate_limit=0, token_expire=7200, seed=0):
+        self.records = make_users(users, seed)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_expire = token_expire
+        self.rate_limiter = _RateLimiter(rate_limit)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.tokens = set()
+
+        server = self
+
+        class Handler(_Handler):
+            mock = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/open-apis"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-lark", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.calls)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: MockLarkServer = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- HTTP ---
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._read_body()
+
+        if url.path == "/__stats":
+            return self._send(200, self.mock.stats())
+        if url.path == "/__reset":
+            self.mock.reset_stats()
+            return self._send(200, {"code": 0})
+
+        endpoint = self._endpoint_name(method, url.path)
+        with self.mock.lock:
+            self.mock.calls[endpoint] += 1
+
+        reset_after = self.mock.rate_limiter.check()
+        if reset_after is not None:
+            with self.mock.lock:
+                self.mock.calls["rate_limited"] += 1
+            return self._send(
+                429,
+                {"code": 99991400, "msg": "request trigger frequency limit"},
+                {"x-ogw-ratelimit-reset": f"{reset_after:.2f}"}
+            )
+
+        if self.mock.latency_ms or self.mock.jitter_ms:
+            time.sleep((self.mock.latency_ms + random.uniform(0, self.mock.jitter_ms)) / 1000.0)
+
+        if endpoint == "token":
+            return self._token(body)
+
+        if not self._authorized():
+            return self._send(400, {"code": 99991663, "msg": "Invalid access token for authorization"})
+
+        match = _RECORDS_PATH.match(url.path)
+        if not match:
+            return self._send(404, {"code": 404, "msg": "not found"})
+        rest = match.group("rest")
+
+        if method == "GET" and rest is None:
+            return self._list(query)
+        if method == "POST" and rest is None:
+            return self._create(body)
+        if method == "POST" and rest == "search":
+            return self._search(query, body)
+        if method == "POST" and rest == "batch_get":
+            return self._batch_get(body)
+        if method == "POST" and rest == "batch_update":
+            return self._batch_update(body)
+        if method == "POST" and rest == "batch_create":
+            return self._batch_create(body)
+        if method == "PUT" and rest:
+            return self._update(rest, body)
+        if method == "DELETE" and rest:
+            return self._delete(rest)
+        return self._send(404, {"code": 404, "msg": "not found"})
+
+    @staticmethod
+    def _endpoint_name(method, path):
+        if path.endswith("/tenant_access_token/internal"):
+            return "token"
+        match = _RECORDS_PATH.match(path)
+        if not match:
+            return f"{method} {path}"
+        rest = match.group("rest")
+        if rest in ("search", "batch_get", "batch_update", "batch_create"):
+            return rest
+        if rest is None:
+            return "list" if method == "GET" else "create"
+        return {"PUT": "update", "DELETE": "delete"}.get(method, f"{method} record")
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        auth = self.headers.get("Authorization", "")
+        return auth.startswith("Bearer ") and auth[7:] in self.mock.tokens
+
+    # --- Endpoints ---
+
+    def _token(self, body):
+        if not body.get("app_id") or not body.get("app_secret"):
+            return self._send(200, {"code": 10003, "msg": "invalid param"})
+        token = f"t-{uuid.uuid4().hex}"
+        with self.mock.lock:
+            self.mock.tokens.add(token)
+        return self._send(200, {"code": 0, "msg": "ok", "tenant_access_token": token,
+                                "expire": self.mock.token_expire})
+
+    def _page(self, records, query):
+        page_size = min(int(query.get("page_size", 20)), PAGE_SIZE_LIMIT)
+        offset = int(query.get("page_token") or 0)
+        items = records[offset:offset + page_size]
+        has_more = offset + page_size < len(records)
+        data = {"items": items, "has_more": has_more, "total": len(records)}
+        if has_more:
+            data["page_token"] = str(offset + page_size)
+        return self._send(200, {"code": 0, "msg": "success", "data": data})
+
+    def _matching(self, conditions):
+        """(フィールド名, 値) の条件をすべて満たすレコードのコピー"""
+        with self.mock.lock:
+            matched = [
+                r for r in self.mock.records.values()
+                if all(str(r["fields"].get(field, "")) == value for field, value in conditions)
+            ]
+            return [json.loads(json.dumps(r)) for r in matched]
+
+    def _list(self, query):
+        conditions = []
+        flt = query.get("filter")
+        if flt:
+            match = _LIST_FILTER.match(flt)
+            if not match:
+                return self._send(200, {"code": 1254018, "msg": "InvalidFilter"})
+            conditions.append((match.group("field"), match.group("value")))
+        return self._page(self._matching(conditions), query)
+
+    def _search(self, query, body):
+        conditions = []
+        flt = body.get("filter") or {}
+        for condition in flt.get("conditions", []):
+            if condition.get("operator") != "is":
+                return self._send(200, {"code": 1254018, "msg": "InvalidFilter"})
+            values = condition.get("value") or [""]
+            conditions.append((condition.get("field_name"), str(values[0])))
+        return self._page(self._matching(conditions), query)
+
+    def _create(self, body):
+        record_id = f"rec{uuid.uuid4().hex[:10]}"
+        record = {"record_id": record_id, "fields": body.get("fields", {})}
+        with self.mock.lock:
+            self.mock.records[record_id] = record
+        return self._send(200, {"code": 0, "data": {"record": record}})
+
+    def _update(self, record_id, body):
+        with self.mock.lock:
+            record = self.mock.records.get(record_id)
+            if record is None:
+                return self._send(200, {"code": 1254043, "msg": "RecordIdNotFound"})
+            record["fields"].update(body.get("fields", {}))
+            result = json.loads(json.dumps(record))
+        return self._send(200, {"code": 0, "data": {"record": result}})
+
+    def _delete(self, record_id):
+        with self.mock.lock:
+            existed = self.mock.records.pop(record_id, None) is not None
+        if not existed:
+            return self._send(200, {"code": 1254043, "msg": "RecordIdNotFound"})
+        return self._send(200, {"code": 0, "data": {"deleted": True, "record_id": record_id}})
+
+    def _batch_get(self, body):
+        record_ids = body.get("record_ids", [])
+        if len(record_ids) > BATCH_LIMIT:
+            return self._send(200, {"code": 1254104, "msg": "RecordExceedLimit"})
+        with self.mock.lock:
+            records = [json.loads(json.dumps(self.mock.records[rid])) for rid in record_ids if rid in self.mock.records]
+        return self._send(200, {"code": 0, "data": {"records": records}})
+
+    def _batch_update(self, body):
+        updates = body.get("records", [])
+        if len(updates) > BATCH_LIMIT:
+            return self._send(200, {"code": 1254104, "msg": "RecordExceedLimit"})
+        with self.mock.lock:
+            missing = [u.get("record_id") for u in updates if u.get("record_id") not in self.mock.records]
+            if missing:
+                return self._send(200, {"code": 1254043, "msg": f"RecordIdNotFound: {missing[0]}"})
+            result = []
+            for update in updates:
+                record = self.mock.records[update["record_id"]]
+                record["fields"].update(update.get("fields", {}))
+                result.append(json.loads(json.dumps(record)))
+        return self._send(200, {"code": 0, "data": {"records": result}})
+
+    def _batch_create(self, body):
+        creates = body.get("records", [])
+        if len(creates) > BATCH_LIMIT:
+            return self._send(200, {"code": 1254104, "msg": "RecordExceedLimit"})
+        result = []
+        with self.mock.lock:
+            for create in creates:
+                record_id = f"rec{uuid.uuid4().hex[:10]}"
+                record = {"record_id": record_id, "fields": create.get("fields", {})}
+                self.mock.records[record_id] = record
+                result.append(record)
+        return self._send(200, {"code": 0, "data": {"records": result}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lark Base APIのローカルモック")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--users", type=int, default=200, help="初期ユーザー数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="各リクエストの遅延")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="遅延に加えるランダム幅")
+    parser.add_argument("--rate-limit", type=int, default=0, help="1秒あたりの上限（0で無制限）")
+    args = parser.parse_args()
+
+    server = MockLarkServer(args.host, args.port, args.users, args.latency_ms, args.jitter_ms, args.rate_limit)
+    print(f"Mock Lark Base: {server.base_url} （ユーザー {args.users}人）")
+    print(f"  LARK_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
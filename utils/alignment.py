@@ -0,0 +1,457 @@
+import re
+from bisect import bisect_right
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Union
+
+
+# タイミング照合時に無視する文字（句読点と空白）
+_IGNORED_CHARS = re.compile(r'[、。,.\s　]')
+
+
+def normalize(text: str) -> str:
+    """句読点と空白を除去（行テキストと単語の照合用）"""
+    return _IGNORED_CHARS.sub('', text)
+
+
+class WordStream:
+    """Gladiaの単語リストを一度だけ正規化した文字列と、単語境界への累積インデックス
+
+    offsets[k] は k 番目の単語より前にある正規化済み文字数（offsets[-1] は総文字数）。
+    文字位置 → 単語番号の変換は二分探索、行の割り当ては先頭からの1パスで行う。
+    元の単語の辞書は保持しない（キャッシュしておいても単語リストの複製にならないように）。
+    """
+
+    def __init__(self, words: Sequence[Dict]):
+        normalized = []
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+        for w in words:
+            normalized.append(normalize(w.get('word', '')))
+            self.starts.append(float(w.get('start', 0)))
+            self.ends.append(float(w.get('end', 0)))
+        self.text = ''.join(normalized)
+        self.offsets = [0]
+        for word_norm in normalized:
+            self.offsets.append(self.offsets[-1] + len(word_norm))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def word_at(self, char_pos: int) -> int:
+        """正規化済み文字位置 char_pos を含む単語の番号"""
+        index = bisect_right(self.offsets, char_pos) - 1
+        return min(max(index, 0), len(self) - 1)
+
+    @property
+    def total_duration(self) -> float:
+        return self.ends[-1] if self.starts else 1.0
+
+
+def align_lines(
+    lines: Sequence[str],
+    words: Union[Sequence[Dict], WordStream],
+    min_duration: float = 0.1,
+    fallback_duration: float = 0.5
+) -> List[Dict]:
+    """各行に含まれる単語を先頭から順に割り当て、行ごとのタイムスタンプを計算
+
+    行の正規化後の文字数分だけ単語を消費する（単語リストの走査は全体で1回）。
+    句読点のみの行はスキップし、単語が尽きた行は全体の長さを行数で均等分割する。
+
+    Args:
+        lines: 表示する行のリスト
+        words: Gladiaの単語リスト [{"word": "...", "start": 0.0, "end": 0.3}, ...] またはWordStream
+        min_duration: これより短い行は fallback_duration に延長
+        fallback_duration: 不正・極端に短い区間に割り当てる長さ（秒）
+
+    Returns:
+        [{"start": 0.0, "end": 1.5, "text": "行テキスト"}, ...]
+    """
+    stream = words if isinstance(words, WordStream) else WordStream(words)
+    offsets = stream.offsets
+    word_count = len(stream)
+
+    segments = []
+    word_index = 0
+
+    for line_idx, line in enumerate(lines):
+        line_len = len(normalize(line))
+        if not line_len:
+            # 空行（句読点のみ）の場合はスキップ
+            continue
+
+        # 行の文字数分の単語を消費
+        start_word_idx = word_index
+        target = offsets[start_word_idx] + line_len
+        while word_index < word_count and offsets[word_index] < target:
+            word_index += 1
+
+        end_word_idx = word_index - 1 if word_index > start_word_idx else start_word_idx
+
+        if start_word_idx < word_count and end_word_idx < word_count:
+            start_time = stream.starts[start_word_idx]
+            end_time = stream.ends[end_word_idx]
+            # end_timeがstart_time以下の場合は修正
+            if end_time <= start_time:
+                end_time = start_time + fallback_duration
+        else:
+            # フォールバック: 均等分割
+            segment_duration = stream.total_duration / len(lines)
+            start_time = line_idx * segment_duration
+            end_time = (line_idx + 1) * segment_duration
+
+        # 最小持続時間を保証
+        if end_time - start_time < min_duration:
+            end_time = start_time + fallback_duration
+
+        segments.append({
+            "start": start_time,
+            "end": end_time,
+            "text": line
+        })
+
+    return segments
+
+
+# ========================================
+# 編集距離ベースの頑健なアライメント
+# ========================================
+# アンカーとみなす一致文字列の長さ
+ANCHOR_KGRAM = 4
+
+
+def _unique_kgrams(text: str, k: int) -> Dict[str, int]:
+    """text 中にちょうど1回だけ現れる長さkの部分文字列 → 位置"""
+    positions = {}
+    duplicated = set()
+    for i in range(len(text) - k + 1):
+        gram = text[i:i + k]
+        if gram in positions:
+            duplicated.add(gram)
+        else:
+            positions[gram] = i
+    for gram in duplicated:
+        del positions[gram]
+    return positions
+
+
+def _anchor_pairs(a: str, b: str, k: int) -> List[tuple]:
+    """両方の文字列で一意なk-gramの一致から、a・b両方で単調増加する文字対応 (i, j) を作る"""
+    if len(a) < k or len(b) < k:
+        return []
+    grams_a = _unique_kgrams(a, k)
+    grams_b = _unique_kgrams(b, k)
+    candidates = sorted((i, grams_b[gram]) for gram, i in grams_a.items() if gram in grams_b)
+    if not candidates:
+        return []
+
+    # jについての最長増加部分列（patience sorting）で交差する一致を除く
+    tails = []
+    tail_indices = []
+    previous = [-1] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        pos = bisect_right(tails, j - 1)
+        if pos == len(tails):
+            tails.append(j)
+            tail_indices.append(index)
+        else:
+            tails[pos] = j
+            tail_indices[pos] = index
+        previous[index] = tail_indices[pos - 1] if pos > 0 else -1
+    chain = []
+    index = tail_indices[-1]
+    while index >= 0:
+        chain.append(candidates[index])
+        index = previous[index]
+    chain.reverse()
+
+    # k-gramを文字単位の対応に展開（重なりは単調性を保てる分だけ採用）
+    pairs = []
+    last_i = last_j = -1
+    for i, j in chain:
+        for t in range(k):
+            if i + t > last_i and j + t > last_j:
+                pairs.append((i + t, j + t))
+                last_i, last_j = i + t, j + t
+    return pairs
+
+
+def _banded_align(a: str, b: str, band: int) -> List[tuple]:
+    """aとbの大域アライメント（Needleman–Wunsch、対角線の周囲band幅のみ計算）
+
+    Returns:
+        [(aの位置, bの位置), ...] 置換・一致で対応した文字の組
+    """
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        return []
+
+    # 行ごとの中心が1行で進む量以上の幅を確保（隣接行の範囲を必ず重ねる）
+    band = max(band, -(-m // n) + 1, -(-n // m) + 1)
+    big = n + m + 1
+
+    def bounds(i):
+        center = i * m // n
+        return max(0, center - band), min(m, center + band)
+
+    lo, hi = bounds(0)
+    prev_lo, prev_cost = lo, list(range(lo, hi + 1))
+    # 0: 対角（一致・置換）, 1: 上（aの文字を削除）, 2: 左（bの文字を挿入）
+    directions = [(lo, bytearray([2] * (hi - lo + 1)))]
+
+    for i in range(1, n + 1):
+        lo, hi = bounds(i)
+        cost = [big] * (hi - lo + 1)
+        direction = bytearray(hi - lo + 1)
+        char_a = a[i - 1]
+        prev_hi = prev_lo + len(prev_cost) - 1
+        for j in range(lo, hi + 1):
+            best, move = big, 0
+            if j > 0 and prev_lo <= j - 1 <= prev_hi:
+                best = prev_cost[j - 1 - prev_lo] + (0 if char_a == b[j - 1] else 1)
+            if prev_lo <= j <= prev_hi and prev_cost[j - prev_lo] + 1 < best:
+                best, move = prev_cost[j - prev_lo] + 1, 1
+            if j > lo and cost[j - 1 - lo] + 1 < best:
+                best, move = cost[j - 1 - lo] + 1, 2
+            cost[j - lo] = best
+            direction[j - lo] = move
+        directions.append((lo, direction))
+        prev_lo, prev_cost = lo, cost
+
+    # トレースバック
+    pairs = []
+    i, j = n, m
+    while i > 0 and j > 0:
+        row_lo, direction = directions[i]
+        move = direction[j - row_lo]
+        if move == 0:
+            pairs.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif move == 1:
+            i -= 1
+        else:
+            j -= 1
+    pairs.reverse()
+    return pairs
+
+
+def align_chars(script: str, stream_text: str, band: int = 32) -> List[int]:
+    """scriptの各文字に対応するstream_textの文字位置（対応なしは-1）
+
+    一意なk-gramの一致をアンカーにし、アンカー間の差分だけを帯状DPで埋める。
+    計算量・メモリはほぼ文字数に比例し、編集や読み仮名の挿入があってもずれが後続に波及しない。
+    """
+    mapping = [-1] * len(script)
+    anchors = _anchor_pairs(script, stream_text, ANCHOR_KGRAM)
+
+    previous_i, previous_j = -1, -1
+    for i, j in anchors + [(len(script), len(stream_text))]:
+        gap_a = script[previous_i + 1:i]
+        gap_b = stream_text[previous_j + 1:j]
+        for gi, gj in _banded_align(gap_a, gap_b, band):
+            mapping[previous_i + 1 + gi] = previous_j + 1 + gj
+        if i < len(script):
+            mapping[i] = j
+        previous_i, previous_j = i, j
+    return mapping
+
+
+def _align_line_maps(
+    line_norms: Sequence[str],
+    stream: WordStream,
+    band: int,
+    window_start: int = 0,
+    window_end: Optional[int] = None
+) -> List[List[int]]:
+    """正規化済みの行を連結して stream.text[window_start:window_end] と対応付け、
+    行ごとに「各文字に対応する単語ストリーム上の位置（なしは-1）」のリストを返す"""
+    if window_end is None:
+        window_end = len(stream.text)
+    script = ''.join(line_norms)
+    mapping = align_chars(script, stream.text[window_start:window_end], band)
+
+    line_maps = []
+    position = 0
+    for line_norm in line_norms:
+        line_maps.append([
+            window_start + j if j >= 0 else -1
+            for j in mapping[position:position + len(line_norm)]
+        ])
+        position += len(line_norm)
+    return line_maps
+
+
+def _build_segments(
+    lines: Sequence[str],
+    line_norms: Sequence[str],
+    line_maps: Sequence[List[int]],
+    stream: WordStream,
+    min_duration: float,
+    fallback_duration: float
+) -> List[Dict]:
+    """行ごとの文字対応からタイムスタンプと信頼度を計算（空行はスキップ）"""
+    segments = []
+    for line, line_norm, line_map in zip(lines, line_norms, line_maps):
+        if not line_norm:
+            continue
+        mapped = [j for j in line_map if j >= 0]
+        exact = sum(1 for char, j in zip(line_norm, line_map) if j >= 0 and char == stream.text[j])
+        segment = {"start": None, "end": None, "text": line, "confidence": exact / len(line_norm)}
+        if mapped:
+            segment["start"] = stream.starts[stream.word_at(mapped[0])]
+            segment["end"] = stream.ends[stream.word_at(mapped[-1])]
+        segments.append(segment)
+
+    # 対応がない行は前後の行の間に配置
+    for index, segment in enumerate(segments):
+        if segment["start"] is not None:
+            continue
+        previous_end = segments[index - 1]["end"] if index > 0 else 0.0
+        next_start = next((s["start"] for s in segments[index + 1:] if s["start"] is not None), None)
+        segment["start"] = previous_end
+        segment["end"] = next_start if next_start is not None and next_start > previous_end else previous_end + fallback_duration
+
+    for segment in segments:
+        if segment["end"] <= segment["start"] or segment["end"] - segment["start"] < min_duration:
+            segment["end"] = segment["start"] + fallback_duration
+
+    return segments
+
+
+def _uniform_segments(lines: Sequence[str], stream: WordStream) -> List[Dict]:
+    """単語がない場合の均等分割"""
+    kept_lines = [line for line in lines if normalize(line)]
+    if not kept_lines:
+        return []
+    segment_duration = stream.total_duration / len(kept_lines)
+    return [{
+        "start": i * segment_duration,
+        "end": (i + 1) * segment_duration,
+        "text": line,
+        "confidence": 0.0
+    } for i, line in enumerate(kept_lines)]
+
+
+def align_lines_dp(
+    lines: Sequence[str],
+    words: Union[Sequence[Dict], WordStream],
+    band: int = 32,
+    min_duration: float = 0.1,
+    fallback_duration: float = 0.5
+) -> List[Dict]:
+    """編集距離アライメントで各行のタイムスタンプと信頼度を計算
+
+    行テキスト（正規化済み）を連結した文字列と単語ストリームを文字単位で対応付け、
+    行の最初・最後の対応文字を含む単語から開始・終了時刻を求める。
+    対応する文字がない行は前後の行の間に配置する。
+
+    Returns:
+        [{"start": 0.0, "end": 1.5, "text": "行テキスト", "confidence": 0.0〜1.0}, ...]
+        confidenceは行の文字のうち単語ストリームと完全一致した割合
+    """
+    stream = words if isinstance(words, WordStream) else WordStream(words)
+    if not stream.text:
+        return _uniform_segments(lines, stream)
+
+    line_norms = [normalize(line) for line in lines]
+    line_maps = _align_line_maps(line_norms, stream, band)
+    return _build_segments(lines, line_norms, line_maps, stream, min_duration, fallback_duration)
+
+
+class AlignmentState:
+    """編集中の台本と単語ストリームの対応を保持し、変更された行だけを再アライメントする
+
+    セッションに保存しておき、テキストが編集されるたびに update() を呼ぶ。
+    変更のない行は前回の文字対応を再利用し、変更された行のまとまりだけを
+    前後の変更されていない行に挟まれた単語ストリームの区間と対応付け直す。
+    """
+
+    def __init__(
+        self,
+        words: Union[Sequence[Dict], WordStream],
+        band: int = 32,
+        min_duration: float = 0.1,
+        fallback_duration: float = 0.5
+    ):
+        self.stream = words if isinstance(words, WordStream) else WordStream(words)
+        self.band = band
+        self.min_duration = min_duration
+        self.fallback_duration = fallback_duration
+        self.lines: List[str] = []
+        self.line_norms: List[str] = []
+        self.line_maps: List[List[int]] = []
+        self.segments: List[Dict] = []
+        self.initialized = False
+        # 直近のupdateで再アライメントした行数（表示・計測用）
+        self.last_realigned_lines = 0
+
+    def update(self, lines: Sequence[str]) -> List[Dict]:
+        """新しい行リストに合わせてタイミングを更新して返す"""
+        lines = list(lines)
+        if self.initialized and lines == self.lines:
+            self.last_realigned_lines = 0
+            return self.segments
+
+        if not self.stream.text:
+            self.lines = lines
+            self.segments = _uniform_segments(lines, self.stream)
+            self.initialized = True
+            return self.segments
+
+        line_norms = [normalize(line) for line in lines]
+        if not self.initialized:
+            line_maps = _align_line_maps(line_norms, self.stream, self.band)
+            self.last_realigned_lines = len(lines)
+        else:
+            line_maps = self._realign(lines, line_norms)
+
+        self.lines = lines
+        self.line_norms = line_norms
+        self.line_maps = line_maps
+        self.segments = _build_segments(
+            lines, line_norms, line_maps, self.stream, self.min_duration, self.fallback_duration
+        )
+        self.initialized = True
+        return self.segments
+
+    def _realign(self, lines: List[str], line_norms: List[str]) -> List[List[int]]:
+        """行の差分を取り、変更された範囲だけを再アライメント"""
+        matcher = SequenceMatcher(None, self.lines, lines, autojunk=False)
+        line_maps: List[Optional[List[int]]] = [None] * len(lines)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                line_maps[j1:j2] = self.line_maps[i1:i2]
+
+        realigned = 0
+        index = 0
+        while index < len(lines):
+            if line_maps[index] is not None:
+                index += 1
+                continue
+            run_end = index
+            while run_end < len(lines) and line_maps[run_end] is None:
+                run_end += 1
+
+            # 前後の変更されていない行が対応する位置の間だけを探す
+            window_start = 0
+            for previous in reversed(line_maps[:index]):
+                mapped = [j for j in previous if j >= 0]
+                if mapped:
+                    window_start = mapped[-1] + 1
+                    break
+            window_end = len(self.stream.text)
+            for following in line_maps[run_end:]:
+                mapped = [j for j in following if j >= 0]
+                if mapped:
+                    window_end = mapped[0]
+                    break
+            window_end = max(window_start, window_end)
+
+            line_maps[index:run_end] = _align_line_maps(
+                line_norms[index:run_end], self.stream, self.band, window_start, window_end
+            )
+            realigned += run_end - index
+            index = run_end
+
+        self.last_realigned_lines = realigned
+        return line_maps
@@ -0,0 +1,210 @@
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+from urllib.parse import quote
+
+# ハンドルの形式（ランダムなトークン + 拡張子）。パスの組み立て前に必ず検証する
+_HANDLE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{20,64}\.[a-z0-9]{1,8}$")
+
+MIME_TYPES = {
+    ".mov": "video/quicktime",
+    ".mp4": "video/mp4",
+}
+
+
+def link_or_copy(src_path: str, dest_path: str) -> str:
+    """ファイルを dest_path に配置（同じファイルシステムならハードリンク、違えばコピー）
+
+    大きな動画をメモリに読み込まずに受け渡すために使う。dest_path が既にあれば置き換える。
+    コピーの途中で失敗したら書きかけのファイルを残さない。
+    """
+    try:
+        os.link(src_path, dest_path)
+        return dest_path
+    except OSError:
+        pass
+    tmp_path = f"{dest_path}.tmp"
+    try:
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return dest_path
+
+
+def _default_artifacts_dir() -> str:
+    """生成物の保存先の既定パス（環境変数 REEDITOR_ARTIFACTS_DIR で上書き可能）"""
+    path = os.environ.get("REEDITOR_ARTIFACTS_DIR")
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), "tiktok_reeditor", "artifacts")
+
+
+class ArtifactStore:
+    """生成した動画をディスクに置き、セッションにはハンドル（文字列）だけを持たせる
+
+    - 動画のバイト列を session_state に入れたり base64 でHTMLに埋め込んだりしない
+    - base_url を設定すると nginx などの静的配信（Range対応）のURLを返す。
+      未設定なら url() は None を返すので、呼び出し側はファイルパスから表示・ダウンロードする
+    - 最後に参照されてから ttl_seconds たった生成物は削除する（参照のたびに期限を延長）
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl_seconds: float = 6 * 3600,
+                 base_url: Optional[str] = None, cleanup_interval: float = 600):
+        self.root = root or _default_artifacts_dir()
+        self.ttl_seconds = ttl_seconds
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- 登録 ---
+
+    def put_file(self, src_path: str, ext: Optional[str] = None) -> str:
+        """ファイルを登録してハンドルを返す
+
+        同じファイルシステム上ならハードリンクで登録するので、大きな動画でもコピーしない。
+        """
+        self._maybe_cleanup()
+        ext = (ext or os.path.splitext(src_path)[1] or ".bin").lower()
+        handle = f"{secrets.token_urlsafe(24)}{ext}"
+        dest_path = os.path.join(self.root, handle)
+        link_or_copy(src_path, dest_path)
+        os.utime(dest_path)
+        return handle
+
+    # --- 参照 ---
+
+    def path(self, handle: Optional[str]) -> Optional[str]:
+        """ハンドルのファイルパス（期限切れ・不正なハンドルなら None）。参照すると期限を延長"""
+        if not handle or not _HANDLE_PATTERN.match(handle):
+            return None
+        path = os.path.join(self.root, handle)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def exists(self, handle: Optional[str]) -> bool:
+        return self.path(handle) is not None
+
+    def url(self, handle: Optional[str], download_name: Optional[str] = None) -> Optional[str]:
+        """静的配信のURL（base_url 未設定・期限切れなら None）
+
+        download_name を指定すると ?dl= を付け、nginx 側で
+        Content-Disposition: attachment のファイル名として使う。
+        """
+        if not self.base_url or self.path(handle) is None:
+            return None
+        url = f"{self.base_url}/{handle}"
+        if download_name:
+            url += f"?dl={quote(download_name)}"
+        return url
+
+    def mime_type(self, handle: str) -> str:
+        return MIME_TYPES.get(os.path.splitext(handle)[1], "application/octet-stream")
+
+    def size(self, handle: Optional[str]) -> int:
+        path = self.path(handle)
+        return os.path.getsize(path) if path else 0
+
+    def reader(self, handle: str):
+        """ダウンロードボタン用に、押されたときだけファイルを読む関数を返す"""
+        def read() -> bytes:
+            path = self.path(handle)
+            if path is None:
+                return b""
+            with open(path, "rb") as f:
+                return f.read()
+        return read
+
+    # --- 削除 ---
+
+    def remove(self, handle: Optional[str]) -> None:
+        if not handle or not _HANDLE_PATTERN.match(handle):
+            return
+        try:
+            os.unlink(os.path.join(self.root, handle))
+        except OSError:
+            pass
+
+    def cleanup_expired(self) -> tuple:
+        """期限切れの生成物を削除
+
+        Returns:
+            tuple: (削除した件数, 削除したバイト数)
+        """
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        removed_bytes = 0
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return (0, 0)
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                size = os.path.getsize(path)
+                os.unlink(path)
+            except OSError:
+                continue
+            removed += 1
+            removed_bytes += size
+        if removed:
+            print(f"期限切れの生成物を削除: {removed}件, {removed_bytes / 1024 / 1024:.1f} MB")
+        return (removed, removed_bytes)
+
+    def _maybe_cleanup(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._last_cleanup and now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+        self.cleanup_expired()
+
+    def stats(self) -> dict:
+        count = 0
+        total = 0
+        try:
+            for entry in os.scandir(self.root):
+                if entry.is_file():
+                    count += 1
+                    total += entry.stat().st_size
+        except OSError:
+            pass
+        return {"count": count, "bytes": total, "ttl_seconds": self.ttl_seconds, "base_url": self.base_url}
+
+
+_shared_store: Optional[ArtifactStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """プロセス全体で共有する生成物ストアを取得
+
+    保存期間は環境変数 REEDITOR_ARTIFACT_TTL（秒）、静的配信のURLの接頭辞は
+    REEDITOR_ARTIFACT_BASE_URL（例: /artifacts）で指定できる。
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = ArtifactStore(
+                ttl_seconds=float(os.environ.get("REEDITOR_ARTIFACT_TTL", str(6 * 3600))),
+                base_url=os.environ.get("REEDITOR_ARTIFACT_BASE_URL") or None
+            )
+        return _shared_store
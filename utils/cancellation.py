@@ -0,0 +1,93 @@
+import subprocess
+import threading
+from typing import Callable, List, Optional
+
+
+class CancelledError(BaseException):
+    """処理がキャンセルされた
+
+    BaseException を継承しているので、API呼び出しまわりの except Exception に
+    握りつぶされずにジョブまで伝わる（asyncio.CancelledError と同じ考え方）。
+    """
+
+
+class CancellationToken:
+    """処理の中断要求を伝えるトークン
+
+    cancel() が呼ばれると、登録中のFFmpegなどのサブプロセスを終了し、
+    on_cancel() で登録したコールバックを実行する。処理側は区切りごとに
+    raise_if_cancelled() を呼び、待機には time.sleep の代わりに wait() を使う。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: List[subprocess.Popen] = []
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            processes = list(self._processes)
+            callbacks = list(self._callbacks)
+        for process in processes:
+            _terminate(process)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"キャンセル処理のエラー: {e}")
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise CancelledError()
+
+    def wait(self, timeout: float) -> None:
+        """timeout 秒待つ（途中でキャンセルされたら CancelledError）"""
+        self._event.wait(timeout)
+        self.raise_if_cancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def register_process(self, process: subprocess.Popen) -> None:
+        """キャンセル時に終了させるサブプロセスを登録"""
+        with self._lock:
+            if not self._event.is_set():
+                self._processes.append(process)
+                return
+        _terminate(process)
+
+    def unregister_process(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            if process in self._processes:
+                self._processes.remove(process)
+
+
+def _terminate(process: subprocess.Popen, grace_seconds: float = 3.0) -> None:
+    """サブプロセスを終了（応答がなければ kill）"""
+    if process.poll() is not None:
+        return
+    try:
+        process.terminate()
+        process.wait(timeout=grace_seconds)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    except OSError:
+        pass
+
+
+def check_cancelled(token: Optional[CancellationToken]) -> None:
+    """token が None でなければキャンセル済みか確認"""
+    if token is not None:
+        token.raise_if_cancelled()
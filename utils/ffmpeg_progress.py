@@ -0,0 +1,147 @@
+import subprocess
+import threading
+from typing import Callable, List, Optional
+
+from utils.cancellation import CancellationToken, CancelledError, check_cancelled
+
+# callback(進捗 0.0〜1.0, 速度の倍率 or None)
+ProgressCallback = Callable[[float, Optional[float]], None]
+
+
+def parse_out_time(value: str) -> Optional[float]:
+    """out_time（HH:MM:SS.ffffff）を秒に変換"""
+    try:
+        hours, minutes, seconds = value.strip().split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """speed（例: 1.85x）を倍率に変換（N/A なら None）"""
+    value = value.strip().rstrip("x")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def with_progress_output(cmd: List[str]) -> List[str]:
+    """進捗を標準出力に key=value 形式で出すオプションを追加"""
+    if "-progress" in cmd:
+        return list(cmd)
+    return [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+
+
+class FFmpegProgressReader:
+    """FFmpegの -progress pipe:1 の出力を別スレッドで読み、進捗を通知する
+
+    out_time を既知の総再生時間で割って 0.0〜1.0 の進捗にし、
+    speed（実時間に対する処理速度の倍率）と一緒に callback(fraction, speed) へ渡す。
+    """
+
+    def __init__(self, stream, duration: Optional[float] = None, callback: Optional[ProgressCallback] = None):
+        self.stream = stream
+        self.duration = duration
+        self.callback = callback
+        self.out_time = 0.0
+        self.speed: Optional[float] = None
+        self.finished = False
+        self._thread = threading.Thread(target=self._read, name="ffmpeg-progress", daemon=True)
+
+    def start(self) -> "FFmpegProgressReader":
+        self._thread.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    @property
+    def fraction(self) -> float:
+        if self.finished:
+            return 1.0
+        if not self.duration:
+            return 0.0
+        return max(0.0, min(1.0, self.out_time / self.duration))
+
+    def _read(self) -> None:
+        for raw_line in iter(self.stream.readline, b""):
+            line = raw_line.decode("utf-8", errors="replace").strip()
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            if key == "out_time":
+                out_time = parse_out_time(value)
+                if out_time is not None:
+                    self.out_time = out_time
+            elif key == "speed":
+                self.speed = parse_speed(value)
+            elif key == "progress":
+                # 1ブロック分の出力の区切り（continue / end）
+                if value == "end":
+                    self.finished = True
+                self._notify()
+        self.stream.close()
+
+    def _notify(self) -> None:
+        if self.callback is None:
+            return
+        try:
+            self.callback(self.fraction, self.speed)
+        except CancelledError:
+            pass  # FFmpegはトークン側で終了させる。読み取りは最後まで続ける
+        except Exception as e:
+            print(f"進捗コールバックのエラー: {e}")
+
+
+def run_with_progress(
+    cmd: List[str],
+    duration: Optional[float] = None,
+    callback: Optional[ProgressCallback] = None,
+    check: bool = True,
+    cancel_token: Optional[CancellationToken] = None,
+    text: bool = False
+) -> tuple:
+    """FFmpegを進捗出力付きで実行
+
+    cancel_token がキャンセルされるとFFmpegを終了して CancelledError を送出する。
+    stderr は常に取り込む（text=True なら文字列で返す。subprocess.run と同じ）。
+
+    Returns:
+        tuple: (CompletedProcess, 処理した再生時間(秒), 最後に報告された速度)
+    """
+    check_cancelled(cancel_token)
+    cmd = with_progress_output(cmd)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if cancel_token is not None:
+        cancel_token.register_process(process)
+    reader = FFmpegProgressReader(process.stdout, duration, callback).start()
+
+    # stderr も別スレッドで読み切る（パイプが詰まってFFmpegが止まらないように）
+    stderr_chunks = []
+    stderr_thread = threading.Thread(
+        target=lambda: stderr_chunks.append(process.stderr.read()),
+        name="ffmpeg-stderr",
+        daemon=True
+    )
+    stderr_thread.start()
+
+    try:
+        returncode = process.wait()
+        reader.join()
+        stderr_thread.join()
+    finally:
+        if cancel_token is not None:
+            cancel_token.unregister_process(process)
+    check_cancelled(cancel_token)
+    stderr = b"".join(stderr_chunks)
+    stdout = b""
+    if text:
+        stderr = stderr.decode("utf-8", errors="replace")
+        stdout = ""
+
+    completed = subprocess.CompletedProcess(cmd, returncode, stdout=stdout, stderr=stderr)
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, output=stdout, stderr=stderr)
+    media_seconds = reader.out_time or (duration or 0.0)
+    return completed, media_seconds, reader.speed
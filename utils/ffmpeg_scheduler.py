@@ -0,0 +1,249 @@
+import contextvars
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+from utils.cancellation import CancellationToken, CancelledError, check_cancelled
+from utils.ffmpeg_progress import ProgressCallback, run_with_progress
+
+# 進捗付き・キャンセル可能な実行（run_with_progress）で受け付ける subprocess.run の引数
+_PROGRESS_RUN_KWARGS = ("check", "capture_output", "text")
+
+# FFmpegを実行しているユーザー（ジョブ実行時に設定、未設定ならプロセス共通の枠）
+_current_owner: contextvars.ContextVar = contextvars.ContextVar("ffmpeg_owner", default="")
+
+
+@contextmanager
+def owner_context(owner: str):
+    """このブロック内で起動するFFmpegを owner の処理として扱う"""
+    token = _current_owner.set(owner or "")
+    try:
+        yield
+    finally:
+        _current_owner.reset(token)
+
+
+class _Ticket:
+    """実行枠の空きを待っている1件"""
+
+    def __init__(self, owner: str):
+        self.owner = owner
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+class FFmpegScheduler:
+    """FFmpegプロセスの同時実行数を制限する共通スケジューラー
+
+    - 同時に動かすFFmpegは max_processes 個まで、各プロセスは -threads で
+      threads_per_process スレッドに制限し、CPUの取り合いで全員が遅くなるのを防ぐ
+    - 空きがないときはユーザーごとの待ち行列に入り、空いた枠はユーザー間で
+      ラウンドロビンに割り当てる（1人が大量に投入しても他のユーザーが待たされ続けない）
+    - 待ち件数・待ち時間・エンコード速度は stats() で取得できる
+    """
+
+    def __init__(self, max_processes: Optional[int] = None, threads_per_process: Optional[int] = None):
+        cpu_count = os.cpu_count() or 2
+        self.max_processes = max(1, max_processes or max(1, cpu_count // 2))
+        self.threads_per_process = max(1, threads_per_process or cpu_count // self.max_processes)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queues: Dict[str, Deque[_Ticket]] = {}
+        self._rotation: Deque[str] = deque()  # 待ちのあるユーザーの順番
+        self._wait_times: Deque[float] = deque(maxlen=200)
+        self._encodes: Deque[tuple] = deque(maxlen=200)  # (再生時間, 所要時間) 直近のエンコード
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0  # キャンセルで中断した件数（失敗には数えない）
+        self.max_wait = 0.0
+
+    # --- 実行 ---
+
+    def run(
+        self,
+        cmd: List[str],
+        threads: bool = True,
+        duration: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        **kwargs
+    ) -> subprocess.CompletedProcess:
+        """枠が空くのを待ってからFFmpegを実行
+
+        Args:
+            cmd: FFmpegのコマンド（最後の要素が出力先）
+            threads: Trueなら出力オプションに -threads を追加
+            duration: 出力の再生時間（秒）。指定すると -progress の出力を読み、
+                進捗を on_progress(fraction, speed) に通知してスループットを記録する
+            on_progress: 進捗コールバック
+            cancel_token: キャンセルされたら順番待ちをやめ、実行中のFFmpegを終了する
+            **kwargs: subprocess.run にそのまま渡す（進捗付き・キャンセル可能な場合は
+                check / capture_output / text のみ。stderr は常に取り込まれ、それ以外は TypeError）
+        """
+        with_progress = duration is not None or on_progress is not None or cancel_token is not None
+        if with_progress:
+            unsupported = sorted(set(kwargs) - set(_PROGRESS_RUN_KWARGS))
+            if unsupported:
+                raise TypeError(f"進捗付きのFFmpeg実行では使えない引数です: {', '.join(unsupported)}")
+        if threads:
+            cmd = self.with_threads(cmd)
+        try:
+            with self.slot(cancel_token=cancel_token):
+                started = time.monotonic()
+                media_seconds = None
+                try:
+                    if with_progress:
+                        result, media_seconds, _ = run_with_progress(
+                            cmd, duration, on_progress, check=kwargs.get("check", False),
+                            cancel_token=cancel_token, text=kwargs.get("text", False)
+                        )
+                    else:
+                        result = subprocess.run(cmd, **kwargs)
+                except Exception:
+                    with self._lock:
+                        self.failed += 1
+                    raise
+                elapsed = time.monotonic() - started
+        except CancelledError:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        with self._lock:
+            self.completed += 1
+            if media_seconds:
+                self._encodes.append((media_seconds, elapsed))
+        return result
+
+    def with_threads(self, cmd: List[str]) -> List[str]:
+        """出力パスの直前に -threads を挿入（指定済みならそのまま）"""
+        if "-threads" in cmd or len(cmd) < 2:
+            return list(cmd)
+        return list(cmd[:-1]) + ["-threads", str(self.threads_per_process)] + list(cmd[-1:])
+
+    @contextmanager
+    def slot(self, owner: Optional[str] = None, cancel_token: Optional[CancellationToken] = None):
+        """実行枠を1つ確保するコンテキストマネージャー"""
+        self.acquire(owner, cancel_token)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, owner: Optional[str] = None, cancel_token: Optional[CancellationToken] = None) -> float:
+        """実行枠を確保（空くまで待つ）。待った秒数を返す
+
+        cancel_token がキャンセルされたら待ち行列から抜けて CancelledError を送出する。
+        """
+        owner = _current_owner.get() if owner is None else owner
+        check_cancelled(cancel_token)
+        with self._lock:
+            if self._running < self.max_processes and not self._rotation:
+                self._running += 1
+                self._wait_times.append(0.0)
+                return 0.0
+            ticket = _Ticket(owner)
+            if owner not in self._queues:
+                self._queues[owner] = deque()
+                self._rotation.append(owner)
+            self._queues[owner].append(ticket)
+
+        while not ticket.event.wait(0.5):
+            if cancel_token is not None and cancel_token.cancelled:
+                self._abandon(ticket)
+                raise CancelledError()
+        waited = time.monotonic() - ticket.enqueued_at
+        with self._lock:
+            self._wait_times.append(waited)
+            self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def release(self) -> None:
+        """実行枠を返す（待っている人がいれば次のユーザーに引き渡す）"""
+        with self._lock:
+            ticket = self._next_ticket()
+            if ticket is None:
+                self._running -= 1
+                return
+        # 枠はそのまま引き渡すので _running は変えない
+        ticket.event.set()
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        """待ち行列から抜ける（すでに枠を引き渡されていたら返す）"""
+        with self._lock:
+            queue = self._queues.get(ticket.owner)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.owner]
+                    self._rotation.remove(ticket.owner)
+                return
+        self.release()
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        if not self._rotation:
+            return None
+        owner = self._rotation.popleft()
+        queue = self._queues[owner]
+        ticket = queue.popleft()
+        if queue:
+            self._rotation.append(owner)
+        else:
+            del self._queues[owner]
+        return ticket
+
+    # --- 監視 ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            waiting = {owner: len(queue) for owner, queue in self._queues.items()}
+            oldest = max(
+                (now - queue[0].enqueued_at for queue in self._queues.values() if queue),
+                default=0.0
+            )
+            wait_times = list(self._wait_times)
+            media_total = sum(media for media, _ in self._encodes)
+            encode_total = sum(elapsed for _, elapsed in self._encodes)
+            return {
+                "max_processes": self.max_processes,
+                "threads_per_process": self.threads_per_process,
+                "running": self._running,
+                "queued": sum(waiting.values()),
+                "queued_by_owner": waiting,
+                "oldest_wait_seconds": round(oldest, 2),
+                "avg_wait_seconds": round(sum(wait_times) / len(wait_times), 2) if wait_times else 0.0,
+                "max_wait_seconds": round(self.max_wait, 2),
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                # 直近のエンコードの処理速度（再生時間 / 所要時間、実時間に対する倍率）
+                "recent_encodes": len(self._encodes),
+                "encode_speed": round(media_total / encode_total, 2) if encode_total else 0.0,
+                "encoded_media_seconds": round(media_total, 1),
+            }
+
+
+_shared_scheduler: Optional[FFmpegScheduler] = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_ffmpeg_scheduler() -> FFmpegScheduler:
+    """プロセス全体で共有するFFmpegスケジューラーを取得
+
+    同時実行数は環境変数 FFMPEG_MAX_PROCESSES、プロセスあたりのスレッド数は
+    FFMPEG_THREADS で指定できる（未指定ならCPUコア数から決める）。
+    """
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            max_processes = os.environ.get("FFMPEG_MAX_PROCESSES")
+            threads = os.environ.get("FFMPEG_THREADS")
+            _shared_scheduler = FFmpegScheduler(
+                max_processes=int(max_processes) if max_processes else None,
+                threads_per_process=int(threads) if threads else None
+            )
+        return _shared_scheduler
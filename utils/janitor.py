@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Set
+
+# このアプリが作る一時ファイル・ディレクトリの接頭辞（後片付けの対象を見分ける）
+TEMP_PREFIX = "reeditor_"
+
+_active_paths: Set[str] = set()
+_active_lock = threading.Lock()
+
+
+def make_temp_dir(kind: str = "work") -> str:
+    """作業用の一時ディレクトリを作成（使い終わったら remove_temp_dir で削除）"""
+    path = tempfile.mkdtemp(prefix=f"{TEMP_PREFIX}{kind}_")
+    with _active_lock:
+        _active_paths.add(path)
+    return path
+
+
+def remove_temp_dir(path: str) -> None:
+    """一時ディレクトリを削除"""
+    shutil.rmtree(path, ignore_errors=True)
+    with _active_lock:
+        _active_paths.discard(path)
+
+
+def _size_of(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def cleanup_orphans(max_age_seconds: float = 3600, temp_root: Optional[str] = None) -> tuple:
+    """作成から max_age_seconds 以上たった一時ファイル・ディレクトリを削除
+
+    このプロセスで使用中のものは残す。途中で落ちたプロセスや例外で
+    削除されなかった作業ディレクトリ・アップロードを回収する。
+
+    Returns:
+        tuple: (削除した件数, 削除したバイト数)
+    """
+    temp_root = temp_root or tempfile.gettempdir()
+    cutoff = time.time() - max_age_seconds
+    with _active_lock:
+        active = set(_active_paths)
+
+    removed = 0
+    removed_bytes = 0
+    try:
+        names = os.listdir(temp_root)
+    except OSError:
+        return (0, 0)
+    for name in names:
+        if not name.startswith(TEMP_PREFIX):
+            continue
+        path = os.path.join(temp_root, name)
+        if path in active:
+            continue
+        try:
+            if os.path.getmtime(path) > cutoff:
+                continue
+            size = _size_of(path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except OSError:
+            continue
+        removed += 1
+        removed_bytes += size
+    if removed:
+        print(f"一時ファイルを回収: {removed}件, {removed_bytes / 1024 / 1024:.1f} MB")
+    return (removed, removed_bytes)
+
+
+class TempJanitor:
+    """起動時と一定間隔で放置された一時ファイルを回収するバックグラウンドスレッド"""
+
+    def __init__(self, interval_seconds: float = 600, max_age_seconds: float = 3600):
+        self.interval_seconds = interval_seconds
+        self.max_age_seconds = max_age_seconds
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.removed = 0
+        self.removed_bytes = 0
+
+    def run_once(self) -> tuple:
+        removed, removed_bytes = cleanup_orphans(self.max_age_seconds)
+        self.removed += removed
+        self.removed_bytes += removed_bytes
+        return (removed, removed_bytes)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="temp-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"一時ファイルの回収に失敗: {e}")
+            if self._stopped.wait(self.interval_seconds):
+                break
+
+
+_shared_janitor: Optional[TempJanitor] = None
+_shared_janitor_lock = threading.Lock()
+
+
+def get_temp_janitor() -> TempJanitor:
+    """プロセス全体で共有する一時ファイル回収スレッドを取得（初回呼び出しで開始）
+
+    回収対象になるまでの時間は環境変数 REEDITOR_TEMP_MAX_AGE（秒）で指定できる。
+    """
+    global _shared_janitor
+    with _shared_janitor_lock:
+        if _shared_janitor is None:
+            _shared_janitor = TempJanitor(max_age_seconds=float(os.environ.get("REEDITOR_TEMP_MAX_AGE", "3600")))
+            _shared_janitor.start()
+        return _shared_janitor
@@ -0,0 +1,510 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from utils.artifact_store import link_or_copy
+from utils.cancellation import CancellationToken, CancelledError
+from utils.ffmpeg_scheduler import owner_context
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+INTERRUPTED = "interrupted"  # 実行中にプロセスが終了した
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, INTERRUPTED, CANCELLED)
+
+JOB_FILE = "job.json"
+
+
+def _default_jobs_dir() -> str:
+    """ジョブ保存先の既定パス（環境変数 REEDITOR_JOBS_DIR で上書き可能）"""
+    path = os.environ.get("REEDITOR_JOBS_DIR")
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), "tiktok_reeditor", "jobs")
+
+
+class JobContext:
+    """ジョブ関数に渡される実行コンテキスト（作業ディレクトリ・進捗報告・キャンセル）"""
+
+    def __init__(self, manager: "JobManager", job_id: str, job_dir: str, owner: str = ""):
+        self.manager = manager
+        self.job_id = job_id
+        self.job_dir = job_dir
+        self.owner = owner
+        # 生成処理・FFmpeg・Gladiaのポーリングに渡す
+        self.cancel_token = CancellationToken()
+
+    def path(self, name: str) -> str:
+        """ジョブディレクトリ内のファイルパス"""
+        return os.path.join(self.job_dir, name)
+
+    def report(self, progress: float, message: str = "") -> None:
+        """進捗（0.0〜1.0）とメッセージを記録（キャンセル済みなら CancelledError）"""
+        self.cancel_token.raise_if_cancelled()
+        self.manager._update(self.job_id, progress=max(0.0, min(1.0, progress)), message=message)
+
+
+class JobManager:
+    """動画生成・文字起こしなどの重い処理を実行するバックグラウンドジョブ管理
+
+    - 上限付きのワーカープールで実行し、Streamlitのスクリプトスレッドを塞がない
+    - 状態と結果は <jobs_dir>/<job_id>/job.json と同じディレクトリのファイルに保存し、
+      ページの再読み込みや再接続の後もジョブIDから状態・結果を取得できる
+    - プロセス再起動時に実行中だったジョブは interrupted として記録する
+    - cancel() で実行中のFFmpegを止めて中断できる。画面からの進捗確認（touch）が
+      abandon_seconds 以上途絶えたジョブは放置されたとみなしてキャンセルする
+    """
+
+    def __init__(
+        self,
+        jobs_dir: Optional[str] = None,
+        max_workers: int = 2,
+        max_jobs_per_owner: int = 2,
+        retention_seconds: float = 24 * 3600,
+        abandon_seconds: float = 900
+    ):
+        self.jobs_dir = jobs_dir or _default_jobs_dir()
+        self.max_workers = max_workers
+        self.max_jobs_per_owner = max_jobs_per_owner
+        self.retention_seconds = retention_seconds
+        self.abandon_seconds = abandon_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._last_saved: Dict[str, float] = {}
+        self._contexts: Dict[str, JobContext] = {}  # 実行中・待機中のジョブ
+        self._last_seen: Dict[str, float] = {}
+        self._monitor: Optional[threading.Thread] = None
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._recover()
+
+    # --- 投入 ---
+
+    def create_job(self, kind: str, owner: str = "", params: Optional[dict] = None) -> JobContext:
+        """ジョブを作成して作業ディレクトリを用意する（入力ファイルを置いてから start する）"""
+        with self._lock:
+            active = [
+                job for job in self._jobs.values()
+                if job["owner"] == owner and job["status"] in (QUEUED, RUNNING)
+            ]
+            if owner and len(active) >= self.max_jobs_per_owner:
+                raise RuntimeError(f"実行中のジョブが多すぎます（最大{self.max_jobs_per_owner}件）。完了を待ってから再実行してください")
+
+            job_id = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "owner": owner,
+                "params": params or {},
+                "status": QUEUED,
+                "progress": 0.0,
+                "message": "待機中...",
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            context = JobContext(self, job_id, job_dir, owner)
+            self._contexts[job_id] = context
+            self._last_seen[job_id] = time.monotonic()
+        self._save(job_id, force=True)
+        return context
+
+    def start(self, context: JobContext, func: Callable, *args, **kwargs) -> str:
+        """ジョブ関数 func(context, *args, **kwargs) をワーカープールで実行
+
+        関数の戻り値（JSONに変換できる辞書）がジョブの結果になる。
+        """
+        self._executor.submit(self._run, context, func, args, kwargs)
+        self._ensure_monitor()
+        self._cleanup_old_jobs()
+        return context.job_id
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """ジョブをキャンセル（実行中のFFmpegは終了させる）。キャンセルできたらTrue
+
+        owner を指定した場合、そのユーザーのジョブでなければキャンセルしない。
+        """
+        if owner is not None and self.get(job_id, owner=owner) is None:
+            return False
+        with self._lock:
+            context = self._contexts.get(job_id)
+        if context is None:
+            return False
+        context.cancel_token.cancel()
+        self._update(job_id, message="キャンセル中...", force=True)
+        return True
+
+    def touch(self, job_id: str) -> None:
+        """画面がジョブの進捗を確認したことを記録（放置判定に使う）"""
+        with self._lock:
+            if job_id in self._contexts:
+                self._last_seen[job_id] = time.monotonic()
+
+    def _run(self, context: JobContext, func: Callable, args, kwargs) -> None:
+        job_id = context.job_id
+        try:
+            context.cancel_token.raise_if_cancelled()
+            self._update(job_id, status=RUNNING, started_at=time.time(), message="実行中...", force=True)
+            # ジョブ内のFFmpegはオーナー単位で公平に順番待ちする
+            with owner_context(self._jobs[job_id]["owner"]):
+                result = func(context, *args, **kwargs)
+        except CancelledError:
+            self._update(
+                job_id,
+                status=CANCELLED,
+                message="キャンセルしました",
+                finished_at=time.time(),
+                force=True
+            )
+            self._forget(job_id)
+            return
+        except Exception as e:
+            print(f"ジョブ {job_id} 失敗: {e}")
+            self._update(
+                job_id,
+                status=FAILED,
+                error=f"{type(e).__name__}: {e}",
+                traceback=traceback.format_exc(),
+                finished_at=time.time(),
+                force=True
+            )
+            self._forget(job_id)
+            return
+        self._update(
+            job_id,
+            status=SUCCEEDED,
+            progress=1.0,
+            message="完了",
+            result=result,
+            finished_at=time.time(),
+            force=True
+        )
+        self._forget(job_id)
+
+    def _forget(self, job_id: str) -> None:
+        with self._lock:
+            self._contexts.pop(job_id, None)
+            self._last_seen.pop(job_id, None)
+
+    def _ensure_monitor(self) -> None:
+        if self._monitor and self._monitor.is_alive():
+            return
+        self._monitor = threading.Thread(target=self._monitor_loop, name="job-monitor", daemon=True)
+        self._monitor.start()
+
+    def _monitor_loop(self) -> None:
+        while True:
+            time.sleep(30)
+            try:
+                self.cancel_abandoned()
+                self._cleanup_old_jobs()
+            except Exception as e:
+                print(f"ジョブ監視エラー: {e}")
+
+    def cancel_abandoned(self) -> List[str]:
+        """画面からの確認が abandon_seconds 以上ないジョブをキャンセル"""
+        if not self.abandon_seconds:
+            return []
+        cutoff = time.monotonic() - self.abandon_seconds
+        with self._lock:
+            # キャンセル済み（終了待ち）のジョブは監視のたびに数え直さない
+            abandoned = [
+                job_id for job_id, seen in self._last_seen.items()
+                if seen < cutoff and job_id in self._contexts and not self._contexts[job_id].cancel_token.cancelled
+            ]
+        for job_id in abandoned:
+            self.cancel(job_id)
+        if abandoned:
+            print(f"放置されたジョブをキャンセル: {len(abandoned)}件")
+        return abandoned
+
+    # --- 参照 ---
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[dict]:
+        """ジョブの状態を取得（メモリになければディスクから読み込む）
+
+        owner を指定した場合、そのユーザーのジョブでなければ None を返す
+        （URLのジョブIDを知っているだけの他のユーザーには見せない）。
+        """
+        if not job_id:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job = dict(job)
+        if job is None:
+            job = self._load(job_id)
+            if job is not None:
+                with self._lock:
+                    self._jobs.setdefault(job_id, job)
+        if job is not None and owner is not None and job.get("owner") != owner:
+            return None
+        return job
+
+    def list_jobs(self, owner: Optional[str] = None) -> List[dict]:
+        """ジョブ一覧（新しい順）"""
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if owner is None or job["owner"] == owner]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def file_path(self, job_id: str, name: str, owner: Optional[str] = None) -> Optional[str]:
+        """ジョブディレクトリ内の結果ファイルのパス（存在しない・owner のジョブでなければNone）"""
+        if owner is not None and self.get(job_id, owner=owner) is None:
+            return None
+        path = os.path.join(self.jobs_dir, os.path.basename(job_id), os.path.basename(name))
+        return path if os.path.isfile(path) else None
+
+    def read_file(self, job_id: str, name: str, owner: Optional[str] = None) -> Optional[bytes]:
+        path = self.file_path(job_id, name, owner=owner)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "cancelled": statuses.count(CANCELLED),
+            "max_workers": self.max_workers,
+        }
+
+    # --- 永続化 ---
+
+    def _update(self, job_id: str, force: bool = False, **changes) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(changes)
+        self._save(job_id, force=force)
+
+    def _save(self, job_id: str, force: bool = False) -> None:
+        """job.json を書き出す（進捗のみの更新は0.5秒に1回まで）"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_saved.get(job_id, 0.0) < 0.5:
+                return
+            self._last_saved[job_id] = now
+            job = dict(self._jobs[job_id])
+        path = os.path.join(self.jobs_dir, job_id, JOB_FILE)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"ジョブ状態の保存に失敗: {e}")
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        path = os.path.join(self.jobs_dir, os.path.basename(job_id), JOB_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _recover(self) -> None:
+        """前回のプロセスで実行中のまま残ったジョブを interrupted にする"""
+        for job_id in os.listdir(self.jobs_dir):
+            job = self._load(job_id)
+            if job is None:
+                continue
+            if job.get("status") in (QUEUED, RUNNING):
+                job["status"] = INTERRUPTED
+                job["error"] = "サーバーの再起動により中断されました"
+                job["finished_at"] = time.time()
+            self._jobs[job_id] = job
+            self._save(job_id, force=True)
+        self._cleanup_old_jobs()
+
+    def _cleanup_old_jobs(self) -> None:
+        """保持期間を過ぎた完了済みジョブを削除"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATES and (job.get("finished_at") or job["created_at"]) < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._last_saved.pop(job_id, None)
+        for job_id in expired:
+            shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+
+
+def run_transcription_job(context: JobContext, gladia, audio_path: str, gemini=None,
+                          stages=("filename", "metadata"), language: str = "ja") -> dict:
+    """文字起こし（Gladia、単語タイムスタンプ付き）＋ Geminiでの整形をまとめて実行"""
+    context.report(0.1, "音声を文字起こし中（Gladia API）...")
+    result = gladia.transcribe_from_file_with_timestamps(
+        audio_path, language=language, cancel_token=context.cancel_token
+    )
+    if not result or not result.get("segments"):
+        raise RuntimeError("文字起こしに失敗しました")
+
+    segments = result["segments"]
+    words = result.get("words", [])
+    output = {"segments": segments, "words": words}
+    context.report(0.4, f"文字起こし完了: {len(segments)} セグメント, {len(words)} 単語")
+
+    if gemini is not None:
+        context.report(0.5, "テキストを整形中（Gemini API）...")
+        raw_text = ' '.join([seg['text'] for seg in segments])
+        output["gemini"] = gemini.process_transcript(raw_text, stages=stages)
+    return output
+
+
+def run_video_transcription_job(context: JobContext, gladia, gemini, video_path: str,
+                                stages=("filename",), language: str = "ja") -> dict:
+    """動画をGladiaで文字起こしし、Geminiで整形・ファイル名を生成
+
+    ひらがな・SNS文は画面のボタンで必要なときだけ生成する（使わない呼び出しでクォータを消費しない）。
+    必要なら stages に "hiragana" / "metadata" を渡す。
+    Geminiのエラーは失敗にせず gemini_error として返す（文字起こし結果をそのまま使えるように）。
+    """
+    context.report(0.1, "ファイルをアップロード中（Gladia API）...")
+    audio_url = gladia.upload_file(video_path, cancel_token=context.cancel_token)
+    if not audio_url:
+        raise RuntimeError("ファイルアップロードに失敗しました（APIキーの有効期限切れ、ファイルサイズ制限、ネットワークエラー）")
+
+    context.report(0.3, "文字起こし中（Gladia API）...")
+    transcribed = gladia.transcribe(audio_url, language=language, cancel_token=context.cancel_token)
+    if not transcribed:
+        raise RuntimeError("文字起こしに失敗しました")
+
+    context.report(0.6, f"文字起こし完了: {len(transcribed)}文字 / テキストを整形中（Gemini API）...")
+    output = {"transcribed": transcribed, "gemini": {}, "gemini_error": None}
+    try:
+        output["gemini"] = gemini.process_transcript(transcribed, stages=stages)
+    except Exception as e:
+        output["gemini_error"] = f"{type(e).__name__}: {e}"
+    return output
+
+
+def _job_video_files(context: JobContext, video_main: str, video_preview: Optional[str]) -> Dict[str, str]:
+    """生成した動画をジョブディレクトリに置き、{種類: ファイル名} を返す
+
+    ジョブディレクトリの外（プロジェクト）にある動画はハードリンクで置き、読み込み・コピーはしない。
+    """
+    files = {}
+    for kind, path in (("video_main", video_main), ("video_preview", video_preview)):
+        if path is None:
+            continue
+        name = os.path.basename(path)
+        if os.path.abspath(path) != os.path.abspath(context.path(name)):
+            link_or_copy(path, context.path(name))
+        files[kind] = name
+    return files
+
+
+def _progress_callback(context: JobContext, start: float, end: float):
+    """動画生成の progress_callback(current, total, message) をジョブの進捗に変換"""
+    def update_progress(current, total, message):
+        context.report(start + (end - start) * current / max(total, 1), message)
+    return update_progress
+
+
+def run_render_job(context: JobContext, video_generator, audio_path: str, segments: list,
+                   width: int = 1080, height: int = 1920, transparent: bool = True) -> dict:
+    """タイムスタンプ付きセグメントから動画を生成し、ジョブディレクトリに保存"""
+    video_main, video_preview = video_generator.create_video_from_timestamped_segments(
+        audio_path=audio_path,
+        segments=segments,
+        width=width,
+        height=height,
+        transparent=transparent,
+        progress_callback=_progress_callback(context, 0.05, 0.95),
+        cancel_token=context.cancel_token,
+        output_dir=context.job_dir
+    )
+    return {"files": _job_video_files(context, video_main, video_preview)}
+
+
+def run_project_render_job(context: JobContext, video_generator, project_id: str) -> dict:
+    """プロジェクトから動画を生成（同じ入力なら生成済みの動画を再利用）"""
+    from utils.project import load_project
+
+    # ジョブを投入したユーザーのプロジェクトだけを対象にする
+    project = load_project(project_id, owner=context.owner)
+    if project is None:
+        raise RuntimeError(f"プロジェクトが見つかりません: {project_id}")
+    video_main, video_preview = video_generator.create_video_from_project(
+        project,
+        progress_callback=_progress_callback(context, 0.05, 0.95),
+        cancel_token=context.cancel_token
+    )
+    return {
+        "files": _job_video_files(context, video_main, video_preview),
+        "project_id": project_id
+    }
+
+
+def run_transcribe_render_job(context: JobContext, gladia, video_generator, audio_path: str,
+                              lines: List[str], language: str = "ja") -> dict:
+    """音声の単語タイムスタンプを取得して各行に割り当て、動画を生成"""
+    from utils.alignment import align_lines_dp
+
+    context.report(0.1, "文字起こし中（タイムスタンプ取得）...")
+    result = gladia.transcribe_from_file_with_timestamps(
+        audio_path, language=language, cancel_token=context.cancel_token
+    )
+    if result is None:
+        raise RuntimeError("タイムスタンプの取得に失敗しました（音声アップロードまたは文字起こしエラー）")
+    if not result.get("words"):
+        raise RuntimeError("タイムスタンプの取得に失敗しました（単語データが空です）")
+
+    segments = align_lines_dp(lines, result["words"])
+    low_confidence = [i + 1 for i, seg in enumerate(segments) if seg["confidence"] < 0.5]
+    context.report(0.4, f"タイムスタンプ取得完了: {len(segments)}行")
+
+    video_main, video_preview = video_generator.create_video_from_timestamped_segments(
+        audio_path=audio_path,
+        segments=segments,
+        width=1080,
+        height=1920,
+        transparent=True,
+        progress_callback=_progress_callback(context, 0.4, 0.95),
+        cancel_token=context.cancel_token,
+        output_dir=context.job_dir
+    )
+    return {
+        "files": _job_video_files(context, video_main, video_preview),
+        "low_confidence": low_confidence
+    }
+
+
+_shared_manager: Optional[JobManager] = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """プロセス全体で共有するジョブマネージャーを取得
+
+    同時実行数は環境変数 REEDITOR_JOB_WORKERS、放置とみなすまでの秒数は
+    REEDITOR_JOB_ABANDON_SECONDS（0で無効）で指定できる。
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = JobManager(
+                max_workers=int(os.environ.get("REEDITOR_JOB_WORKERS", "2")),
+                abandon_seconds=float(os.environ.get("REEDITOR_JOB_ABANDON_SECONDS", "900"))
+            )
+        return _shared_manager
@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+# レート制限を示す語（"rate" だけだと "generateContent" などにも一致するので使わない）
+_RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "quota", "rate limit", "too many requests")
+
+
+def classify_error(error: Optional[Exception]) -> str:
+    """例外をレート制限・モデル未対応・その他に分類"""
+    if error is None:
+        return "empty"
+    lowered = str(error).lower()
+    # 404 のメッセージにも "generateContent" が含まれるので、先にモデル未対応を判定する
+    if "404" in lowered or "not found" in lowered:
+        return "not_found"
+    if any(marker in lowered for marker in _RATE_LIMIT_MARKERS):
+        return "rate_limit"
+    return "error"
+
+
+class _ModelHealth:
+    """1モデル分の統計とサーキット状態"""
+
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)  # True=成功, False=失敗
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.last_error = ""
+        # メソッドごとのレイテンシ（指数移動平均、秒）
+        self.latency: Dict[str, float] = {}
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class ModelRouter:
+    """Geminiモデルのサーキットブレーカー + レイテンシ順ルーティング
+
+    - 連続失敗・高エラー率のモデルはクールダウン中サーキットを開き、候補の後ろに回す
+    - 429（レート制限）は即座にサーキットを開く
+    - 健全なモデルはメソッドごとの平均レイテンシが速い順（未計測なら優先順）に並べる
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        error_rate_threshold: float = 0.5,
+        cooldown_seconds: float = 60.0,
+        rate_limit_cooldown_seconds: float = 60.0,
+        not_found_cooldown_seconds: float = 3600.0,
+        latency_alpha: float = 0.3,
+        window: int = 20
+    ):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.rate_limit_cooldown_seconds = rate_limit_cooldown_seconds
+        self.not_found_cooldown_seconds = not_found_cooldown_seconds
+        self.latency_alpha = latency_alpha
+        self.window = window
+        self._models: Dict[str, _ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def _health(self, model_name: str) -> _ModelHealth:
+        health = self._models.get(model_name)
+        if health is None:
+            health = _ModelHealth(self.window)
+            self._models[model_name] = health
+        return health
+
+    def order(self, candidates: List[str], method: str = "") -> List[str]:
+        """候補モデルを試す順に並べ替える（サーキットが開いたモデルは最後、再開が早い順）"""
+        now = time.monotonic()
+        with self._lock:
+            def sort_key(item):
+                index, model_name = item
+                health = self._models.get(model_name)
+                if health is None:
+                    return (0, 0.0, float("inf"), index)
+                if health.open_until > now:
+                    return (1, health.open_until, float("inf"), index)
+                latency = health.latency.get(method, float("inf"))
+                return (0, 0.0, latency, index)
+
+            return [model_name for _, model_name in sorted(enumerate(candidates), key=sort_key)]
+
+    def record_success(self, model_name: str, latency: float, method: str = "") -> None:
+        """成功とレイテンシを記録（サーキットを閉じる）"""
+        with self._lock:
+            health = self._health(model_name)
+            health.requests += 1
+            health.outcomes.append(True)
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            previous = health.latency.get(method)
+            if previous is None:
+                health.latency[method] = latency
+            else:
+                health.latency[method] = previous + self.latency_alpha * (latency - previous)
+
+    def record_failure(self, model_name: str, error: Optional[Exception] = None) -> str:
+        """失敗を記録し、必要ならサーキットを開く
+
+        Returns:
+            エラー種別（"rate_limit", "not_found", "error", "empty"）
+        """
+        kind = classify_error(error)
+        now = time.monotonic()
+        with self._lock:
+            health = self._health(model_name)
+            health.requests += 1
+            health.failures += 1
+            health.outcomes.append(False)
+            health.consecutive_failures += 1
+            health.last_error = str(error)[:200] if error else "empty response"
+
+            cooldown = 0.0
+            if kind == "rate_limit":
+                health.rate_limited += 1
+                cooldown = self.rate_limit_cooldown_seconds
+            elif kind == "not_found":
+                cooldown = self.not_found_cooldown_seconds
+            elif health.consecutive_failures >= self.failure_threshold:
+                cooldown = self.cooldown_seconds
+            elif len(health.outcomes) >= 5 and health.error_rate() >= self.error_rate_threshold:
+                cooldown = self.cooldown_seconds
+
+            if cooldown:
+                health.open_until = max(health.open_until, now + cooldown)
+                print(f"モデル {model_name} のサーキットを {cooldown:.0f}秒 開きます ({kind})")
+        return kind
+
+    def snapshot(self) -> Dict[str, dict]:
+        """監視用に全モデルの状態を返す"""
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for model_name, health in self._models.items():
+                remaining = max(0.0, health.open_until - now)
+                result[model_name] = {
+                    "state": "open" if remaining > 0 else "closed",
+                    "open_remaining_seconds": round(remaining, 1),
+                    "requests": health.requests,
+                    "failures": health.failures,
+                    "rate_limited": health.rate_limited,
+                    "error_rate": round(health.error_rate(), 3),
+                    "latency_ms": {method or "-": round(value * 1000) for method, value in health.latency.items()},
+                    "last_error": health.last_error,
+                }
+            return result
+
+    def reset(self) -> None:
+        """統計を全て破棄"""
+        with self._lock:
+            self._models.clear()
+
+
+_shared_routers: Dict[str, ModelRouter] = {}
+_shared_router_lock = threading.Lock()
+
+
+def api_key_id(api_key: str) -> str:
+    """APIキーを識別する短いID（キーそのものは保持・表示しない）"""
+    if not api_key:
+        return "-"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def get_model_router(api_key: str = "") -> ModelRouter:
+    """APIキーごとに共有するモデルルーターを取得
+
+    クォータや429はAPIキー単位なので、遮断状態・統計もキーごとに分ける
+    （あるユーザーのキーが上限に達しても他のユーザーのキーは遮断しない）。
+    """
+    key_id = api_key_id(api_key)
+    with _shared_router_lock:
+        router = _shared_routers.get(key_id)
+        if router is None:
+            router = ModelRouter()
+            _shared_routers[key_id] = router
+        return router
+
+
+def list_model_routers() -> Dict[str, ModelRouter]:
+    """APIキーのIDごとのモデルルーター（管理画面の表示用）"""
+    with _shared_router_lock:
+        return dict(_shared_routers)
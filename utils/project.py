@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from utils.artifact_store import link_or_copy
+
+PROJECT_VERSION = 1
+MANIFEST_NAME = "project.json"
+
+# 処理の段階（この順に進む）
+STAGES = ("transcribe", "format", "align", "render")
+
+
+def _default_projects_dir() -> str:
+    """プロジェクト保存先の既定パス（環境変数 REEDITOR_PROJECTS_DIR で上書き可能）"""
+    path = os.environ.get("REEDITOR_PROJECTS_DIR")
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), "tiktok_reeditor", "projects")
+
+
+def _owner_dir(projects_dir: str, owner: str) -> str:
+    """オーナーごとの保存先（IDをそのままパスに使わないようハッシュにする）"""
+    owner_key = hashlib.sha256(owner.encode("utf-8")).hexdigest()[:16] if owner else "_shared"
+    return os.path.join(projects_dir, owner_key)
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: str, data: dict) -> None:
+    """一時ファイルに書いてから置き換え（書き込み途中で落ちても壊れない）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Project:
+    """文字起こし結果・編集テキスト・タイミング・描画設定・生成物をまとめたプロジェクト
+
+    ディレクトリ構成（<owner> はオーナーIDのハッシュ）:
+        <projects_dir>/<owner>/<project_id>/project.json   マニフェスト
+        <projects_dir>/<owner>/<project_id>/audio.<ext>    元音声
+        <projects_dir>/<owner>/<project_id>/artifacts/     生成済み動画など
+
+    完了した段階（STAGES）を記録しておき、再読み込みやワーカー再起動の後も
+    文字起こし・整形・動画生成をやり直さずに続きから再開できるようにする。
+    """
+
+    def __init__(self, project_dir: str, project_id: str, name: str = "", owner: str = ""):
+        self.project_dir = project_dir
+        self.project_id = project_id
+        self.name = name or project_id
+        self.owner = owner
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.text = ""
+        self.words: List[Dict] = []
+        self.transcript_segments: List[Dict] = []
+        self.segments: List[Dict] = []
+        self.audio: Dict = {}
+        self.render: Dict = {"width": 1080, "height": 1920, "fps": 30, "transparent": True}
+        self.stages: Dict[str, float] = {}
+        self.artifacts: Dict[str, Dict] = {}
+        self.metadata: Dict = {}
+
+    # --- 音声 ---
+
+    def set_audio(self, src_path: str, filename: str) -> None:
+        """元音声のファイルをプロジェクトに置き（ハードリンクかコピー）、ハッシュを記録"""
+        ext = os.path.splitext(filename)[1].lower() or ".wav"
+        stored_name = f"audio{ext}"
+        path = os.path.join(self.project_dir, stored_name)
+        link_or_copy(src_path, path)
+        sha256 = _sha256_file(path)
+        if self.audio.get("sha256") != sha256:
+            # 音声が変わったら以降の段階はすべて無効
+            self.stages.clear()
+            self.artifacts.clear()
+        self.audio = {"filename": filename, "path": stored_name, "sha256": sha256, "size": os.path.getsize(path)}
+
+    @property
+    def audio_path(self) -> Optional[str]:
+        if not self.audio.get("path"):
+            return None
+        path = os.path.join(self.project_dir, self.audio["path"])
+        return path if os.path.exists(path) else None
+
+    def read_audio(self) -> Optional[bytes]:
+        path = self.audio_path
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    # --- 段階 ---
+
+    def mark_stage(self, stage: str) -> None:
+        """段階を完了として記録"""
+        if stage not in STAGES:
+            raise ValueError(f"不明な段階: {stage}")
+        self.stages[stage] = time.time()
+
+    def invalidate_from(self, stage: str) -> None:
+        """指定した段階以降の完了記録を取り消す"""
+        for later in STAGES[STAGES.index(stage):]:
+            self.stages.pop(later, None)
+
+    def is_stage_done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def set_text(self, text: str) -> None:
+        """編集テキストを更新（変わった場合はタイミングと動画を無効化）"""
+        if text != self.text:
+            self.text = text
+            self.invalidate_from("align")
+
+    def set_segments(self, segments: List[Dict]) -> None:
+        """行ごとのタイミングを保存"""
+        segments = [
+            {key: seg[key] for key in ("start", "end", "text", "confidence") if key in seg}
+            for seg in segments
+        ]
+        if segments != self.segments:
+            self.segments = segments
+            self.invalidate_from("render")
+        self.mark_stage("align")
+
+    # --- 生成物 ---
+
+    def render_signature(self) -> str:
+        """動画の入力（音声・タイミング・描画設定）から生成物の署名を作る"""
+        payload = json.dumps({
+            "audio": self.audio.get("sha256"),
+            "segments": [(seg["start"], seg["end"], seg["text"]) for seg in self.segments],
+            "render": self.render,
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def add_artifact(self, name: str, src_path: str, signature: Optional[str] = None) -> str:
+        """生成物のファイルをプロジェクトに移して登録（内容はメモリに読み込まない）
+
+        src_path が既に artifacts/<name><拡張子> ならそのまま登録する。
+        """
+        artifacts_dir = os.path.join(self.project_dir, "artifacts")
+        os.makedirs(artifacts_dir, exist_ok=True)
+        stored_name = f"{name}{os.path.splitext(src_path)[1].lower()}"
+        dest_path = os.path.join(artifacts_dir, stored_name)
+        if os.path.abspath(src_path) != os.path.abspath(dest_path):
+            shutil.move(src_path, dest_path)
+        self.artifacts[name] = {
+            "path": os.path.join("artifacts", stored_name),
+            "signature": signature,
+            "size": os.path.getsize(dest_path),
+            "created_at": time.time(),
+        }
+        return dest_path
+
+    def artifact_path(self, name: str, signature: Optional[str] = None) -> Optional[str]:
+        """登録済みの生成物のパス（署名が一致しない・ファイルがない場合はNone）"""
+        entry = self.artifacts.get(name)
+        if not entry:
+            return None
+        if signature is not None and entry.get("signature") != signature:
+            return None
+        path = os.path.join(self.project_dir, entry["path"])
+        return path if os.path.exists(path) else None
+
+    # --- 保存 ---
+
+    def to_manifest(self) -> dict:
+        return {
+            "version": PROJECT_VERSION,
+            "project_id": self.project_id,
+            "name": self.name,
+            "owner": self.owner,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "text": self.text,
+            "words": self.words,
+            "transcript_segments": self.transcript_segments,
+            "segments": self.segments,
+            "audio": self.audio,
+            "render": self.render,
+            "stages": self.stages,
+            "artifacts": self.artifacts,
+            "metadata": self.metadata,
+        }
+
+    def save(self) -> str:
+        """マニフェストを書き出してパスを返す"""
+        os.makedirs(self.project_dir, exist_ok=True)
+        self.updated_at = time.time()
+        path = os.path.join(self.project_dir, MANIFEST_NAME)
+        _write_json_atomic(path, self.to_manifest())
+        return path
+
+    @classmethod
+    def from_manifest(cls, project_dir: str, manifest: dict) -> "Project":
+        project = cls(project_dir, manifest["project_id"], manifest.get("name", ""), manifest.get("owner", ""))
+        project.created_at = manifest.get("created_at", project.created_at)
+        project.updated_at = manifest.get("updated_at", project.updated_at)
+        project.text = manifest.get("text", "")
+        project.words = manifest.get("words", [])
+        project.transcript_segments = manifest.get("transcript_segments", [])
+        project.segments = manifest.get("segments", [])
+        project.audio = manifest.get("audio", {})
+        project.render.update(manifest.get("render", {}))
+        project.stages = manifest.get("stages", {})
+        project.artifacts = manifest.get("artifacts", {})
+        project.metadata = manifest.get("metadata", {})
+        return project
+
+
+def create_project(name: str = "", projects_dir: Optional[str] = None, owner: str = "") -> Project:
+    """owner のプロジェクトを新しく作成（まだ保存はしない）"""
+    projects_dir = _owner_dir(projects_dir or _default_projects_dir(), owner)
+    safe_name = re.sub(r'[\\/:*?"<>|\s]+', "_", name).strip("_")[:40]
+    project_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    if safe_name:
+        project_id = f"{project_id}_{safe_name}"
+    project_dir = os.path.join(projects_dir, project_id)
+    os.makedirs(project_dir, exist_ok=True)
+    return Project(project_dir, project_id, name, owner)
+
+
+def load_project(project_id_or_path: str, projects_dir: Optional[str] = None,
+                 owner: Optional[str] = None) -> Optional[Project]:
+    """プロジェクトIDまたはディレクトリ／マニフェストのパスから読み込む
+
+    owner を指定した場合、IDはそのオーナーの保存先から探し、
+    マニフェストのオーナーが一致しなければ None を返す（他のユーザーのプロジェクトは開けない）。
+    owner=None はパスを直接指定するツール用で、オーナーを確認しない。
+    """
+    if os.path.isdir(project_id_or_path) or project_id_or_path.endswith(".json"):
+        project_dir = project_id_or_path
+    else:
+        base_dir = projects_dir or _default_projects_dir()
+        if owner is not None:
+            base_dir = _owner_dir(base_dir, owner)
+        project_dir = os.path.join(base_dir, os.path.basename(project_id_or_path))
+    if project_dir.endswith(".json"):
+        manifest_path = project_dir
+        project_dir = os.path.dirname(project_dir)
+    else:
+        manifest_path = os.path.join(project_dir, MANIFEST_NAME)
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"プロジェクト読み込みエラー: {e}")
+        return None
+
+    if manifest.get("version", 0) > PROJECT_VERSION:
+        print(f"未対応のプロジェクト形式です: version={manifest.get('version')}")
+        return None
+    if owner is not None and manifest.get("owner", "") != owner:
+        print(f"他のユーザーのプロジェクトは読み込めません: {manifest.get('project_id')}")
+        return None
+    return Project.from_manifest(project_dir, manifest)
+
+
+def list_projects(owner: str, projects_dir: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """owner の保存済みプロジェクトの概要を更新日時の新しい順に返す"""
+    projects_dir = _owner_dir(projects_dir or _default_projects_dir(), owner)
+    if not os.path.isdir(projects_dir):
+        return []
+
+    summaries = []
+    for entry in os.listdir(projects_dir):
+        manifest_path = os.path.join(projects_dir, entry, MANIFEST_NAME)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifest.get("owner", "") != owner:
+            continue
+        summaries.append({
+            "project_id": manifest.get("project_id", entry),
+            "name": manifest.get("name", entry),
+            "updated_at": manifest.get("updated_at", 0),
+            "stages": list(manifest.get("stages", {}).keys()),
+            "lines": len([line for line in manifest.get("text", "").split("\n") if line.strip()]),
+        })
+
+    summaries.sort(key=lambda s: s["updated_at"], reverse=True)
+    return summaries[:limit]
+
+
+def verify_audio(project: Project) -> bool:
+    """保存済み音声がマニフェストのハッシュと一致するか確認"""
+    path = project.audio_path
+    if not path:
+        return False
+    return _sha256_file(path) == project.audio.get("sha256")
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+
+def _default_cache_path() -> str:
+    """キャッシュDBの既定パス（環境変数 GEMINI_CACHE_PATH で上書き可能）"""
+    path = os.environ.get("GEMINI_CACHE_PATH")
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), "tiktok_reeditor", "gemini_cache.sqlite3")
+
+
+class ResponseCache:
+    """Geminiレスポンスの永続キャッシュ（SQLite、TTL + LRU）
+
+    キーは (メソッド名, モデル名, プロンプトのSHA-256)。
+    同じ入力に対する「再変換」やSNS文の再生成をAPIを呼ばずに返す。
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 2000):
+        self.path = path or _default_cache_path()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(method: str, model: str, prompt: str) -> str:
+        """(メソッド, モデル, プロンプトハッシュ) からキャッシュキーを作成"""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{method}:{model}:{prompt_hash}"
+
+    def get(self, method: str, model: str, prompt: str, count_miss: bool = True) -> Optional[str]:
+        """キャッシュ済みレスポンスを取得（期限切れ・未登録はNone）"""
+        key = self.make_key(method, model, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def get_any(self, method: str, models: List[str], prompt: str) -> Optional[Tuple[str, str]]:
+        """いずれかのモデルのキャッシュ済みレスポンスを取得
+
+        Returns:
+            (モデル名, レスポンス) または None
+        """
+        for model in models:
+            response = self.get(method, model, prompt, count_miss=False)
+            if response is not None:
+                return model, response
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, method: str, model: str, prompt: str, response: str) -> None:
+        """レスポンスを保存し、上限を超えたら最終アクセスが古い順に削除"""
+        key = self.make_key(method, model, prompt)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, method, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, method, model, response, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """期限切れエントリとLRU上限超過分を削除（ロック取得済みで呼ぶ）"""
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self) -> None:
+        """全エントリを削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """ヒット率などの統計を返す"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,348 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.janitor import make_temp_dir, remove_temp_dir
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """オブジェクトのおおよそのメモリ使用量（バイト）
+
+    bytes・文字列・リスト・辞書を再帰的に数える。正確な値ではなく、
+    どのセッションのどのデータが大きいかを比べるための目安。
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, io.BytesIO):  # アップロードされたファイル（UploadedFile）など
+        # getbuffer() は元の bytes との共有をやめてコピーを作るので使わない
+        size = getattr(value, "size", None)
+        return size if isinstance(size, int) else len(value.getvalue())
+    size = sys.getsizeof(value)
+    if _depth > 8:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key, _depth + 1) + estimate_size(item, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    elif hasattr(value, "__dict__") and not isinstance(value, type):
+        size += estimate_size(vars(value), _depth + 1)
+    return size
+
+
+class _Entry:
+    """1件のデータ（メモリ上か、ディスクに退避済み）"""
+
+    def __init__(self, value: Any, size: int):
+        self.value = value
+        self.size = size
+        self.path: Optional[str] = None  # 退避先（None ならメモリ上）
+        self.kind = "bytes" if isinstance(value, (bytes, bytearray)) else "json"
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+
+class _DerivedCache:
+    """保存データから作った作業用オブジェクト（AlignmentState など）の LRU キャッシュ
+
+    プロセス全体で max_entries 件までメモリに残し、あふれたものは次に使うときに
+    元のデータから作り直す。元の _Entry が入れ替わったもの（put し直した値）は使わない。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple[str, str], Tuple[_Entry, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key: Tuple[str, str], source: "_Entry") -> Any:
+        with self._lock:
+            item = self._items.get(cache_key)
+            if item is None or item[0] is not source:
+                return None
+            self._items.move_to_end(cache_key)
+            return item[1]
+
+    def put(self, cache_key: Tuple[str, str], source: "_Entry", value: Any) -> None:
+        with self._lock:
+            self._items[cache_key] = (source, value)
+            self._items.move_to_end(cache_key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def discard(self, session_id: str, key: Optional[str] = None) -> None:
+        with self._lock:
+            for cache_key in [k for k in self._items if k[0] == session_id and (key is None or k[1] == key)]:
+                del self._items[cache_key]
+
+
+# 作業用オブジェクトをメモリに残しておく件数（環境変数 REEDITOR_SESSION_DERIVED_CACHE）
+_derived_cache = _DerivedCache(int(os.environ.get("REEDITOR_SESSION_DERIVED_CACHE", "8")))
+
+
+class SessionArtifacts:
+    """1セッション分の大きなデータ（音声・単語リストなど）を管理
+
+    メモリ上の合計が budget_bytes を超えたら、大きいものから順にディスクへ退避し、
+    get() のたびにディスクから読み直す。session_state に直接入れるとセッションが
+    続く限りメモリに残り続けるため、大きなデータはここを通して保持する。
+    """
+
+    def __init__(self, session_id: str, budget_bytes: int, label: str = ""):
+        self.session_id = session_id
+        self.budget_bytes = budget_bytes
+        self.label = label
+        self.last_access = time.time()
+        self.state_bytes = 0  # session_state のその他の値の推定サイズ（record_state で更新）
+        self._entries: Dict[str, _Entry] = {}
+        self._spill_dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    # --- 読み書き ---
+
+    def put(self, key: str, value: Any) -> None:
+        """値を保存（None なら削除）"""
+        if value is None:
+            self.pop(key)
+            return
+        with self._lock:
+            self.last_access = time.time()
+            self._discard(key)
+            self._entries[key] = _Entry(value, estimate_size(value))
+            self._enforce_budget()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            self.last_access = time.time()
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if not entry.spilled:
+                return entry.value
+            path, kind = entry.path, entry.kind
+        try:
+            if kind == "bytes":
+                with open(path, "rb") as f:
+                    return f.read()
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except OSError as e:
+            print(f"退避データの読み込みエラー ({key}): {e}")
+            return default
+
+    def derived(self, key: str, build: Callable[[Any], Any]) -> Any:
+        """key の値から build(value) で作ったオブジェクトを返す（key がなければ None）
+
+        作ったオブジェクトは小さな LRU キャッシュに置くので、編集のたびに退避済みの
+        値を読み直したり session_state に複製を持たせたりしない。key を put し直すと作り直す。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        cache_key = (self.session_id, key)
+        value = _derived_cache.get(cache_key, entry)
+        if value is None:
+            source = self.get(key)
+            if source is None:
+                return None
+            value = build(source)
+            _derived_cache.put(cache_key, entry, value)
+        return value
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            _derived_cache.discard(self.session_id)
+            if self._spill_dir:
+                remove_temp_dir(self._spill_dir)
+                self._spill_dir = None
+
+    def record_state(self, state_bytes: int, label: Optional[str] = None) -> None:
+        """session_state に残っているその他の値のサイズを記録（管理画面の表示用）"""
+        self.state_bytes = state_bytes
+        self.last_access = time.time()
+        if label:
+            self.label = label
+
+    # --- 集計 ---
+
+    def usage(self) -> dict:
+        with self._lock:
+            memory = sum(entry.size for entry in self._entries.values() if not entry.spilled)
+            spilled = sum(entry.size for entry in self._entries.values() if entry.spilled)
+            return {
+                "session_id": self.session_id,
+                "label": self.label,
+                "memory_bytes": memory,
+                "spilled_bytes": spilled,
+                "state_bytes": self.state_bytes,
+                "entries": len(self._entries),
+                "last_access": self.last_access,
+            }
+
+    # --- 内部処理（ロック取得済みで呼ぶ） ---
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _derived_cache.discard(self.session_id, key)
+        if entry.spilled:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def _enforce_budget(self) -> None:
+        memory = sum(entry.size for entry in self._entries.values() if not entry.spilled)
+        candidates = sorted(
+            ((key, entry) for key, entry in self._entries.items() if not entry.spilled),
+            key=lambda item: item[1].size,
+            reverse=True
+        )
+        for key, entry in candidates:
+            if memory <= self.budget_bytes:
+                break
+            if self._spill(key, entry):
+                memory -= entry.size
+
+    def _spill(self, key: str, entry: _Entry) -> bool:
+        """ディスクへ退避（JSONにできない値はメモリに残す）"""
+        if self._spill_dir is None:
+            self._spill_dir = make_temp_dir("session")
+        path = os.path.join(self._spill_dir, f"{key}.{'bin' if entry.kind == 'bytes' else 'json'}")
+        try:
+            if entry.kind == "bytes":
+                with open(path, "wb") as f:
+                    f.write(entry.value)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(entry.value, f, ensure_ascii=False)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"セッションデータを退避できません ({key}): {e}")
+            return False
+        entry.path = path
+        entry.value = None
+        return True
+
+
+class SessionArtifactRegistry:
+    """プロセス内の全セッションの SessionArtifacts を管理
+
+    終了したセッション（is_active が False のまま猶予時間を過ぎたもの）と、
+    idle_seconds 以上アクセスのないセッションのデータは cleanup() で破棄する。
+    """
+
+    def __init__(self, budget_bytes: int = 16 * 1024 * 1024, idle_seconds: float = 12 * 3600,
+                 disconnect_grace_seconds: float = 600, cleanup_interval: float = 60):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.disconnect_grace_seconds = disconnect_grace_seconds
+        self.cleanup_interval = cleanup_interval
+        self._sessions: Dict[str, SessionArtifacts] = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def get(self, session_id: str, label: str = "") -> SessionArtifacts:
+        with self._lock:
+            artifacts = self._sessions.get(session_id)
+            if artifacts is None:
+                artifacts = SessionArtifacts(session_id, self.budget_bytes, label)
+                self._sessions[session_id] = artifacts
+            return artifacts
+
+    def cleanup(self, is_active: Optional[Callable[[str], bool]] = None, force: bool = False) -> int:
+        """終了・放置されたセッションのデータを破棄し、破棄したセッション数を返す"""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < self.cleanup_interval:
+                return 0
+            self._last_cleanup = now
+            sessions = list(self._sessions.items())
+
+        expired = []
+        for session_id, artifacts in sessions:
+            idle = now - artifacts.last_access
+            if idle > self.idle_seconds:
+                expired.append(session_id)
+            elif is_active is not None and idle > self.disconnect_grace_seconds:
+                try:
+                    if not is_active(session_id):
+                        expired.append(session_id)
+                except Exception:
+                    pass
+
+        for session_id in expired:
+            with self._lock:
+                artifacts = self._sessions.pop(session_id, None)
+            if artifacts is not None:
+                artifacts.clear()
+        if expired:
+            print(f"終了したセッションのデータを破棄: {len(expired)}件")
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        usages = sorted(
+            (artifacts.usage() for artifacts in sessions),
+            key=lambda usage: usage["memory_bytes"] + usage["state_bytes"],
+            reverse=True
+        )
+        return {
+            "sessions": usages,
+            "session_count": len(usages),
+            "memory_bytes": sum(usage["memory_bytes"] for usage in usages),
+            "spilled_bytes": sum(usage["spilled_bytes"] for usage in usages),
+            "state_bytes": sum(usage["state_bytes"] for usage in usages),
+            "budget_bytes": self.budget_bytes,
+            "process_rss_bytes": process_rss_bytes(),
+        }
+
+
+def process_rss_bytes() -> Optional[int]:
+    """このプロセスの現在の常駐メモリ（取得できない環境では None）"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+_shared_registry: Optional[SessionArtifactRegistry] = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_session_registry() -> SessionArtifactRegistry:
+    """プロセス全体で共有するセッションデータのレジストリを取得
+
+    1セッションあたりのメモリ上限は環境変数 REEDITOR_SESSION_BUDGET_MB、
+    アクセスがないセッションを破棄するまでの秒数は REEDITOR_SESSION_IDLE_SECONDS で指定できる。
+    """
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = SessionArtifactRegistry(
+                budget_bytes=int(float(os.environ.get("REEDITOR_SESSION_BUDGET_MB", "16")) * 1024 * 1024),
+                idle_seconds=float(os.environ.get("REEDITOR_SESSION_IDLE_SECONDS", str(12 * 3600)))
+            )
+        return _shared_registry
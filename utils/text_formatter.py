@@ -1,10 +1,314 @@
-from google import genai
-from typing import Optional
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from utils.model_router import ModelRouter, get_model_router
+from utils.response_cache import ResponseCache
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> ResponseCache:
+    """プロセス全体で共有するレスポンスキャッシュを取得"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
+
+
+# 文の区切り（句点・感嘆符・疑問符の連続、または空白）
+_SENTENCE_PATTERN = re.compile(r'.*?(?:[。！？!?]+|\s+|$)', re.DOTALL)
+# 整形で追加・削除されてよい文字（句読点と空白）
+_FORMAT_IGNORED_CHARS = re.compile(r'[、。，．,.！？!?\s　]')
+
+
+def split_into_chunks(text: str, max_chars: int = 300) -> List[str]:
+    """
+    テキストを文の境界で分割し、max_chars以下のチャンクにまとめる
+    1文がmax_charsを超える場合はその文だけで1チャンクにする
+    """
+    sentences = [m.group(0) for m in _SENTENCE_PATTERN.finditer(text) if m.group(0)]
+
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) > max_chars:
+            chunks.append(current.strip())
+            current = ""
+        current += sentence
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def preserves_content(original: str, formatted: str) -> bool:
+    """句読点・空白・改行を除いた文字列が一致するか（内容が変わっていないか）を検証"""
+    return _FORMAT_IGNORED_CHARS.sub('', original) == _FORMAT_IGNORED_CHARS.sub('', formatted)
+
+
+# ========================================
+# ローカル改行エンジン（14文字/行、行末は句読点）
+# ========================================
+MAX_LINE_CHARS = 14
+# 行末に置ける句読点
+LINE_END_PUNCTUATION = ('。', '、', '！', '？', '!', '?')
+# 文末の記号
+_SENTENCE_END_CHARS = '。！？!?'
+# 行頭に来てはいけない文字（小書き文字・長音・閉じ括弧など）
+_NO_LINE_START_CHARS = set('ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶー～〜」』）)】〕、。，．,.！？!?')
+# 行末に来てはいけない文字（開き括弧）
+_NO_LINE_END_CHARS = set('「『（(【〔')
+# 直後で改行しやすい助詞
+_PARTICLES = ('について', 'によって', 'に対して', 'に関して', 'として', 'から', 'まで', 'より', 'ので', 'けど', 'には', 'では', 'とは', 'は', 'が', 'を', 'に', 'で', 'と', 'も', 'へ', 'や', 'の')
+# 直前で改行しない語（「に|ついて」のような複合助詞の途中）
+_NO_BREAK_BEFORE = ('ついて', 'よって', '対して', '関して', 'とって', 'おいて')
+# 漢字の語に付く接頭語（「お|知らせ」「ご|案内」の間では改行しない）
+_PREFIX_CHARS = set('おご')
+# 空白区切り（Gladiaのセグメント境界など）で文末とみなす語尾
+_SENTENCE_END_SUFFIXES = ('です', 'ます', 'でした', 'ました', 'ません', 'ください', 'でしょう', 'よね', 'ですね', 'ますね', 'ですよ', 'ますよ', 'た', 'だ', 'よ', 'ね', 'か')
+
+
+def _char_class(char: str) -> str:
+    """改行位置判定用の文字種"""
+    code = ord(char)
+    if 0x3040 <= code <= 0x309F:
+        return 'hiragana'
+    if 0x30A0 <= code <= 0x30FF or 0xFF66 <= code <= 0xFF9F:
+        return 'katakana'
+    if 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or char in '々〆ヶ':
+        return 'kanji'
+    if char.isdigit():
+        return 'digit'
+    if char.isascii() and char.isalpha() or 0xFF21 <= code <= 0xFF5A:
+        return 'latin'
+    return 'other'
+
+
+def _break_score(text: str, pos: int) -> int:
+    """text[pos-1] と text[pos] の間で改行する場合の良さ（-1は改行禁止）"""
+    before, after = text[pos - 1], text[pos]
+    if after in _NO_LINE_START_CHARS or before in _NO_LINE_END_CHARS:
+        return -1
+    before_class, after_class = _char_class(before), _char_class(after)
+    if before_class == after_class and before_class in ('digit', 'latin'):
+        return -1
+    if before in _PREFIX_CHARS and after_class == 'kanji':
+        return -1
+    if text[pos:].startswith(_NO_BREAK_BEFORE):
+        return 0
+    if after in _PREFIX_CHARS and pos + 1 < len(text) and _char_class(text[pos + 1]) == 'kanji' \
+            and before_class != 'kanji':
+        # 接頭語の前は語の境界
+        return 1
+    if before_class == 'hiragana':
+        # 漢字・カタカナ語の直後の助詞（「奴は」「職場の」）の後が最も自然
+        for particle in _PARTICLES:
+            if text[:pos].endswith(particle) and pos > len(particle) and \
+                    _char_class(text[pos - len(particle) - 1]) in ('kanji', 'katakana', 'latin', 'digit'):
+                return 2 if particle == 'の' else 3
+        if after_class != 'hiragana':
+            return 2
+    if before_class != after_class and before_class != 'kanji':
+        return 1
+    return 0
+
+
+def _inside_word(body: str, pos: int) -> bool:
+    """語の途中か（漢字と送り仮名の間、同じ文字種の連続の中）"""
+    before_class, after_class = _char_class(body[pos - 1]), _char_class(body[pos])
+    return before_class == after_class or (before_class == 'kanji' and after_class == 'hiragana')
+
+
+def _fallback_score(body: str, pos: int) -> int:
+    """語の途中でしか改行できないときの良さ（かなの中の助詞の後 > かなの中 > 漢字語の中）"""
+    if _char_class(body[pos - 1]) != 'hiragana':
+        return 0
+    if _char_class(body[pos]) == 'hiragana' and body[:pos].endswith(_PARTICLES):
+        # 「の|で」「か|ら」のように長い助詞の途中なら助詞の後とはみなさない
+        inside_particle = any(
+            body[pos - k:pos - k + len(particle)] == particle
+            for particle in _PARTICLES if len(particle) > 1
+            for k in range(1, len(particle))
+        )
+        return 1 if inside_particle else 2
+    return 1
+
+
+def _split_clause(body: str, limit: int) -> List[str]:
+    """句読点のない1まとまりをlimit文字以内の断片に分割（助詞の後・文字種の境界を優先）
+
+    語の途中（「知|らせ」「大|切」「アプ|リ」など）では改行せず、
+    1行に収まらない長い語のようにそうした位置しかない場合に限り、
+    _fallback_score の高い位置で改行する。
+    """
+    pieces = []
+    start = 0
+    while len(body) - start > limit:
+        best_pos, best_score = None, -1
+        fallback_pos, fallback_score = None, -1
+        for pos in range(start + 1, start + limit + 1):
+            score = _break_score(body, pos)
+            if score < 0:
+                continue
+            # 残りが極端に短くなる位置は避ける
+            penalty = 2 if 0 < len(body) - pos < 3 else 0
+            if score == 0 and _inside_word(body, pos):
+                score = _fallback_score(body, pos) - penalty
+                if score >= fallback_score and score >= 0:
+                    fallback_pos, fallback_score = pos, score
+                continue
+            score -= penalty
+            if score >= best_score and score >= 0:
+                best_pos, best_score = pos, score
+        if best_pos is None:
+            best_pos = fallback_pos if fallback_pos is not None else start + limit
+        pieces.append(body[start:best_pos])
+        start = best_pos
+    if start < len(body):
+        pieces.append(body[start:])
+    return pieces
+
+
+def _split_clauses(line: str) -> List[tuple]:
+    """1行を (本文, 区切り記号) のまとまりに分割。区切りが空白や行末の場合は記号None"""
+    clauses = []
+    for match in re.finditer(r'([^、。，,！？!?\s　]*)([、。，,！？!?]+|[\s　]+|$)', line):
+        body, mark = match.group(1), match.group(2)
+        if not body and not mark.strip(' 　'):
+            continue
+        if not mark.strip():
+            mark = None
+        elif mark[0] in '，,':
+            mark = '、'
+        if not body:
+            # 連続した記号は直前のまとまりにまとめる
+            if clauses and mark:
+                clauses[-1] = (clauses[-1][0], clauses[-1][1] or mark)
+            continue
+        clauses.append((body, mark))
+    return clauses
+
+
+def _is_line_valid(line: str, max_chars: int) -> bool:
+    return len(line) <= max_chars and line.endswith(LINE_END_PUNCTUATION)
+
+
+def break_lines(text: str, max_chars: int = MAX_LINE_CHARS) -> str:
+    """
+    ローカルで日本語テキストを改行整形（Gemini不要・即時）
+    - 1行max_chars文字以内（句読点を含む）
+    - 各行は句点（。）または読点（、）で終わる（文の途中は「、」、文末は「。」を追加）
+    - 既存の句読点・改行を尊重し、条件を満たす行はそのまま残す
+    - 長いまとまりは助詞の後や文字種の境界で改行
+    内容の文字は変更せず、句読点と改行のみを追加する
+    """
+    output_lines = []
+    source_lines = [line.strip() for line in text.strip().split('\n')]
+    source_lines = [line for line in source_lines if line]
+
+    for line_idx, source_line in enumerate(source_lines):
+        if _is_line_valid(source_line, max_chars):
+            output_lines.append(source_line)
+            continue
+
+        is_last_line = line_idx == len(source_lines) - 1
+        clauses = _split_clauses(source_line)
+        current = ""
+        for clause_idx, (body, mark) in enumerate(clauses):
+            is_last_clause = is_last_line and clause_idx == len(clauses) - 1
+            if mark is None:
+                if is_last_clause or body.endswith(_SENTENCE_END_SUFFIXES):
+                    mark = '。'
+                else:
+                    mark = '、'
+
+            pieces = _split_clause(body, max_chars - 1)
+            for piece_idx, piece in enumerate(pieces):
+                piece_mark = mark if piece_idx == len(pieces) - 1 else '、'
+                segment = piece + piece_mark
+                # 同じ文の中の短いまとまりは1行にまとめる
+                if current and not current.endswith(tuple(_SENTENCE_END_CHARS)) and len(current) + len(segment) <= max_chars:
+                    current += segment
+                    continue
+                if current:
+                    output_lines.append(current)
+                current = segment
+        if current:
+            output_lines.append(current)
+
+    return '\n'.join(output_lines)
+
+
+def validate_formatted_text(text: str, max_chars: int = MAX_LINE_CHARS) -> List[str]:
+    """
+    整形ルール（1行max_chars文字以内、行末は句読点）を検証
+
+    Returns:
+        問題点のリスト（空なら整形済み）
+    """
+    problems = []
+    lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
+    if not lines:
+        return ["テキストが空です"]
+    for i, line in enumerate(lines):
+        if len(line) > max_chars:
+            problems.append(f"{i + 1}行目が{len(line)}文字です（{max_chars}文字以内）")
+        if not line.endswith(LINE_END_PUNCTUATION):
+            problems.append(f"{i + 1}行目が句読点で終わっていません")
+    return problems
+
+
+def needs_formatting(text: str, max_chars: int = MAX_LINE_CHARS) -> bool:
+    """Geminiでの整形が必要か（既にルールを満たしていればFalse）"""
+    return bool(validate_formatted_text(text, max_chars))
+
+
+class _CachedResponse:
+    """キャッシュから返すレスポンス（generate_contentの戻り値と同じくtext属性を持つ）"""
+
+    def __init__(self, text: str):
+        self.text = text
 
 
 class GeminiFormatter:
-    def __init__(self, api_key: str):
+    # 整形済みテキストだけに依存する派生ステージ（互いに独立なので並列実行できる）
+    DERIVED_STAGES = ("filename", "hiragana", "metadata")
+
+    # 整形モード
+    #   auto:   ルールを満たさない場合のみGeminiで整形（失敗時はローカル改行エンジン）
+    #   local:  ローカル改行エンジンのみ（即時・API不使用）
+    #   gemini: 常にGeminiで整形（失敗時はローカル改行エンジン）
+    FORMAT_MODES = ("auto", "local", "gemini")
+
+    # この文字数を超える入力は分割して並列整形する
+    CHUNK_THRESHOLD = 600
+    CHUNK_SIZE = 300
+    MAX_PARALLEL_CHUNKS = 4
+
+    def __init__(
+        self,
+        api_key: str,
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+        router: Optional[ModelRouter] = None,
+        format_mode: Optional[str] = None
+    ):
+        # google-genai は読み込みに時間がかかるので、APIキーが設定されて初めて使うときに import する
+        from google import genai
+
         self.client = genai.Client(api_key=api_key)
+        # 同一プロンプトの結果を再利用（Noneならキャッシュ無効）
+        self.cache = (cache or get_shared_cache()) if use_cache else None
+        # モデルの健全性・レイテンシを同じAPIキーを使う全セッションで共有
+        self.router = router or get_model_router(api_key)
+        self.format_mode = format_mode or os.environ.get("TEXT_FORMAT_MODE", "auto")
+        if self.format_mode not in self.FORMAT_MODES:
+            raise ValueError(f"未対応の整形モード: {self.format_mode}")
         # 2026年2月時点の無料モデル（優先順）
         self.models_to_try = [
             'gemini-2.5-flash',
@@ -15,11 +319,134 @@ class GeminiFormatter:
         self.default_model = 'gemini-2.5-flash'
         print(f"Gemini Client初期化成功")
 
-    def format_text(self, text: str) -> Optional[str]:
+    def _generate_content(self, method: str, model_name: str, prompt: str, use_cache: bool = True):
+        """キャッシュを確認してからgenerate_contentを呼び出す（use_cache=Falseなら再取得して上書き）"""
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(method, model_name, prompt)
+            if cached is not None:
+                print(f"キャッシュヒット ({method}, {model_name})")
+                return _CachedResponse(cached)
+
+        response = self.client.models.generate_content(
+            model=model_name,
+            contents=prompt
+        )
+
+        text = getattr(response, 'text', None)
+        if self.cache is not None and text:
+            self.cache.set(method, model_name, prompt, text)
+        return response
+
+    def _generate_routed(self, method: str, prompt: str, use_cache: bool = True):
+        """
+        ルーターが選んだ順（健全で速い順）にモデルを試し、最初に成功したレスポンスを返す
+        全モデルが例外で失敗した場合は最後の例外を送出
+        """
+        candidates = self.router.order(self.models_to_try, method)
+
+        if self.cache is not None and use_cache:
+            cached = self.cache.get_any(method, candidates, prompt)
+            if cached is not None:
+                model_name, text = cached
+                print(f"キャッシュヒット ({method}, {model_name})")
+                return _CachedResponse(text)
+
+        last_error = None
+        for model_name in candidates:
+            started = time.monotonic()
+            try:
+                response = self._generate_content(method, model_name, prompt, use_cache=False)
+            except Exception as e:
+                kind = self.router.record_failure(model_name, e)
+                print(f"モデル {model_name} 失敗 ({kind}): {e} - 次のモデルを試します")
+                last_error = e
+                continue
+
+            if getattr(response, 'text', None):
+                self.router.record_success(model_name, time.monotonic() - started, method)
+                return response
+
+            self.router.record_failure(model_name, None)
+            print(f"レスポンスにtextがありません ({model_name})")
+
+        if last_error is not None:
+            raise last_error
+        return None
+
+    def format_text(self, text: str, chunked: Optional[bool] = None, mode: Optional[str] = None) -> Optional[str]:
         """
         テキストを14文字/行に整形
         重要: 元の発言内容は1文字も変えず、句読点と改行のみを調整
+
+        Args:
+            text: 整形するテキスト
+            chunked: Trueなら文単位で分割して並列整形、Noneなら長さで自動判定
+            mode: 整形モード（"auto", "local", "gemini"）。Noneならインスタンスの設定
         """
+        mode = mode or self.format_mode
+        if mode not in self.FORMAT_MODES:
+            raise ValueError(f"未対応の整形モード: {mode}")
+
+        if mode == "local":
+            print(f"ローカル改行エンジンで整形 (テキスト長: {len(text)}文字)")
+            return break_lines(text) or None
+
+        if mode == "auto" and not needs_formatting(text):
+            print("整形ルールを満たしているためGemini呼び出しをスキップします")
+            return '\n'.join(line.strip() for line in text.strip().split('\n') if line.strip())
+
+        if chunked is None:
+            chunked = len(text) > self.CHUNK_THRESHOLD
+
+        result = None
+        if chunked:
+            result = self._format_chunked(text)
+            if not result:
+                print("分割整形に失敗 - 一括整形にフォールバックします")
+
+        if not result:
+            result = self._format_single(text)
+
+        if not result:
+            print("Gemini整形に失敗 - ローカル改行エンジンにフォールバックします")
+            return break_lines(text) or None
+
+        # Geminiの出力がルール違反の行だけローカルで修正
+        if needs_formatting(result):
+            repaired = break_lines(result)
+            if preserves_content(result, repaired):
+                result = repaired
+        return result
+
+    def _format_chunked(self, text: str) -> Optional[str]:
+        """文の境界で分割したチャンクを並列に整形し、内容が保たれているか検証して結合"""
+        chunks = split_into_chunks(text, self.CHUNK_SIZE)
+        if len(chunks) <= 1:
+            return None
+
+        print(f"分割整形: {len(chunks)}チャンク（テキスト長: {len(text)}文字）")
+        with ThreadPoolExecutor(max_workers=min(len(chunks), self.MAX_PARALLEL_CHUNKS)) as executor:
+            results = list(executor.map(self._format_single, chunks))
+
+        for i, (chunk, result) in enumerate(zip(chunks, results)):
+            if result and preserves_content(chunk, result):
+                continue
+            # 内容が変わった・失敗したチャンクはキャッシュを使わず1回だけ再整形
+            print(f"チャンク {i + 1}/{len(chunks)} の検証に失敗 - 再整形します")
+            result = self._format_single(chunk, use_cache=False)
+            if not result or not preserves_content(chunk, result):
+                print(f"チャンク {i + 1}/{len(chunks)} の再整形も検証に失敗しました")
+                return None
+            results[i] = result
+
+        combined = '\n'.join(result.strip() for result in results)
+        if not preserves_content(text, combined):
+            print("結合後のテキストが元の内容と一致しません")
+            return None
+        return combined
+
+    def _format_single(self, text: str, use_cache: bool = True) -> Optional[str]:
+        """テキスト全体を1回のプロンプトで整形"""
         prompt = f"""あなたは厳格な校正者です。以下のテキストを整形してください。
 
 【絶対厳守のルール】
@@ -57,34 +484,18 @@ class GeminiFormatter:
 全ての行が句点（。）または読点（、）で終わることを確認してください。
 """
 
-        # 複数モデルでリトライ
-        for model_name in self.models_to_try:
-            try:
-                print(f"Gemini APIリクエスト中... (モデル: {model_name}, テキスト長: {len(text)}文字)")
-                response = self.client.models.generate_content(
-                    model=model_name,
-                    contents=prompt
-                )
-
-                if hasattr(response, 'text') and response.text:
-                    result = response.text.strip()
-                    print(f"整形成功 ({model_name}): {len(result)}文字")
-                    return result
-                else:
-                    print(f"レスポンスにtextがありません ({model_name})")
-                    continue
+        # ルーターが選んだ順に複数モデルでリトライ
+        print(f"Gemini APIリクエスト中... (テキスト長: {len(text)}文字)")
+        try:
+            response = self._generate_routed("format_text", prompt, use_cache=use_cache)
+        except Exception as e:
+            print(f"全てのモデルで失敗しました: {e}")
+            return None
 
-            except Exception as e:
-                error_msg = str(e)
-                print(f"モデル {model_name} 失敗: {error_msg}")
-                if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-                    print("レート制限 - 次のモデルを試します")
-                    continue
-                elif "404" in error_msg or "not found" in error_msg.lower():
-                    print("モデル未対応 - 次のモデルを試します")
-                    continue
-                else:
-                    continue
+        if response is not None and response.text:
+            result = response.text.strip()
+            print(f"整形成功: {len(result)}文字")
+            return result
 
         print("全てのモデルで失敗しました")
         return None
@@ -114,10 +525,7 @@ class GeminiFormatter:
 
         try:
             print(f"Gemini APIでファイル名生成中...")
-            response = self.client.models.generate_content(
-                    model=self.default_model,
-                    contents=prompt
-                )
+            response = self._generate_routed("generate_filename", prompt)
             print(f"ファイル名生成レスポンス受信完了")
 
             if hasattr(response, 'text'):
@@ -185,10 +593,7 @@ class GeminiFormatter:
 
         try:
             print(f"Gemini APIでメタデータ生成中... (テキスト長: {len(text)}文字)")
-            response = self.client.models.generate_content(
-                    model=self.default_model,
-                    contents=prompt
-                )
+            response = self._generate_routed("generate_metadata", prompt)
             print(f"メタデータ生成レスポンス受信完了")
 
             if hasattr(response, 'text'):
@@ -284,10 +689,7 @@ class GeminiFormatter:
         try:
             nuance_desc = f"丁寧度={politeness}, 感情={emotion}, 話し方={style}"
             print(f"Gemini APIでニュアンス変更中... ({nuance_desc})")
-            response = self.client.models.generate_content(
-                    model=self.default_model,
-                    contents=prompt
-                )
+            response = self._generate_routed("rephrase_text", prompt)
             print(f"ニュアンス変更レスポンス受信完了")
 
             if hasattr(response, 'text'):
@@ -374,10 +776,7 @@ class GeminiFormatter:
 
         try:
             print(f"Gemini APIでひらがな変換中... (テキスト長: {len(text)}文字)")
-            response = self.client.models.generate_content(
-                    model=self.default_model,
-                    contents=prompt
-                )
+            response = self._generate_routed("convert_to_hiragana", prompt)
             print(f"ひらがな変換レスポンス受信完了")
 
             if hasattr(response, 'text'):
@@ -395,3 +794,60 @@ class GeminiFormatter:
             import traceback
             traceback.print_exc()
             return None
+
+    def process_transcript(self, text: str, stages: Iterable[str] = DERIVED_STAGES) -> Dict[str, Optional[str]]:
+        """
+        文字起こしテキストを整形し、派生ステージをまとめて実行
+        format_text → {generate_filename, convert_to_hiragana, generate_metadata}
+        のDAGとして、整形後の3処理は並列に実行する
+
+        Args:
+            text: 文字起こしテキスト
+            stages: 実行する派生ステージ（"filename", "hiragana", "metadata"）
+
+        Returns:
+            {"formatted": 整形済みテキスト, "filename": ..., "hiragana": ..., "metadata": ...}
+            整形に失敗した場合、派生ステージは実行せず全てNone
+        """
+        stages = tuple(stages)
+        formatted = self.format_text(text)
+        if not formatted:
+            results = {"formatted": None}
+            results.update({stage: None for stage in stages})
+            return results
+
+        results = {"formatted": formatted}
+        results.update(self.process_formatted_text(formatted, stages))
+        return results
+
+    def process_formatted_text(self, formatted_text: str, stages: Iterable[str] = DERIVED_STAGES) -> Dict[str, Optional[str]]:
+        """
+        整形済みテキストから派生ステージを並列に実行し、全結果をまとめて返す
+        待ち時間は最も遅い1呼び出し分になる
+
+        Returns:
+            {"filename": ..., "hiragana": ..., "metadata": ...}（失敗したステージはNone）
+        """
+        stage_funcs = {
+            "filename": self.generate_filename,
+            "hiragana": self.convert_to_hiragana,
+            "metadata": self.generate_metadata,
+        }
+        stages = tuple(stages)
+        unknown = [stage for stage in stages if stage not in stage_funcs]
+        if unknown:
+            raise ValueError(f"未対応のステージ: {unknown}")
+        if not stages:
+            return {}
+
+        print(f"Gemini APIで派生処理を並列実行中... ({', '.join(stages)})")
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+            futures = {stage: executor.submit(stage_funcs[stage], formatted_text) for stage in stages}
+            for stage, future in futures.items():
+                try:
+                    results[stage] = future.result()
+                except Exception as e:
+                    print(f"{stage} の生成エラー: {type(e).__name__}: {e}")
+                    results[stage] = None
+        return results
@@ -2,6 +2,8 @@ import requests
 import time
 from typing import Optional
 
+from utils.cancellation import check_cancelled
+
 
 class GladiaAPI:
     def __init__(self, api_key: str):
@@ -11,9 +13,20 @@ class GladiaAPI:
             "x-gladia-key": api_key,
             "Content-Type": "application/json"
         }
-
-    def upload_file(self, file_path: str) -> Optional[str]:
+        # 接続を再利用（アップロード・ポーリングのたびにTLSハンドシェイクしない）
+        self.session = requests.Session()
+
+    @staticmethod
+    def _wait(seconds: float, cancel_token=None) -> None:
+        """ポーリング間隔の待機（キャンセルされたらすぐに CancelledError）"""
+        if cancel_token is None:
+            time.sleep(seconds)
+        else:
+            cancel_token.wait(seconds)
+
+    def upload_file(self, file_path: str, cancel_token=None) -> Optional[str]:
         """動画ファイルをアップロードしてURLを取得"""
+        check_cancelled(cancel_token)
         try:
             import os
             import mimetypes
@@ -29,7 +42,7 @@ class GladiaAPI:
             with open(file_path, "rb") as f:
                 # ファイル名とMIMEタイプを明示的に指定
                 files = {"audio": (filename, f, mime_type)}
-                response = requests.post(
+                response = self.session.post(
                     f"{self.base_url}/upload",
                     headers={"x-gladia-key": self.api_key},
                     files=files
@@ -50,8 +63,9 @@ class GladiaAPI:
                 print(f"詳細: {response.text}")
             return None
 
-    def transcribe(self, audio_url: str, language: str = "ja") -> Optional[str]:
+    def transcribe(self, audio_url: str, language: str = "ja", cancel_token=None) -> Optional[str]:
         """音声ファイルを文字起こし"""
+        check_cancelled(cancel_token)
         try:
             # 文字起こしリクエストを送信
             payload = {
@@ -61,7 +75,7 @@ class GladiaAPI:
                 }
             }
 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/pre-recorded",
                 headers=self.headers,
                 json=payload
@@ -76,20 +90,21 @@ class GladiaAPI:
                 return None
 
             # 結果を取得（ポーリング）
-            return self._poll_result(result_id)
+            return self._poll_result(result_id, cancel_token=cancel_token)
 
         except Exception as e:
             print(f"文字起こしエラー: {e}")
             print(f"詳細: {response.text if 'response' in locals() else '不明'}")
             return None
 
-    def _poll_result(self, result_id: str, max_attempts: int = 60) -> Optional[str]:
+    def _poll_result(self, result_id: str, max_attempts: int = 60, cancel_token=None) -> Optional[str]:
         """文字起こし結果をポーリングして取得"""
         for attempt in range(max_attempts):
             try:
-                response = requests.get(
+                response = self.session.get(
                     f"{self.base_url}/pre-recorded/{result_id}",
-                    headers=self.headers
+                    headers=self.headers,
+                    timeout=30
                 )
                 response.raise_for_status()
                 result = response.json()
@@ -108,26 +123,26 @@ class GladiaAPI:
                     return None
 
                 # 処理中の場合は待機
-                time.sleep(3)
+                self._wait(3, cancel_token)
 
             except Exception as e:
                 print(f"結果取得エラー (リトライ {attempt + 1}/{max_attempts}): {e}")
                 if 'response' in locals():
                     print(f"詳細: {response.text}")
-                time.sleep(3)
+                self._wait(3, cancel_token)
                 continue
 
         print("タイムアウト: 文字起こしが完了しませんでした")
         return None
 
-    def transcribe_from_file(self, file_path: str, language: str = "ja") -> Optional[str]:
+    def transcribe_from_file(self, file_path: str, language: str = "ja", cancel_token=None) -> Optional[str]:
         """ファイルから直接文字起こし（便利メソッド）"""
-        audio_url = self.upload_file(file_path)
+        audio_url = self.upload_file(file_path, cancel_token=cancel_token)
         if audio_url:
-            return self.transcribe(audio_url, language)
+            return self.transcribe(audio_url, language, cancel_token=cancel_token)
         return None
 
-    def transcribe_with_timestamps(self, audio_url: str, language: str = "ja") -> Optional[dict]:
+    def transcribe_with_timestamps(self, audio_url: str, language: str = "ja", cancel_token=None) -> Optional[dict]:
         """音声ファイルを文字起こしし、タイムスタンプ付きセグメントと単語を返す
 
         Returns:
@@ -136,6 +151,7 @@ class GladiaAPI:
                 "words": [{"word": "...", "start": 0.0, "end": 0.3}, ...]
             }
         """
+        check_cancelled(cancel_token)
         try:
             payload = {
                 "audio_url": audio_url,
@@ -144,7 +160,7 @@ class GladiaAPI:
                 }
             }
 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/pre-recorded",
                 headers=self.headers,
                 json=payload
@@ -157,13 +173,13 @@ class GladiaAPI:
                 print(f"結果IDが取得できませんでした: {result}")
                 return None
 
-            return self._poll_result_with_timestamps(result_id)
+            return self._poll_result_with_timestamps(result_id, cancel_token=cancel_token)
 
         except Exception as e:
             print(f"文字起こしエラー: {e}")
             return None
 
-    def _poll_result_with_timestamps(self, result_id: str, max_attempts: int = 60) -> Optional[dict]:
+    def _poll_result_with_timestamps(self, result_id: str, max_attempts: int = 60, cancel_token=None) -> Optional[dict]:
         """タイムスタンプ付き文字起こし結果をポーリングして取得
 
         Returns:
@@ -174,9 +190,10 @@ class GladiaAPI:
         """
         for attempt in range(max_attempts):
             try:
-                response = requests.get(
+                response = self.session.get(
                     f"{self.base_url}/pre-recorded/{result_id}",
-                    headers=self.headers
+                    headers=self.headers,
+                    timeout=30
                 )
                 response.raise_for_status()
                 result = response.json()
@@ -223,17 +240,18 @@ class GladiaAPI:
                     print(f"文字起こしエラー: {error_msg}")
                     return None
 
-                time.sleep(3)
+                self._wait(3, cancel_token)
 
             except Exception as e:
                 print(f"結果取得エラー (リトライ {attempt + 1}/{max_attempts}): {e}")
-                time.sleep(3)
+                self._wait(3, cancel_token)
                 continue
 
         print("タイムアウト: 文字起こしが完了しませんでした")
         return None
 
-    def transcribe_from_file_with_timestamps(self, file_path: str, language: str = "ja") -> Optional[dict]:
+    def transcribe_from_file_with_timestamps(self, file_path: str, language: str = "ja",
+                                             cancel_token=None) -> Optional[dict]:
         """ファイルから直接タイムスタンプ付き文字起こし
 
         Returns:
@@ -242,7 +260,7 @@ class GladiaAPI:
                 "words": [{"word": "...", "start": 0.0, "end": 0.3}, ...]
             }
         """
-        audio_url = self.upload_file(file_path)
+        audio_url = self.upload_file(file_path, cancel_token=cancel_token)
         if audio_url:
-            return self.transcribe_with_timestamps(audio_url, language)
+            return self.transcribe_with_timestamps(audio_url, language, cancel_token=cancel_token)
         return None
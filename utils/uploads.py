@@ -0,0 +1,99 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from utils.janitor import TEMP_PREFIX
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SavedUpload:
+    """ディスクに保存したアップロードファイル
+
+    session_state にはこのオブジェクト（パスとハッシュだけ）を置き、
+    再実行のたびにアップロードを読み直さない。
+    """
+
+    def __init__(self, file_id: str, name: str, path: str, size: int, sha256: str):
+        self.file_id = file_id
+        self.name = name
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def ext(self) -> str:
+        """元のファイル名の拡張子（ドット付き、小文字）"""
+        return os.path.splitext(self.name)[1].lower()
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def touch(self) -> None:
+        """使用中であることを示す（一時ファイルの回収対象にならないよう更新日時を進める）"""
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+
+    def copy_to(self, dest_path: str) -> str:
+        """ジョブディレクトリなどへ配置（同じファイルシステムならハードリンク）"""
+        try:
+            os.link(self.path, dest_path)
+        except OSError:
+            shutil.copyfile(self.path, dest_path)
+        return dest_path
+
+    def remove(self) -> None:
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def save_upload(uploaded_file, previous: Optional[SavedUpload] = None,
+                chunk_size: int = CHUNK_SIZE) -> SavedUpload:
+    """Streamlit の UploadedFile を一時ファイルに保存し、SHA-256 を計算
+
+    アップロードのバッファを chunk_size ずつ書き出すので、getvalue() / read() のように
+    ファイル全体のコピーをもう1つメモリに作らない。previous が同じアップロード
+    （file_id が一致しファイルが残っている）ならそれをそのまま返す。
+    """
+    file_id = getattr(uploaded_file, "file_id", None) or uploaded_file.name
+    if previous is not None:
+        if previous.file_id == file_id and previous.exists():
+            previous.touch()
+            return previous
+        previous.remove()
+
+    ext = os.path.splitext(uploaded_file.name)[1].lower()
+    fd, path = tempfile.mkstemp(prefix=f"{TEMP_PREFIX}upload_", suffix=ext)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(uploaded_file, "getvalue"):
+                # UploadedFile は受信したバイト列を共有しているので getvalue() はコピーを作らない
+                # （getbuffer() だとバッファの複製が作られる）。そこから少しずつ切り出して書く
+                with memoryview(uploaded_file.getvalue()) as buffer:
+                    for offset in range(0, len(buffer), chunk_size):
+                        with buffer[offset:offset + chunk_size] as chunk:
+                            digest.update(chunk)
+                            f.write(chunk)
+                            size += len(chunk)
+            else:
+                uploaded_file.seek(0)
+                for chunk in iter(lambda: uploaded_file.read(chunk_size), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                uploaded_file.seek(0)
+    except BaseException:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        raise
+    return SavedUpload(file_id, uploaded_file.name, path, size, digest.hexdigest())
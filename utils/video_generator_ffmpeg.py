@@ -3,10 +3,16 @@ import platform
 import re
 import shutil
 import subprocess
-import tempfile
-from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+from utils.cancellation import check_cancelled
+from utils.ffmpeg_scheduler import get_ffmpeg_scheduler
+from utils.janitor import make_temp_dir, remove_temp_dir
 from utils.voicevox import VoiceVoxAPI
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 
 def _find_binary(name):
     """バイナリの絶対パスを取得"""
@@ -26,9 +32,9 @@ def _find_binary(name):
         except Exception:
             pass
     # 4. imageio-ffmpegのffmpegと同じディレクトリ
-    if name == 'ffprobe' and FFMPEG_BIN:
+    if name == 'ffprobe':
         try:
-            candidate = os.path.join(os.path.dirname(FFMPEG_BIN), 'ffprobe')
+            candidate = os.path.join(os.path.dirname(get_ffmpeg_bin()), 'ffprobe')
             if os.path.isfile(candidate):
                 return candidate
         except Exception:
@@ -36,9 +42,54 @@ def _find_binary(name):
     return None
 
 
-FFMPEG_BIN = _find_binary('ffmpeg') or 'ffmpeg'
-FFPROBE_BIN = _find_binary('ffprobe')
-print(f"[INFO] ffmpeg: {FFMPEG_BIN}, ffprobe: {FFPROBE_BIN}")
+# 実行ファイルの検索は import 時ではなく最初に使うときに1回だけ行う（起動を速くする）
+@lru_cache(maxsize=None)
+def get_ffmpeg_bin() -> str:
+    """ffmpeg の絶対パス（見つからなければ 'ffmpeg'）"""
+    path = _find_binary('ffmpeg') or 'ffmpeg'
+    print(f"[INFO] ffmpeg: {path}")
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_ffprobe_bin() -> Optional[str]:
+    """ffprobe の絶対パス（見つからなければ None）"""
+    path = _find_binary('ffprobe')
+    print(f"[INFO] ffprobe: {path}")
+    return path
+
+
+@lru_cache(maxsize=None)
+def _detect_font_info() -> tuple:
+    """使用するフォントの (名前, パス) を調べる（結果はプロセス内でキャッシュ）
+
+    画面表示用なので、ファイルがあるかだけを確認する（起動直後の描画で Pillow を読み込まない）。
+    実際に読み込めるかは描画時の _create_text_image で確認する。
+    """
+    bundled_font = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts', 'NotoSansJP-Bold.otf')
+    font_paths = [bundled_font]
+    if platform.system() == "Darwin":
+        font_paths.extend([
+            "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
+            "/System/Library/Fonts/ヒラギノ角ゴ ProN W6.otf",
+            "/System/Library/Fonts/Hiragino Sans GB.ttc",
+        ])
+    elif platform.system() == "Linux":
+        font_paths.extend([
+            "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+            "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+            "/usr/share/fonts/opentype/noto/NotoSansCJKjp-Bold.otf",
+        ])
+    else:
+        font_paths.extend([
+            "C:/Windows/Fonts/YuGothB.ttc",
+            "C:/Windows/Fonts/YuGothM.ttc",
+            "C:/Windows/Fonts/meiryo.ttc",
+        ])
+    for font_path in font_paths:
+        if os.path.isfile(font_path) and os.access(font_path, os.R_OK):
+            return (os.path.basename(font_path), font_path)
+    return ("デフォルトフォント", None)
 
 
 class VideoGeneratorFFmpeg:
@@ -58,37 +109,13 @@ class VideoGeneratorFFmpeg:
     @staticmethod
     def get_current_font_info():
         """現在使用されるフォント名とパスを返す"""
-        bundled_font = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts', 'NotoSansJP-Bold.otf')
-        font_paths = [bundled_font]
-        if platform.system() == "Darwin":
-            font_paths.extend([
-                "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
-                "/System/Library/Fonts/ヒラギノ角ゴ ProN W6.otf",
-                "/System/Library/Fonts/Hiragino Sans GB.ttc",
-            ])
-        elif platform.system() == "Linux":
-            font_paths.extend([
-                "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSansCJKjp-Bold.otf",
-            ])
-        else:
-            font_paths.extend([
-                "C:/Windows/Fonts/YuGothB.ttc",
-                "C:/Windows/Fonts/YuGothM.ttc",
-                "C:/Windows/Fonts/meiryo.ttc",
-            ])
-        for font_path in font_paths:
-            try:
-                ImageFont.truetype(font_path, 10)
-                font_name = os.path.basename(font_path)
-                return {"name": font_name, "path": font_path, "size": 100}
-            except:
-                continue
-        return {"name": "デフォルトフォント", "path": None, "size": 100}
+        font_name, font_path = _detect_font_info()
+        return {"name": font_name, "path": font_path, "size": 100}
 
-    def _create_checker_background(self, width: int, height: int, cell_size: int = 20) -> Image.Image:
+    def _create_checker_background(self, width: int, height: int, cell_size: int = 20) -> "Image.Image":
         """チェッカーパターン背景を作成（Photoshop風透過表示）"""
+        from PIL import Image, ImageDraw
+
         img = Image.new('RGB', (width, height))
         draw = ImageDraw.Draw(img)
 
@@ -106,8 +133,10 @@ class VideoGeneratorFFmpeg:
 
         return img
 
-    def _create_text_image(self, text: str, width: int, height: int, font_size: int = 100, transparent: bool = False, checker: bool = False) -> Image.Image:
+    def _create_text_image(self, text: str, width: int, height: int, font_size: int = 100, transparent: bool = False, checker: bool = False) -> "Image.Image":
         """縦書きテキスト画像を生成"""
+        from PIL import Image, ImageDraw, ImageFont
+
         # バンドル版フォントのパス（最優先）
         bundled_font = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts', 'NotoSansJP-Bold.otf')
         font = None
@@ -290,7 +319,7 @@ class VideoGeneratorFFmpeg:
 
         total_clips = len(lines)
 
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir("render")
         temp_files = []
         segment_videos_transparent = []
         segment_videos_preview = []
@@ -389,26 +418,47 @@ class VideoGeneratorFFmpeg:
                 return (video_data, None)
 
         finally:
-            # クリーンアップ
-            for f in temp_files:
-                if os.path.exists(f):
-                    os.unlink(f)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+            # クリーンアップ（途中で失敗しても作業ディレクトリごと削除）
+            remove_temp_dir(temp_dir)
+
+    def _run_ffmpeg(self, cmd: list, check: bool = True, duration: float = None, on_progress=None,
+                    cancel_token=None, **kwargs):
+        """FFmpegを共通スケジューラー経由で実行（同時実行数・スレッド数を制限）
+
+        duration（出力の再生時間）を渡すと -progress の出力から進捗を
+        on_progress(fraction, speed) に通知し、エンコード速度を記録する。
+        cancel_token がキャンセルされると順番待ち・実行中のFFmpegを止める。
+        """
+        return get_ffmpeg_scheduler().run(
+            cmd, capture_output=True, check=check, duration=duration, on_progress=on_progress,
+            cancel_token=cancel_token, **kwargs
+        )
+
+    @staticmethod
+    def _encode_progress(progress_callback, start: int, end: int, message: str):
+        """エンコードの進捗(0〜1)を progress_callback の start〜end(%) に割り当てる"""
+        if progress_callback is None:
+            return None
+
+        def on_progress(fraction, speed):
+            speed_text = f"（{speed:.1f}x）" if speed else ""
+            progress_callback(int(start + (end - start) * fraction), 100, f"{message}{speed_text}")
+        return on_progress
 
     def _get_audio_duration(self, audio_path: str) -> float:
         """音声ファイルの長さを取得（ffprobe優先、なければffmpegで取得）"""
-        if FFPROBE_BIN:
+        ffprobe_bin = get_ffprobe_bin()
+        if ffprobe_bin:
             result = subprocess.run(
-                [FFPROBE_BIN, '-v', 'error', '-show_entries', 'format=duration',
+                [ffprobe_bin, '-v', 'error', '-show_entries', 'format=duration',
                  '-of', 'default=noprint_wrappers=1:nokey=1', audio_path],
                 capture_output=True, text=True
             )
             return float(result.stdout.strip())
         else:
-            result = subprocess.run(
-                [FFMPEG_BIN, '-i', audio_path, '-f', 'null', '-'],
-                capture_output=True, text=True
+            result = self._run_ffmpeg(
+                [get_ffmpeg_bin(), '-i', audio_path, '-f', 'null', '-'],
+                check=False, text=True
             )
             match = re.search(r'Duration:\s*(\d+):(\d+):(\d+)\.(\d+)', result.stderr)
             if match:
@@ -420,8 +470,8 @@ class VideoGeneratorFFmpeg:
         """1つのセグメント動画を作成（音声と映像を同期）"""
         if transparent:
             # ProRes 4444（アルファチャンネル対応）
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-loop', '1',
                 '-framerate', str(fps),
                 '-t', str(duration),
@@ -435,11 +485,11 @@ class VideoGeneratorFFmpeg:
                 '-map', '1:a:0',
                 '-vsync', 'cfr',
                 output_path
-            ], capture_output=True, check=True)
+            ])
         else:
             # 通常のMP4
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-loop', '1',
                 '-framerate', str(fps),
                 '-t', str(duration),
@@ -454,7 +504,7 @@ class VideoGeneratorFFmpeg:
                 '-map', '1:a:0',
                 '-vsync', 'cfr',
                 output_path
-            ], capture_output=True, check=True)
+            ])
 
     def _concat_videos(self, video_paths: list, output_path: str, transparent: bool = False):
         """複数の動画を連結（音声同期を維持）"""
@@ -466,8 +516,8 @@ class VideoGeneratorFFmpeg:
 
         if transparent:
             # ProRes 4444を維持（音声同期オプション付き）
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_path,
@@ -478,11 +528,11 @@ class VideoGeneratorFFmpeg:
                 '-vsync', 'cfr',
                 '-af', 'aresample=async=1',
                 output_path
-            ], capture_output=True, check=True)
+            ])
         else:
             # MP4（再エンコードで同期を確保）
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_path,
@@ -494,7 +544,7 @@ class VideoGeneratorFFmpeg:
                 '-vsync', 'cfr',
                 '-af', 'aresample=async=1',
                 output_path
-            ], capture_output=True, check=True)
+            ])
 
         os.unlink(list_path)
 
@@ -539,7 +589,7 @@ class VideoGeneratorFFmpeg:
 
         total_clips = len(display_lines)
 
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir("render")
         temp_files = []
         segment_videos_transparent = []
         segment_videos_preview = []
@@ -634,12 +684,8 @@ class VideoGeneratorFFmpeg:
                 return (video_data, None)
 
         finally:
-            # クリーンアップ
-            for f in temp_files:
-                if os.path.exists(f):
-                    os.unlink(f)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+            # クリーンアップ（途中で失敗しても作業ディレクトリごと削除）
+            remove_temp_dir(temp_dir)
 
     def create_video_from_timestamped_segments(
         self,
@@ -650,7 +696,9 @@ class VideoGeneratorFFmpeg:
         fps: int = 30,
         transparent: bool = True,
         progress_callback=None,
-        audio_margin: float = 0.0
+        audio_margin: float = 0.0,
+        cancel_token=None,
+        output_dir: Optional[str] = None
     ) -> tuple:
         """タイムスタンプ付きセグメントから動画を生成（音声を切らない方式）
 
@@ -659,9 +707,12 @@ class VideoGeneratorFFmpeg:
             segments: [{"start": 0.0, "end": 1.5, "text": "テキスト"}, ...]
             progress_callback: 進捗コールバック関数
             audio_margin: 未使用（互換性のため残す）
+            cancel_token: CancellationToken（キャンセルされると実行中のFFmpegを止めて CancelledError）
+            output_dir: 完成した動画を置くディレクトリ（ジョブ・プロジェクトのディレクトリなど）。
+                省略時は新しい一時ディレクトリ。動画はメモリに読み込まずにファイルのまま移す
 
         Returns:
-            tuple: (透過動画bytes, プレビュー動画bytes)
+            tuple: (透過動画のパス, プレビュー動画のパス)。透過でない場合は (動画のパス, None)
         """
         if not segments:
             raise ValueError("セグメントがありません")
@@ -669,7 +720,7 @@ class VideoGeneratorFFmpeg:
         total_clips = len(segments)
         total_audio_duration = self._get_audio_duration(audio_path)
 
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir("render")
 
         try:
             # 1. 各セグメントの表示時間を正確に計算
@@ -705,8 +756,10 @@ class VideoGeneratorFFmpeg:
 
                 print(f"セグメント {clip_num}/{total_clips}: {display_text[:20]}... (duration={durations[i]:.3f}s)")
 
+                check_cancelled(cancel_token)
                 if progress_callback:
-                    progress_callback(clip_num, total_clips, f"クリップ {clip_num}/{total_clips} を生成中...")
+                    # 画像生成は全体の0〜30%、残りはFFmpegのエンコード
+                    progress_callback(int(30 * clip_num / total_clips), 100, f"クリップ {clip_num}/{total_clips} を生成中...")
 
                 if transparent:
                     img_t = self._create_text_image(display_text, width, height, transparent=True)
@@ -731,24 +784,35 @@ class VideoGeneratorFFmpeg:
                 video_t_path = os.path.join(temp_dir, "video_transparent.mov")
                 self._create_video_from_images_concat(
                     list(zip(img_transparent_paths, durations)),
-                    video_t_path, fps, transparent=True)
+                    video_t_path, fps, transparent=True,
+                    on_progress=self._encode_progress(progress_callback, 30, 65, "透過動画をエンコード中..."),
+                    cancel_token=cancel_token)
 
                 video_p_path = os.path.join(temp_dir, "video_preview.mp4")
                 self._create_video_from_images_concat(
                     list(zip(img_preview_paths, durations)),
-                    video_p_path, fps, transparent=False)
+                    video_p_path, fps, transparent=False,
+                    on_progress=self._encode_progress(progress_callback, 65, 85, "プレビュー動画をエンコード中..."),
+                    cancel_token=cancel_token)
 
                 # 元の音声と結合
                 output_t = os.path.join(temp_dir, "output_transparent.mov")
-                self._mux_video_audio(video_t_path, audio_path, output_t, transparent=True)
+                self._mux_video_audio(
+                    video_t_path, audio_path, output_t, transparent=True, duration=total_audio_duration,
+                    on_progress=self._encode_progress(progress_callback, 85, 95, "音声を結合中..."),
+                    cancel_token=cancel_token)
 
                 output_p = os.path.join(temp_dir, "output_preview.mp4")
-                self._mux_video_audio(video_p_path, audio_path, output_p, transparent=False)
+                self._mux_video_audio(
+                    video_p_path, audio_path, output_p, transparent=False, duration=total_audio_duration,
+                    on_progress=self._encode_progress(progress_callback, 95, 100, "音声を結合中..."),
+                    cancel_token=cancel_token)
 
-                with open(output_t, 'rb') as f:
-                    video_transparent = f.read()
-                with open(output_p, 'rb') as f:
-                    video_preview = f.read()
+                output_dir = output_dir or make_temp_dir("video")
+                video_transparent = os.path.join(output_dir, "video_main.mov")
+                video_preview = os.path.join(output_dir, "video_preview.mp4")
+                shutil.move(output_t, video_transparent)
+                shutil.move(output_p, video_preview)
 
                 print("動画生成完了！（透過 + プレビュー）")
                 return (video_transparent, video_preview)
@@ -756,26 +820,88 @@ class VideoGeneratorFFmpeg:
                 video_path = os.path.join(temp_dir, "video.mp4")
                 self._create_video_from_images_concat(
                     list(zip(img_green_paths, durations)),
-                    video_path, fps, transparent=False)
+                    video_path, fps, transparent=False,
+                    on_progress=self._encode_progress(progress_callback, 30, 85, "動画をエンコード中..."),
+                    cancel_token=cancel_token)
 
                 output_path = os.path.join(temp_dir, "output.mp4")
-                self._mux_video_audio(video_path, audio_path, output_path, transparent=False)
+                self._mux_video_audio(
+                    video_path, audio_path, output_path, transparent=False, duration=total_audio_duration,
+                    on_progress=self._encode_progress(progress_callback, 85, 100, "音声を結合中..."),
+                    cancel_token=cancel_token)
 
-                with open(output_path, 'rb') as f:
-                    video_data = f.read()
+                output_dir = output_dir or make_temp_dir("video")
+                video_path = os.path.join(output_dir, "video_main.mp4")
+                shutil.move(output_path, video_path)
 
                 print("動画生成完了！")
-                return (video_data, None)
+                return (video_path, None)
 
         finally:
-            import shutil
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir, ignore_errors=True)
+            # クリーンアップ（途中で失敗しても作業ディレクトリごと削除）
+            remove_temp_dir(temp_dir)
+
+    def create_video_from_project(self, project, progress_callback=None, force: bool = False,
+                                  cancel_token=None) -> tuple:
+        """プロジェクトのタイミングと描画設定から動画を生成
+
+        同じ入力（音声・タイミング・描画設定）で生成済みの動画があれば再利用し、
+        なければ生成してプロジェクトに保存する。
+
+        Args:
+            project: utils.project.Project（segments と音声が保存済みであること）
+            progress_callback: 進捗コールバック関数
+            force: Trueなら生成済みの動画があっても作り直す
+            cancel_token: CancellationToken（キャンセルされると CancelledError）
+
+        Returns:
+            tuple: (透過動画のパス, プレビュー動画のパス)。どちらもプロジェクト内のファイル
+        """
+        if not project.segments:
+            raise ValueError("プロジェクトにタイミングがありません")
+        audio_path = project.audio_path
+        if not audio_path:
+            raise ValueError("プロジェクトに音声がありません")
+
+        render = project.render
+        transparent = render.get("transparent", True)
+        signature = project.render_signature()
+
+        if not force:
+            video_main = project.artifact_path("video_main", signature)
+            video_preview = project.artifact_path("video_preview", signature) if transparent else None
+            if video_main is not None and (video_preview is not None or not transparent):
+                print(f"生成済みの動画を再利用: {project.project_id}")
+                if progress_callback:
+                    progress_callback(1, 1, "生成済みの動画を再利用")
+                return (video_main, video_preview)
+
+        artifacts_dir = os.path.join(project.project_dir, "artifacts")
+        os.makedirs(artifacts_dir, exist_ok=True)
+        video_main, video_preview = self.create_video_from_timestamped_segments(
+            audio_path=audio_path,
+            segments=project.segments,
+            width=render.get("width", 1080),
+            height=render.get("height", 1920),
+            fps=render.get("fps", 30),
+            transparent=transparent,
+            progress_callback=progress_callback,
+            cancel_token=cancel_token,
+            output_dir=artifacts_dir
+        )
+
+        video_main = project.add_artifact("video_main", video_main, signature)
+        if video_preview is not None:
+            video_preview = project.add_artifact("video_preview", video_preview, signature)
+        project.mark_stage("render")
+        project.save()
+
+        return (video_main, video_preview)
 
     def _extract_audio_segment(self, input_path: str, output_path: str, start_time: float, duration: float):
         """音声ファイルから指定区間を切り出し"""
-        subprocess.run([
-            FFMPEG_BIN, '-y',
+        self._run_ffmpeg([
+            get_ffmpeg_bin(), '-y',
             '-i', input_path,
             '-ss', str(start_time),
             '-t', str(duration),
@@ -783,14 +909,14 @@ class VideoGeneratorFFmpeg:
             '-ar', '44100',
             '-ac', '2',
             output_path
-        ], capture_output=True, check=True)
+        ])
 
     def _create_video_only_segment(self, img_path: str, output_path: str, duration: float, fps: int, transparent: bool = False):
         """音声なしの映像セグメントを作成"""
         if transparent:
             # ProRes 4444（アルファチャンネル対応）
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-loop', '1',
                 '-framerate', str(fps),
                 '-i', img_path,
@@ -800,11 +926,11 @@ class VideoGeneratorFFmpeg:
                 '-pix_fmt', 'yuva444p10le',
                 '-an',
                 output_path
-            ], capture_output=True, check=True)
+            ])
         else:
             # 通常のMP4（音声なし）
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-loop', '1',
                 '-framerate', str(fps),
                 '-i', img_path,
@@ -814,7 +940,7 @@ class VideoGeneratorFFmpeg:
                 '-pix_fmt', 'yuv420p',
                 '-an',
                 output_path
-            ], capture_output=True, check=True)
+            ])
 
     def _concat_videos_no_audio(self, video_paths: list, output_path: str, transparent: bool = False):
         """音声なしの動画を連結"""
@@ -824,8 +950,8 @@ class VideoGeneratorFFmpeg:
                 f.write(f"file '{vp}'\n")
 
         if transparent:
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_path,
@@ -834,10 +960,10 @@ class VideoGeneratorFFmpeg:
                 '-pix_fmt', 'yuva444p10le',
                 '-an',
                 output_path
-            ], capture_output=True, check=True)
+            ])
         else:
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_path,
@@ -846,15 +972,16 @@ class VideoGeneratorFFmpeg:
                 '-crf', '18',
                 '-an',
                 output_path
-            ], capture_output=True, check=True)
+            ])
 
         os.unlink(list_path)
 
-    def _mux_video_audio(self, video_path: str, audio_path: str, output_path: str, transparent: bool = False):
+    def _mux_video_audio(self, video_path: str, audio_path: str, output_path: str, transparent: bool = False,
+                         duration: float = None, on_progress=None, cancel_token=None):
         """映像と音声を結合（元の音声をそのまま使用）"""
         if transparent:
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-i', video_path,
                 '-i', audio_path,
                 '-c:v', 'copy',
@@ -863,10 +990,10 @@ class VideoGeneratorFFmpeg:
                 '-map', '1:a:0',
                 '-shortest',
                 output_path
-            ], capture_output=True, check=True)
+            ], duration=duration, on_progress=on_progress, cancel_token=cancel_token)
         else:
-            subprocess.run([
-                FFMPEG_BIN, '-y',
+            self._run_ffmpeg([
+                get_ffmpeg_bin(), '-y',
                 '-i', video_path,
                 '-i', audio_path,
                 '-c:v', 'copy',
@@ -876,9 +1003,10 @@ class VideoGeneratorFFmpeg:
                 '-map', '1:a:0',
                 '-shortest',
                 output_path
-            ], capture_output=True, check=True)
+            ], duration=duration, on_progress=on_progress, cancel_token=cancel_token)
 
-    def _create_video_from_images_concat(self, entries, output_path, fps=30, transparent=False):
+    def _create_video_from_images_concat(self, entries, output_path, fps=30, transparent=False, on_progress=None,
+                                         cancel_token=None):
         """画像リストとdurationから映像を1パスで生成（タイミング精度向上）
 
         個別にセグメント動画を作成→結合する方式と異なり、
@@ -890,7 +1018,10 @@ class VideoGeneratorFFmpeg:
             output_path: 出力動画パス
             fps: フレームレート
             transparent: ProRes 4444（透過）で出力するか
+            on_progress: エンコード進捗のコールバック on_progress(fraction, speed)
+            cancel_token: CancellationToken（キャンセル時にFFmpegを終了）
         """
+        total_duration = sum(duration for _, duration in entries)
         list_path = output_path + '_concat.txt'
         with open(list_path, 'w') as f:
             for img_path, duration in entries:
@@ -902,8 +1033,8 @@ class VideoGeneratorFFmpeg:
 
         try:
             if transparent:
-                subprocess.run([
-                    FFMPEG_BIN, '-y',
+                self._run_ffmpeg([
+                    get_ffmpeg_bin(), '-y',
                     '-f', 'concat', '-safe', '0',
                     '-i', list_path,
                     '-vsync', 'cfr',
@@ -913,10 +1044,10 @@ class VideoGeneratorFFmpeg:
                     '-pix_fmt', 'yuva444p10le',
                     '-an',
                     output_path
-                ], capture_output=True, check=True)
+                ], duration=total_duration, on_progress=on_progress, cancel_token=cancel_token)
             else:
-                subprocess.run([
-                    FFMPEG_BIN, '-y',
+                self._run_ffmpeg([
+                    get_ffmpeg_bin(), '-y',
                     '-f', 'concat', '-safe', '0',
                     '-i', list_path,
                     '-vsync', 'cfr',
@@ -926,7 +1057,7 @@ class VideoGeneratorFFmpeg:
                     '-pix_fmt', 'yuv420p',
                     '-an',
                     output_path
-                ], capture_output=True, check=True)
+                ], duration=total_duration, on_progress=on_progress, cancel_token=cancel_token)
         finally:
             if os.path.exists(list_path):
                 os.unlink(list_path)
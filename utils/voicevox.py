@@ -8,11 +8,13 @@ from typing import List, Dict, Optional, Callable
 class VoiceVoxAPI:
     def __init__(self, base_url: str = "http://localhost:50021"):
         self.base_url = base_url
+        # 接続を再利用（行ごとの音声合成でTCP接続を張り直さない）
+        self.session = requests.Session()
 
     def get_speakers(self) -> List[Dict]:
         """VOICEVOXのスピーカー一覧を取得"""
         try:
-            response = requests.get(f"{self.base_url}/speakers")
+            response = self.session.get(f"{self.base_url}/speakers")
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -40,7 +42,7 @@ class VoiceVoxAPI:
     def generate_audio_query(self, text: str, speaker_id: int) -> Optional[Dict]:
         """テキストから音声クエリを生成"""
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/audio_query",
                 params={"text": text, "speaker": speaker_id}
             )
@@ -60,7 +62,7 @@ class VoiceVoxAPI:
             # ステレオ出力を有効化
             audio_query["outputStereo"] = True
 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/synthesis",
                 params={"speaker": speaker_id},
                 headers={"Content-Type": "application/json"},